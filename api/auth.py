@@ -1,55 +1,236 @@
 """Authentication utilities for API key management and JWT tokens."""
 
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
 import secrets
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
 from datetime import datetime, timedelta, UTC
 from typing import Optional
 
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from passlib.hash import bcrypt
+import jwt
+import orjson
+from jwt.exceptions import PyJWTError as JWTError
+import bcrypt
 
+from api.cache import TTLCache
 from api.config import settings
+from api.models import ApiKey, Tier, User
 
 # Configuration from environment
 SECRET_KEY = settings.JWT_SECRET_KEY
 ALGORITHM = settings.JWT_ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+API_KEY_PEPPER = settings.API_KEY_PEPPER.encode("utf-8")
+SECRET_KEY_BYTES = SECRET_KEY.encode("utf-8")
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Monthly request quota per tier
+TIER_QUOTA_LIMITS = MappingProxyType(
+    {
+        Tier.FREE: 1000,
+        Tier.BASIC: 10000,
+        Tier.PRO: 100000,
+        Tier.ENTERPRISE: 1000000,  # Default for enterprise, can be customized
+    }
+)
+
+# Hourly rate limit per tier
+TIER_RATE_LIMITS = MappingProxyType(
+    {
+        Tier.FREE: 60,  # 60 requests per hour
+        Tier.BASIC: 300,  # 300 requests per hour
+        Tier.PRO: 1000,  # 1000 requests per hour
+        Tier.ENTERPRISE: 5000,  # 5000 requests per hour
+    }
+)
+
+
+@dataclass(frozen=True, slots=True)
+class UserSnapshot:
+    """Immutable copy of an API key owner's fields, cached with the key."""
+
+    id: int
+    name: str
+    email: str
+    is_active: bool
+    created_at: datetime
+
+    @classmethod
+    def from_row(cls, user: User) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            name=user.name,
+            email=user.email,
+            is_active=user.is_active,
+            created_at=user.created_at,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class ApiKeySnapshot:
+    """Immutable copy of the API key fields that authentication needs.
+
+    Cached verifications are shared by concurrent requests, so they hold no
+    ORM row and no counters; quota usage is checked and consumed in SQL.
+    """
+
+    id: int
+    user_id: int
+    key_hash: str
+    tier: Tier
+    quota_limit: int
+    is_active: bool
+    # Loaded in the same query as the key, so API key routes don't look it up
+    user: UserSnapshot
+
+    @classmethod
+    def from_row(cls, api_key: ApiKey) -> "ApiKeySnapshot":
+        """Copy a key row whose user relationship is already loaded."""
+        return cls(
+            id=api_key.id,
+            user_id=api_key.user_id,
+            key_hash=api_key.key_hash,
+            tier=api_key.tier,
+            quota_limit=api_key.quota_limit,
+            is_active=api_key.is_active,
+            user=UserSnapshot.from_row(api_key.user),
+        )
+
+
+# Verified API keys: HMAC digest of the raw key -> ApiKeySnapshot, whose key_hash
+# is that same digest. A key's stored hash is its cache key, so revocation is a pop
+# by key_hash rather than a cache scan. Revocations are broadcast to every worker
+# (api.revocation); the TTL is the backstop.
+api_key_cache = TTLCache(maxsize=10_000, ttl=60)
+
+# Digests of keys that failed verification, kept briefly to blunt credential stuffing
+invalid_api_key_cache = TTLCache(maxsize=10_000, ttl=5)
+
+# Bounds concurrent bcrypt work (logins, registrations, legacy API keys) so bursts
+# can't swamp the CPU
+_bcrypt_semaphore = asyncio.Semaphore(os.cpu_count() or 2)
+
+# Decoded JWT payloads keyed by raw token, never held past the token's own expiry
+token_cache = TTLCache(maxsize=50_000, ttl=60)
+
+# bcrypt only uses the first 72 bytes of input; newer releases raise, not truncate
+BCRYPT_MAX_BYTES = 72
+
+
+def _bcrypt_input(secret: str) -> bytes:
+    """Encode a secret for bcrypt, truncating as bcrypt always has."""
+    return secret.encode("utf-8")[:BCRYPT_MAX_BYTES]
+
+
+def _bcrypt_verify(secret: str, hashed: str) -> bool:
+    """Check a secret against a bcrypt hash ($2a$/$2b$/$2y$); malformed hashes fail."""
+    try:
+        return bcrypt.checkpw(_bcrypt_input(secret), hashed.encode("utf-8"))
+    except ValueError:
+        return False
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return _bcrypt_verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Hash a password for storage."""
-    return pwd_context.hash(password)
+    # bcrypt stays here: passwords are low-entropy, unlike API keys
+    salt = bcrypt.gensalt(rounds=settings.PASSWORD_BCRYPT_ROUNDS)
+    return bcrypt.hashpw(_bcrypt_input(password), salt).decode("utf-8")
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in a worker thread; bcrypt releases the GIL while it runs."""
+    async with _bcrypt_semaphore:
+        return await asyncio.to_thread(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password in a worker thread so the event loop keeps serving requests."""
+    async with _bcrypt_semaphore:
+        return await asyncio.to_thread(get_password_hash, password)
 
 
 def generate_api_key() -> str:
     """Generate a cryptographically secure API key."""
-    # Generate 32 random bytes and encode as hex
-    random_bytes = secrets.token_bytes(32)
-    return f"sk_live_{random_bytes.hex()}"
+    # 32 random bytes, hex encoded
+    return f"sk_live_{secrets.token_hex(32)}"
+
+
+def get_api_key_prefix(api_key: str) -> str:
+    """Return the non-secret leading part of an API key, shown in key listings."""
+    # "sk_live_" plus 8 hex characters (32 of the 256 random bits)
+    return api_key[:16]
+
+
+# Keyed once: copying skips re-deriving the inner/outer pads for every hash
+_API_KEY_HMAC = hmac.new(API_KEY_PEPPER, digestmod=hashlib.sha256)
 
 
 def hash_api_key(api_key: str) -> str:
-    """Hash an API key for secure storage using bcrypt."""
-    # Use bcrypt for better security against brute force attacks
-    # Note: We use a lower cost factor (10) for API keys to balance security and performance
-    return bcrypt.hash(api_key, rounds=10)
+    """Hash an API key for secure storage using HMAC-SHA256."""
+    # API keys are 256-bit random tokens, not human passwords, so a slow KDF
+    # adds no brute-force resistance. A keyed HMAC keeps the stored hash
+    # useless without the server-side pepper and costs microseconds per call.
+    mac = _API_KEY_HMAC.copy()
+    mac.update(api_key.encode("utf-8"))
+    return mac.hexdigest()
+
+
+def is_legacy_api_key_hash(hashed_key: str) -> bool:
+    """Check if a stored API key hash was created by the old bcrypt scheme."""
+    return hashed_key.startswith("$2")
 
 
 def verify_api_key(api_key: str, hashed_key: str) -> bool:
-    """Verify an API key against its bcrypt hash."""
-    try:
-        return bcrypt.verify(api_key, hashed_key)
-    except Exception:
-        # Handle invalid hash format
-        return False
+    """Verify an API key against its stored hash."""
+    if is_legacy_api_key_hash(hashed_key):
+        return _bcrypt_verify(api_key, hashed_key)
+    return hmac.compare_digest(hash_api_key(api_key), hashed_key)
+
+
+async def verify_api_key_async(api_key: str, hashed_key: str) -> bool:
+    """Verify an API key without blocking the event loop on legacy bcrypt hashes."""
+    if not is_legacy_api_key_hash(hashed_key):
+        # HMAC comparison takes microseconds; a thread hop would cost more
+        return verify_api_key(api_key, hashed_key)
+    async with _bcrypt_semaphore:
+        return await asyncio.to_thread(verify_api_key, api_key, hashed_key)
+
+
+def cache_api_key(key_info: ApiKeySnapshot) -> None:
+    """Cache a verified API key under its HMAC digest."""
+    api_key_cache.set(key_info.key_hash, key_info)
+
+
+def invalidate_api_key_cache(key_hash: str) -> None:
+    """Drop the cached verification for a key hash (call on revoke or regenerate)."""
+    api_key_cache.pop(key_hash)
+
+
+def _b64url(data: bytes) -> bytes:
+    """Base64url-encode without padding, as JWS requires."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+# The JOSE header never changes, so it is serialized and encoded once
+_JWT_HEADER_B64 = _b64url(orjson.dumps({"alg": ALGORITHM, "typ": "JWT"}))
+
+
+def _encode_hs256(payload: dict) -> str:
+    """Encode an HS256 JWT reusing the precomputed header."""
+    # orjson emits compact UTF-8 bytes directly, matching the JWS encoding
+    body = _b64url(orjson.dumps(payload))
+    signing_input = _JWT_HEADER_B64 + b"." + body
+    signature = hmac.new(SECRET_KEY_BYTES, signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + _b64url(signature)).decode("ascii")
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -59,46 +240,47 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.now(UTC) + expires_delta
     else:
         expire = datetime.now(UTC) + timedelta(minutes=15)
-    
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+
+    to_encode.update({"exp": int(expire.timestamp())})
+    if ALGORITHM == "HS256":
+        return _encode_hs256(to_encode)
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
 def verify_token(token: str) -> Optional[dict]:
     """Verify and decode a JWT token."""
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         return None
 
+    # Only successful decodes are cached, and never beyond the exp claim
+    ttl = token_cache.ttl
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        token_cache.set(token, payload, ttl=ttl)
+    return payload
+
 
 def get_quota_limit_for_tier(tier: str) -> int:
     """Get the monthly quota limit for a given tier."""
-    tier_limits = {
-        "free": 1000,
-        "basic": 10000,
-        "pro": 100000,
-        "enterprise": 1000000,  # Default for enterprise, can be customized
-    }
-    return tier_limits.get(tier, 1000)  # Default to free tier
+    return TIER_QUOTA_LIMITS.get(tier, 1000)  # Default to free tier
 
 
 def get_rate_limit_for_tier(tier: str) -> int:
     """Get the hourly rate limit for a given tier."""
-    tier_limits = {
-        "free": 60,      # 60 requests per hour
-        "basic": 300,    # 300 requests per hour
-        "pro": 1000,     # 1000 requests per hour
-        "enterprise": 5000,  # 5000 requests per hour
-    }
-    return tier_limits.get(tier, 60)  # Default to free tier
+    return TIER_RATE_LIMITS.get(tier, 60)  # Default to free tier
 
 
-def calculate_quota_reset_date() -> datetime:
+def calculate_quota_reset_date(*, now: Optional[datetime] = None) -> datetime:
     """Calculate the next quota reset date (first day of next month)."""
-    now = datetime.now(UTC)
+    if now is None:
+        now = datetime.now(UTC)
     # First day of next month
     if now.month == 12:
         return datetime(now.year + 1, 1, 1, tzinfo=UTC)
@@ -106,10 +288,11 @@ def calculate_quota_reset_date() -> datetime:
         return datetime(now.year, now.month + 1, 1, tzinfo=UTC)
 
 
-def is_quota_expired(reset_date: datetime) -> bool:
+def is_quota_expired(reset_date: datetime, *, now: Optional[datetime] = None) -> bool:
     """Check if the quota period has expired and should be reset."""
+    if now is None:
+        now = datetime.now(UTC)
     # Ensure both datetimes are timezone-aware
-    now = datetime.now(UTC)
     if reset_date.tzinfo is None:
         reset_date = reset_date.replace(tzinfo=UTC)
-    return now >= reset_date
\ No newline at end of file
+    return now >= reset_date
@@ -0,0 +1,9 @@
+"""Per-request authentication context."""
+
+from contextvars import ContextVar
+
+from api.auth import ApiKeySnapshot
+
+# API key resolved by APIKeyMiddleware for the request being handled.
+# Each asyncio task sees its own copy, so concurrent requests never mix.
+current_api_key: ContextVar[ApiKeySnapshot] = ContextVar("current_api_key")
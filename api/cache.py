@@ -0,0 +1,96 @@
+"""In-process caching utilities."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire after a fixed time-to-live."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entry when full."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry and return its value."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def invalidate_where(self, predicate: Callable[[Any], bool]) -> int:
+        """Remove entries whose value matches predicate. Returns the count removed."""
+        with self._lock:
+            stale = [key for key, (value, _) in self._data.items() if predicate(value)]
+            for key in stale:
+                del self._data[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+
+    @property
+    def hit_ratio(self) -> Optional[float]:
+        """Fraction of lookups answered from the cache (None before any lookup)."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def canonical_key(endpoint: str, **params: Any) -> Tuple:
+    """Build a cache key that doesn't depend on parameter order or unset parameters.
+
+    None and empty strings both mean "no filter" to the query endpoints, so both
+    are dropped. Callers normalize values the query itself treats alike (e.g.
+    case-insensitive filters) before passing them in.
+    """
+    filters = (
+        (name, value)
+        for name, value in params.items()
+        if value is not None and value != ""
+    )
+    return (endpoint, *sorted(filters))
+
+
+# Encoded map states/hotspots/stats responses (CachedJSON) keyed by their normalized
+# filters. Kept here rather than in the map router so other modules (the health
+# report) can read it without importing a router. Sightings only change when a
+# batch import runs, so expiry alone keeps them fresh enough.
+AGGREGATE_CACHE_TTL = 300  # seconds
+aggregate_cache = TTLCache(maxsize=1024, ttl=AGGREGATE_CACHE_TTL)
@@ -3,7 +3,6 @@
 import os
 from pathlib import Path
 from typing import Optional
-from functools import lru_cache
 
 from dotenv import load_dotenv
 
@@ -14,15 +13,30 @@ load_dotenv(env_path)
 
 class Settings:
     """Application settings loaded from environment variables."""
-    
+
     # Security
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "your-secret-key-here")
     JWT_ALGORITHM: str = "HS256"
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
-    
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(
+        os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+    )
+    API_KEY_PEPPER: str = os.getenv("API_KEY_PEPPER", "your-api-key-pepper-here")
+    PASSWORD_BCRYPT_ROUNDS: int = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///:memory:")
-    
+    # Connection pool (PostgreSQL). Keep workers x (pool size + overflow) below
+    # the server's max_connections (100 by default).
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds
+    DB_POOL_TIMEOUT: int = int(
+        os.getenv("DB_POOL_TIMEOUT", "30")
+    )  # seconds to wait for a free connection
+    # Set when DATABASE_URL goes through PgBouncer in transaction mode (e.g. a
+    # pooled Vercel Postgres URL), which can't keep per-connection prepared statements
+    DB_PGBOUNCER: bool = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
     @property
     def database_url(self) -> str:
         """Get the appropriate database URL for the environment."""
@@ -31,45 +45,77 @@ class Settings:
             # In a real production setup, you'd use a cloud database
             return "sqlite:///:memory:"
         return self.DATABASE_URL
-    
+
     # API Settings
     API_TITLE: str = "SkyWatch API"
     API_VERSION: str = "1.0.0"
     API_DESCRIPTION: str = "Track UFO sightings across the globe"
-    
+
     # CORS Settings
     CORS_ORIGINS: list = os.getenv("CORS_ORIGINS", "*").split(",")
-    CORS_ALLOW_CREDENTIALS: bool = os.getenv("CORS_ALLOW_CREDENTIALS", "true").lower() == "true"
+    CORS_ALLOW_CREDENTIALS: bool = (
+        os.getenv("CORS_ALLOW_CREDENTIALS", "true").lower() == "true"
+    )
     CORS_ALLOW_METHODS: list = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
     CORS_ALLOW_HEADERS: list = ["*"]
-    
+
     # Environment
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
     DEBUG: bool = ENVIRONMENT == "development"
-    
+
     # Rate Limiting
     RATE_LIMIT_REQUESTS: int = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))
-    RATE_LIMIT_PERIOD: int = int(os.getenv("RATE_LIMIT_PERIOD", "3600"))  # 1 hour in seconds
-    
-    # Redis (for future use)
+    RATE_LIMIT_PERIOD: int = int(
+        os.getenv("RATE_LIMIT_PERIOD", "3600")
+    )  # 1 hour in seconds
+
+    # Usage tracking: usage rows and api_keys.last_used are written once per batch.
+    # Quota is consumed per request by the auth middleware, so these don't affect it.
+    USAGE_BATCH_SIZE: int = int(os.getenv("USAGE_BATCH_SIZE", "500"))
+    USAGE_FLUSH_INTERVAL: float = float(
+        os.getenv("USAGE_FLUSH_INTERVAL", "1.0")
+    )  # seconds
+
+    # Hotspot aggregates are rebuilt on this schedule rather than per request
+    HOTSPOT_REFRESH_INTERVAL: float = float(
+        os.getenv("HOTSPOT_REFRESH_INTERVAL", "86400")
+    )  # seconds
+
+    # Redis (optional; broadcasts API key revocations across workers)
     REDIS_URL: Optional[str] = os.getenv("REDIS_URL")
-    
+
     # AI Research
     GEMINI_API_KEY: Optional[str] = os.getenv("GEMINI_API_KEY")
-    
+    RESEARCH_CACHE_MAX_AGE_DAYS: int = int(
+        os.getenv("RESEARCH_CACHE_MAX_AGE_DAYS", "30")
+    )  # since last access
+
     def __init__(self):
         """Validate critical settings on initialization."""
-        if self.ENVIRONMENT == "production" and self.JWT_SECRET_KEY == "your-secret-key-here":
+        if (
+            self.ENVIRONMENT == "production"
+            and self.JWT_SECRET_KEY == "your-secret-key-here"
+        ):
             raise ValueError(
                 "JWT_SECRET_KEY must be set to a secure value in production! "
-                "Generate one with: python -c 'import secrets; print(secrets.token_urlsafe(32))'"
+                "Generate one with: "
+                "python -c 'import secrets; print(secrets.token_urlsafe(32))'"
+            )
+        if (
+            self.ENVIRONMENT == "production"
+            and self.API_KEY_PEPPER == "your-api-key-pepper-here"
+        ):
+            raise ValueError(
+                "API_KEY_PEPPER must be set to a secure value in production! "
+                "Generate one with: "
+                "python -c 'import secrets; print(secrets.token_urlsafe(32))'"
             )
 
 
-@lru_cache()
-def get_settings() -> Settings:
-    """Get cached settings instance."""
-    return Settings()
+# Environment is read once at import; all consumers share this instance
+settings = Settings()
 
 
-settings = get_settings()
\ No newline at end of file
+def get_settings() -> Settings:
+    """Get the shared settings instance."""
+    return settings
@@ -1,15 +1,35 @@
+import asyncio
+import hashlib
+import logging
+import math
 import os
+import tempfile
 from contextlib import asynccontextmanager
+from types import MappingProxyType
+from typing import List
+from sqlalchemy import DateTime, event, func, inspect, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from api.models import Base
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateColumn
+from api.models import ApiKey, Base, HotspotSummary, Tier
 from api.config import settings
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
 
 # Database configuration
 try:
     DATABASE_URL = settings.database_url
-except:
+except Exception:
     # Fallback if settings fail
     DATABASE_URL = "sqlite:///:memory:"
 
@@ -19,30 +39,104 @@ if DATABASE_URL.startswith("sqlite"):
 elif DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
 
-# Create async engine with appropriate settings
-engine_kwargs = {
-    "echo": False,
-    "future": True,
-}
-
-# Add pool settings for PostgreSQL
-if "postgresql" in DATABASE_URL:
-    engine_kwargs.update({
-        "pool_size": 5,
-        "max_overflow": 10,
-        "pool_pre_ping": True,
-        "pool_recycle": 3600,
-    })
-elif "sqlite" in DATABASE_URL and ":memory:" in DATABASE_URL:
-    # Special handling for in-memory SQLite
-    engine_kwargs.update({
-        "pool_pre_ping": False,
-        "poolclass": None,  # Disable pooling for in-memory
-    })
-elif "sqlite" in DATABASE_URL:
-    engine_kwargs["pool_pre_ping"] = True
-
-engine: AsyncEngine = create_async_engine(DATABASE_URL, **engine_kwargs)
+
+def _build_engine_config(url: str) -> tuple[MappingProxyType, bool, bool, str | None]:
+    """Resolve engine settings for a database URL.
+
+    The URL is fixed for the life of the process, so this runs once at import.
+    Returns (engine kwargs, is SQLite, is in-memory SQLite, SQLite data directory).
+    """
+    engine_kwargs = {
+        "echo": False,
+        "future": True,
+    }
+    is_sqlite = "sqlite" in url
+    is_memory = is_sqlite and ":memory:" in url
+    sqlite_dir = None
+
+    if "postgresql" in url:
+        # Add pool settings for PostgreSQL
+        engine_kwargs.update(
+            {
+                "pool_size": settings.DB_POOL_SIZE,
+                "max_overflow": settings.DB_MAX_OVERFLOW,
+                "pool_pre_ping": True,
+                "pool_recycle": settings.DB_POOL_RECYCLE,
+                "pool_timeout": settings.DB_POOL_TIMEOUT,
+                # Reuse the most recently returned connection so a small hot set stays
+                # live; idle extras age out via pool_recycle instead of going stale
+                "pool_use_lifo": True,
+            }
+        )
+        if settings.DB_PGBOUNCER:
+            # Consecutive transactions may land on different server connections,
+            # so neither SQLAlchemy's nor asyncpg's statement cache can be used
+            engine_kwargs["connect_args"] = {
+                "prepared_statement_cache_size": 0,
+                "statement_cache_size": 0,
+            }
+    elif is_memory:
+        # An in-memory database lives and dies with its connection, so share a
+        # single one across sessions instead of reconnecting
+        engine_kwargs.update(
+            {
+                "pool_pre_ping": False,
+                "poolclass": StaticPool,
+                "connect_args": {"check_same_thread": False},
+            }
+        )
+    elif is_sqlite:
+        # Local file connections can't go stale; pinging would add a query per checkout
+        engine_kwargs["pool_pre_ping"] = False
+        # Ensure data directory exists before the database file is created
+        sqlite_dir = os.path.dirname(url.split("///")[-1]) or None
+
+    return MappingProxyType(engine_kwargs), is_sqlite, is_memory, sqlite_dir
+
+
+ENGINE_KWARGS, IS_SQLITE, IS_MEMORY_SQLITE, SQLITE_DIR = _build_engine_config(
+    DATABASE_URL
+)
+
+engine: AsyncEngine = create_async_engine(DATABASE_URL, **ENGINE_KWARGS)
+
+
+if IS_SQLITE:
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Tune each new SQLite connection for a read-heavy workload."""
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers proceed during a write; not applicable to :memory:
+        if not IS_MEMORY_SQLITE:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # Safe under WAL: power loss can lose the last commits but never corrupts
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        cursor.execute("PRAGMA cache_size=-64000")  # ~64 MB page cache
+        # Radius searches need sin()/cos(), missing from SQLite builds without math
+        try:
+            cursor.execute("SELECT sin(0), cos(0)")
+        except Exception:
+            for name, function in (("sin", math.sin), ("cos", math.cos)):
+                dbapi_connection.create_function(
+                    name, 1, _null_safe(function), deterministic=True
+                )
+        cursor.close()
+
+
+def _null_safe(function):
+    """Wrap a one-argument SQL function so NULL in gives NULL out, as built-ins do."""
+    return lambda value: None if value is None else function(value)
+
+
+def dialect_insert(model):
+    """INSERT construct for the configured backend, with on_conflict_do_nothing."""
+    if IS_SQLITE:
+        return sqlite_insert(model)
+    return postgresql_insert(model)
+
 
 # Create async session factory
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
@@ -68,15 +162,206 @@ async def get_db_session():
 
 async def create_tables():
     """Create all database tables."""
-    # Ensure data directory exists if using SQLite
-    if "sqlite" in DATABASE_URL:
-        db_path = DATABASE_URL.split("///")[-1]
-        db_dir = os.path.dirname(db_path)
-        if db_dir:
-            os.makedirs(db_dir, exist_ok=True)
+    # Ensure data directory exists if using a SQLite file
+    if SQLITE_DIR:
+        os.makedirs(SQLITE_DIR, exist_ok=True)
+
+    if not IS_SQLITE:
+        await _enable_pg_trgm()
 
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # create_all skips existing tables, so add columns and indexes introduced since
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_convert_naive_timestamps)
+        await conn.run_sync(_dedupe_hotspot_summary)
+        await conn.run_sync(_create_missing_indexes)
+        await conn.run_sync(_drop_superseded_indexes)
+        await conn.run_sync(_backfill_api_key_tiers)
+
+
+async def _enable_pg_trgm() -> None:
+    """Install pg_trgm for the trigram text indexes, where this role is allowed to."""
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except Exception as e:
+        # The indexes are skipped without it; substring filters still work, unindexed
+        logger.warning(
+            f"pg_trgm extension unavailable, trigram indexes not created: {e}"
+        )
+
+
+def _add_missing_columns(sync_conn) -> None:
+    """Add any model column that doesn't exist yet on an existing table."""
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = str(CreateColumn(column).compile(dialect=sync_conn.dialect))
+            if IS_SQLITE and column.computed is not None:
+                # SQLite can only add generated columns as VIRTUAL (still indexable)
+                ddl = ddl.replace(" STORED", " VIRTUAL")
+            sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+            logger.info(f"Added column {table.name}.{column.name}")
+
+
+def _convert_naive_timestamps(sync_conn) -> None:
+    """Convert PostgreSQL columns the models declare timezone-aware to timestamptz."""
+    if IS_SQLITE:
+        # SQLite has no timestamp types; values are stored the same either way
+        return
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        existing = inspector.get_columns(table.name)
+        for statement in _timestamptz_conversions(table, existing):
+            sync_conn.execute(text(statement))
+            logger.info(f"Converted {table.name} column to timestamptz: {statement}")
+
+
+def _timestamptz_conversions(table, existing_columns) -> List[str]:
+    """ALTER statements turning naive timestamp columns of table into timestamptz.
+
+    Stored values were written as naive UTC, so they are read AT TIME ZONE 'UTC'.
+    Columns already timezone-aware produce no statements, which keeps startup
+    idempotent.
+    """
+    existing = {column["name"]: column for column in existing_columns}
+    statements = []
+    for column in table.columns:
+        if not (isinstance(column.type, DateTime) and column.type.timezone):
+            continue
+        current = existing.get(column.name)
+        if current is None or getattr(current["type"], "timezone", False):
+            continue
+        # Quoted, since "timestamp" is also a type name
+        name = f'"{column.name}"'
+        statements.append(
+            f"ALTER TABLE {table.name} ALTER COLUMN {name} TYPE timestamptz "
+            f"USING {name} AT TIME ZONE 'UTC'"
+        )
+        if column.server_default is not None and current.get("default") is None:
+            # The old columns had Python-side defaults; inserts now rely on now()
+            default = column.server_default.arg.compile(dialect=postgresql.dialect())
+            statements.append(
+                f"ALTER TABLE {table.name} ALTER COLUMN {name} SET DEFAULT {default}"
+            )
+    return statements
+
+
+def _create_missing_indexes(sync_conn) -> None:
+    """Create any model index that doesn't exist yet on an existing table."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+# Single-column indexes replaced by composite ones in api.models. Databases
+# created before the change still carry them, so they are dropped by name.
+SUPERSEDED_INDEXES = (
+    # Leading columns of ix_sightings_state_date / ix_sightings_source_date
+    "ix_sightings_state",
+    "ix_sightings_source",
+    # Timestamp ranges are per key, served by ix_usage_apikey_ts
+    "ix_usage_timestamp",
+    # Leading column of ix_research_lookup
+    "ix_research_cache_sighting_id",
+    # Covered by ix_sightings_lat_lng
+    "ix_sightings_latitude",
+    "ix_sightings_longitude",
+    # Leading column of ix_sightings_date_id
+    "ix_sightings_date_time",
+)
+
+
+def _drop_superseded_indexes(sync_conn) -> None:
+    """Drop indexes the models no longer declare because a composite covers them."""
+    for name in SUPERSEDED_INDEXES:
+        sync_conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _dedupe_hotspot_summary(sync_conn) -> None:
+    """Keep one hotspot_summary row per (city, state) so the unique index can build.
+
+    Concurrent rebuilds used to be able to insert the summary twice. The rows
+    are derived from sightings, so dropping the extra copies loses nothing.
+    """
+    hotspots = HotspotSummary.__table__
+    keep = select(func.min(hotspots.c.id)).group_by(hotspots.c.city, hotspots.c.state)
+    result = sync_conn.execute(hotspots.delete().where(hotspots.c.id.not_in(keep)))
+    if result.rowcount:
+        logger.warning(f"Removed {result.rowcount} duplicate hotspot summary rows")
+
+
+def _backfill_api_key_tiers(sync_conn) -> None:
+    """Move keys with a tier outside Tier (e.g. "platinum") to the free tier.
+
+    Before tiers were an enum any string was stored, and such keys got free
+    tier limits. The ORM can't load those values into Tier, so they are
+    rewritten before any request reads them.
+    """
+    api_keys = ApiKey.__table__
+    result = sync_conn.execute(
+        api_keys.update()
+        .where(api_keys.c.tier.not_in([tier.value for tier in Tier]))
+        .values(tier=Tier.FREE.value)
+    )
+    if result.rowcount:
+        logger.warning(f"Moved {result.rowcount} API keys with unknown tiers to free")
+
+
+async def warm_pool() -> None:
+    """Open the pool's base connections up front.
+
+    The pool connects lazily, so without this the first requests after a
+    deploy pay for TCP/TLS setup and authentication. SQLite connections are
+    local and cheap, so only server databases are warmed.
+    """
+    if IS_SQLITE:
+        return
+
+    # Hold all connections at once so each checkout opens a new one
+    connections = [engine.connect() for _ in range(ENGINE_KWARGS.get("pool_size", 5))]
+    try:
+        await asyncio.gather(
+            *(conn.start() for conn in connections), return_exceptions=True
+        )
+    finally:
+        # Closing returns them to the pool, where they stay open for requests
+        await asyncio.gather(
+            *(conn.close() for conn in connections), return_exceptions=True
+        )
+
+
+# One lock file per database, shared by every worker on this host
+STARTUP_LOCK_PATH = os.path.join(
+    tempfile.gettempdir(),
+    f"skywatch-init-{hashlib.sha256(DATABASE_URL.encode()).hexdigest()[:16]}.lock",
+)
+
+
+@asynccontextmanager
+async def startup_lock():
+    """Serialize one-time database setup across worker processes.
+
+    With ``--workers N`` every worker runs the lifespan; holding an exclusive
+    file lock means only one of them creates tables / loads demo data at a
+    time, and the rest find the work already done. In-memory SQLite databases
+    are private to each process, so they don't take the lock.
+    """
+    if IS_MEMORY_SQLITE or fcntl is None:
+        yield
+        return
+
+    with open(STARTUP_LOCK_PATH, "w") as lock_file:
+        # Waiting for another worker's setup must not block this event loop
+        await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
 
 
 async def drop_tables():
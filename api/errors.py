@@ -1,17 +1,22 @@
 """Centralized error handling and custom exceptions."""
 
-import uuid
+import logging
+import secrets
+import time
 from typing import Optional, Dict, Any
 from datetime import datetime, UTC
 from fastapi import Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from pydantic import BaseModel
 
+logger = logging.getLogger(__name__)
+
 
 class ErrorDetail(BaseModel):
     """Detailed error information."""
+
     error: str
     message: str
     details: Optional[Dict[str, Any]] = None
@@ -23,12 +28,13 @@ class ErrorDetail(BaseModel):
 
 class APIException(Exception):
     """Base exception for API errors."""
+
     def __init__(
         self,
         error: str,
         message: str,
         status_code: int = status.HTTP_400_BAD_REQUEST,
-        details: Optional[Dict[str, Any]] = None
+        details: Optional[Dict[str, Any]] = None,
     ):
         self.error = error
         self.message = message
@@ -39,53 +45,63 @@ class APIException(Exception):
 
 class AuthenticationError(APIException):
     """Raised when authentication fails."""
-    def __init__(self, message: str = "Authentication required", details: Optional[Dict[str, Any]] = None):
+
+    def __init__(
+        self,
+        message: str = "Authentication required",
+        details: Optional[Dict[str, Any]] = None,
+    ):
         super().__init__(
             error="authentication_error",
             message=message,
             status_code=status.HTTP_401_UNAUTHORIZED,
-            details=details
+            details=details,
         )
 
 
 class AuthorizationError(APIException):
     """Raised when authorization fails."""
-    def __init__(self, message: str = "Insufficient permissions", details: Optional[Dict[str, Any]] = None):
+
+    def __init__(
+        self,
+        message: str = "Insufficient permissions",
+        details: Optional[Dict[str, Any]] = None,
+    ):
         super().__init__(
             error="authorization_error",
             message=message,
             status_code=status.HTTP_403_FORBIDDEN,
-            details=details
+            details=details,
         )
 
 
 class NotFoundError(APIException):
     """Raised when a resource is not found."""
+
     def __init__(self, resource: str, identifier: Any):
         super().__init__(
             error="not_found",
             message=f"{resource} not found",
             status_code=status.HTTP_404_NOT_FOUND,
-            details={"resource": resource, "identifier": str(identifier)}
+            details={"resource": resource, "identifier": str(identifier)},
         )
 
 
 class RateLimitError(APIException):
     """Raised when rate limit is exceeded."""
+
     def __init__(self, limit: int, reset_time: datetime):
         super().__init__(
             error="rate_limit_exceeded",
             message="Rate limit exceeded",
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            details={
-                "limit": limit,
-                "reset_time": reset_time.isoformat()
-            }
+            details={"limit": limit, "reset_time": reset_time.isoformat()},
         )
 
 
 class QuotaExceededError(APIException):
     """Raised when quota is exceeded."""
+
     def __init__(self, quota_limit: int, quota_used: int, reset_date: datetime):
         super().__init__(
             error="quota_exceeded",
@@ -94,110 +110,137 @@ class QuotaExceededError(APIException):
             details={
                 "quota_limit": quota_limit,
                 "quota_used": quota_used,
-                "reset_date": reset_date.isoformat()
-            }
+                "reset_date": reset_date.isoformat(),
+            },
         )
 
 
 class ValidationError(APIException):
     """Raised when input validation fails."""
+
     def __init__(self, message: str, details: Optional[Dict[str, Any]] = None):
         super().__init__(
             error="validation_error",
             message=message,
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            details=details
+            details=details,
         )
 
 
+def _build_error_type_table() -> tuple[str, ...]:
+    """Build the status code -> error type table used by http_exception_handler."""
+    table = ["http_error"] * 600
+    table[400] = "bad_request"
+    table[401] = "authentication_error"
+    table[403] = "authorization_error"
+    table[404] = "not_found"
+    table[405] = "method_not_allowed"
+    table[429] = "rate_limit_exceeded"
+    table[500] = "internal_server_error"
+    table[503] = "service_unavailable"
+    return tuple(table)
+
+
+# Indexed directly by HTTP status code
+ERROR_TYPE_BY_STATUS = _build_error_type_table()
+
+
+# (epoch second, ISO-8601 string) of the last error timestamp, reused within a second
+_last_timestamp = (0, "")
+
+
+def _error_timestamp() -> str:
+    """Get the current UTC timestamp at one-second resolution."""
+    global _last_timestamp
+    second = int(time.time())
+    if _last_timestamp[0] != second:
+        _last_timestamp = (second, datetime.fromtimestamp(second, UTC).isoformat())
+    return _last_timestamp[1]
+
+
 def create_error_response(
     request: Request,
     error: str,
     message: str,
     status_code: int,
-    details: Optional[Dict[str, Any]] = None
-) -> JSONResponse:
+    details: Optional[Dict[str, Any]] = None,
+) -> Response:
     """Create a standardized error response."""
     error_detail = ErrorDetail(
         error=error,
         message=message,
         details=details,
-        request_id=str(uuid.uuid4()),
-        timestamp=datetime.now(UTC).isoformat(),
+        request_id=secrets.token_hex(16),
+        timestamp=_error_timestamp(),
         path=request.url.path,
-        method=request.method
+        method=request.method,
     )
-    
-    return JSONResponse(
+
+    # Serialize straight to JSON bytes, skipping the intermediate dict
+    return Response(
+        content=error_detail.model_dump_json(exclude_none=True),
         status_code=status_code,
-        content=error_detail.model_dump(exclude_none=True)
+        media_type="application/json",
     )
 
 
-async def api_exception_handler(request: Request, exc: APIException) -> JSONResponse:
+async def api_exception_handler(request: Request, exc: APIException) -> Response:
     """Handle custom API exceptions."""
     return create_error_response(
         request=request,
         error=exc.error,
         message=exc.message,
         status_code=exc.status_code,
-        details=exc.details
+        details=exc.details,
     )
 
 
-async def http_exception_handler(request: Request, exc: StarletteHTTPException) -> JSONResponse:
+async def http_exception_handler(
+    request: Request, exc: StarletteHTTPException
+) -> Response:
     """Handle standard HTTP exceptions."""
-    error_mapping = {
-        400: "bad_request",
-        401: "authentication_error",
-        403: "authorization_error",
-        404: "not_found",
-        405: "method_not_allowed",
-        429: "rate_limit_exceeded",
-        500: "internal_server_error",
-        503: "service_unavailable"
-    }
-    
-    error_type = error_mapping.get(exc.status_code, "http_error")
-    
+    status_code = exc.status_code
+    error_type = (
+        ERROR_TYPE_BY_STATUS[status_code] if 0 <= status_code < 600 else "http_error"
+    )
+
     return create_error_response(
         request=request,
         error=error_type,
         message=exc.detail or "An error occurred",
         status_code=exc.status_code,
-        details={"status_code": exc.status_code}
+        details={"status_code": exc.status_code},
     )
 
 
-async def validation_exception_handler(request: Request, exc: RequestValidationError) -> JSONResponse:
+async def validation_exception_handler(
+    request: Request, exc: RequestValidationError
+) -> Response:
     """Handle request validation errors."""
     errors = []
     for error in exc.errors():
         field_path = " -> ".join(str(loc) for loc in error["loc"])
-        errors.append({
-            "field": field_path,
-            "message": error["msg"],
-            "type": error["type"]
-        })
-    
+        errors.append(
+            {"field": field_path, "message": error["msg"], "type": error["type"]}
+        )
+
     return create_error_response(
         request=request,
         error="validation_error",
         message="Request validation failed",
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-        details={"errors": errors}
+        details={"errors": errors},
     )
 
 
-async def generic_exception_handler(request: Request, exc: Exception) -> JSONResponse:
+async def generic_exception_handler(request: Request, exc: Exception) -> Response:
     """Handle unexpected exceptions."""
-    # In production, you'd want to log this properly
-    print(f"Unexpected error: {type(exc).__name__}: {str(exc)}")
-    
+    logger.error(f"Unexpected error: {type(exc).__name__}: {str(exc)}", exc_info=exc)
+
     return create_error_response(
         request=request,
         error="internal_server_error",
         message="An unexpected error occurred",
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        details={"type": type(exc).__name__} if request.app.debug else None
-    )
\ No newline at end of file
+        details={"type": type(exc).__name__} if request.app.debug else None,
+    )
@@ -0,0 +1,148 @@
+"""Shared sighting filters for the query endpoints."""
+
+import re
+from math import cos, pi, radians, sin
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import ColumnElement, and_, false, func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.cache import TTLCache
+from api.database import IS_SQLITE
+from api.errors import ValidationError
+from api.models import Sighting
+
+# Distinct stored shape values; they only change when an import runs
+KNOWN_SHAPES_TTL = 3600  # seconds
+_known_shapes_cache = TTLCache(maxsize=1, ttl=KNOWN_SHAPES_TTL)
+
+# "south,west,north,east" as plain decimal degrees
+_COORD = r"(-?\d+(?:\.\d*)?)"
+_BOUNDS_RE = re.compile(rf"^{_COORD},{_COORD},{_COORD},{_COORD}$")
+
+
+async def known_shapes(db: AsyncSession) -> frozenset:
+    """Return the distinct shapes stored in the sightings table."""
+    shapes = _known_shapes_cache.get("shapes")
+    if shapes is None:
+        result = await db.execute(select(Sighting.shape).distinct())
+        shapes = frozenset(result.scalars().all())
+        _known_shapes_cache.set("shapes", shapes)
+    return shapes
+
+
+async def shape_filter(db: AsyncSession, shape: str) -> ColumnElement:
+    """Filter by shape; an indexed equality when a substring can only hit one shape."""
+    needle = shape.lower()
+    # "disk" is exact, but "ball" also matches "fireball", so it stays a substring match
+    matches = [known for known in await known_shapes(db) if needle in known.lower()]
+    if matches == [needle]:
+        return Sighting.shape == needle
+    return Sighting.shape.ilike(f"%{shape}%")
+
+
+def state_filters(state: str) -> List[ColumnElement]:
+    """Filter by a state code, or by the "US" / "INTERNATIONAL" groups."""
+    state = state.upper()
+    if state == "US":
+        # Show only US states (2-letter codes)
+        return [Sighting.is_us == true()]
+    if state == "INTERNATIONAL":
+        # Show only international sightings (non-US or null states)
+        return [Sighting.is_us == false()]
+    # Show specific state
+    return [Sighting.state == state]
+
+
+def parse_bounds(bounds: str) -> Tuple[float, float, float, float]:
+    """Parse a bounds parameter into (south, west, north, east)."""
+    match = _BOUNDS_RE.match(bounds)
+    if match is None:
+        # Rejected rather than ignored, so a typo doesn't return the whole map
+        raise ValidationError(
+            "Invalid bounds, expected 'south,west,north,east'",
+            details={"bounds": bounds},
+        )
+    south, west, north, east = (float(value) for value in match.groups())
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise ValidationError(
+            "Invalid bounds, latitudes must be within [-90, 90], longitudes within "
+            "[-180, 180], and each minimum must not exceed its maximum",
+            details={"bounds": bounds},
+        )
+    return south, west, north, east
+
+
+def within_bounds(
+    south: float, west: float, north: float, east: float
+) -> ColumnElement:
+    """Filter sightings to a lat/lng bounding box, using the backend's spatial index."""
+    if IS_SQLITE:
+        # Served by the (latitude, longitude) index
+        return and_(
+            Sighting.latitude.between(south, north),
+            Sighting.longitude.between(west, east),
+        )
+    # Must match the ix_sightings_location_gist expression for the index to apply
+    return func.point(Sighting.longitude, Sighting.latitude).op("<@")(
+        func.box(func.point(west, south), func.point(east, north))
+    )
+
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def within_radius(lat: float, lng: float, radius_km: float) -> ColumnElement:
+    """Filter sightings to a great-circle distance from a point, evaluated in SQL.
+
+    Compares the haversine term against its value at radius_km, which orders the
+    same as the distance itself but needs only sin/cos in SQL (no asin/acos, whose
+    domain rounding errors PostgreSQL reports as errors).
+    """
+    to_radians = pi / 180
+    lat_rad = radians(lat)
+    half_dlat = (Sighting.latitude * to_radians - lat_rad) / 2
+    half_dlng = (Sighting.longitude * to_radians - radians(lng)) / 2
+    haversine = func.sin(half_dlat) * func.sin(half_dlat) + cos(lat_rad) * func.cos(
+        Sighting.latitude * to_radians
+    ) * func.sin(half_dlng) * func.sin(half_dlng)
+    return haversine <= sin(radius_km / (2 * EARTH_RADIUS_KM)) ** 2
+
+
+async def build_sighting_filters(
+    db: AsyncSession,
+    state: Optional[str] = None,
+    shape: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    city: Optional[str] = None,
+    source: Optional[str] = None,
+    bounds: Optional[str] = None,
+) -> List[ColumnElement]:
+    """Build the WHERE clauses for the common sighting query parameters."""
+    filters = []
+
+    if state:
+        filters.extend(state_filters(state))
+
+    if city:
+        filters.append(Sighting.city.ilike(f"%{city}%"))
+
+    if shape:
+        filters.append(await shape_filter(db, shape))
+
+    if source:
+        filters.append(Sighting.source == source)
+
+    if date_from:
+        filters.append(Sighting.date_time >= date_from)
+
+    if date_to:
+        filters.append(Sighting.date_time <= date_to)
+
+    # Viewport bounds
+    if bounds:
+        filters.append(within_bounds(*parse_bounds(bounds)))
+
+    return filters
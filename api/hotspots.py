@@ -0,0 +1,123 @@
+"""Scheduled rebuilds of the hotspot summary table."""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import delete, func, insert, select, text
+
+from api.config import settings
+from api.database import IS_SQLITE, get_db_session
+from api.models import HotspotSummary, Sighting
+
+logger = logging.getLogger(__name__)
+
+
+async def refresh_hotspot_summary() -> int:
+    """Rebuild the per-location aggregates from sightings. Returns the row count."""
+    aggregates = (
+        select(
+            Sighting.city,
+            Sighting.state,
+            func.avg(Sighting.latitude),
+            func.avg(Sighting.longitude),
+            func.count(),
+            func.min(Sighting.date_time),
+            func.max(Sighting.date_time),
+        )
+        .where(Sighting.latitude.isnot(None), Sighting.longitude.isnot(None))
+        .group_by(Sighting.city, Sighting.state)
+    )
+
+    # Replaced in one transaction, so readers see either the old or the new summary
+    async with get_db_session() as session:
+        if not IS_SQLITE:
+            # Every worker runs this loop. Without the lock, a worker whose DELETE
+            # waited on another's rebuild would delete nothing (READ COMMITTED can't
+            # see the new rows) and insert a second copy. Readers aren't blocked.
+            await session.execute(text("LOCK TABLE hotspot_summary IN EXCLUSIVE MODE"))
+        await session.execute(delete(HotspotSummary))
+        result = await session.execute(
+            insert(HotspotSummary).from_select(
+                [
+                    HotspotSummary.city,
+                    HotspotSummary.state,
+                    HotspotSummary.latitude,
+                    HotspotSummary.longitude,
+                    HotspotSummary.sighting_count,
+                    HotspotSummary.earliest_sighting,
+                    HotspotSummary.latest_sighting,
+                ],
+                aggregates,
+            )
+        )
+        await session.commit()
+    return result.rowcount
+
+
+class HotspotSummaryRefresher:
+    """Periodically rebuilds the hotspot summary so requests read precomputed rows.
+
+    Sightings only change when a batch import runs, so a daily rebuild moves the
+    GROUP BY over the whole table out of the request path. Until this process has
+    completed a rebuild (e.g. no lifespan, as under the test client) the summary
+    may be missing or stale, and the hotspots endpoint aggregates sightings itself.
+    """
+
+    def __init__(self, interval: float = 86400.0):
+        self.interval = interval
+        self.ready = False
+        self._listeners: List[Callable[[], Awaitable[None]]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def add_listener(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Await callback after each successful rebuild, e.g. to precompute output."""
+        self._listeners.append(callback)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                count = await refresh_hotspot_summary()
+                self.ready = True
+                logger.info(f"Rebuilt hotspot summary with {count} locations")
+            except Exception as e:
+                logger.error(f"Failed to rebuild hotspot summary: {e}")
+            else:
+                await self._notify_listeners()
+            await asyncio.sleep(self.interval)
+
+    async def _notify_listeners(self) -> None:
+        for listener in self._listeners:
+            try:
+                await listener()
+            except Exception as e:
+                logger.error(
+                    f"Hotspot summary listener {listener.__name__} failed: {e}"
+                )
+
+    def start(self) -> None:
+        """Start the rebuild loop on the running event loop."""
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the rebuild loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.ready = False
+
+
+# Global hotspot summary refresher instance
+hotspot_summary_refresher = HotspotSummaryRefresher(
+    interval=settings.HOTSPOT_REFRESH_INTERVAL
+)
@@ -0,0 +1,59 @@
+"""Non-blocking logging setup for the application."""
+
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_queue_handler: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(
+    level: int = logging.INFO, handler: Optional[logging.Handler] = None
+) -> None:
+    """Route application logs through a queue drained by a background thread.
+
+    Handlers that write to stdout can block when it is a pipe to a slow sink
+    (journald, Docker's json-file driver). With a QueueHandler the event loop
+    only enqueues the record; the listener thread does the actual I/O.
+
+    Records go to handler, a stderr StreamHandler by default. Calling this
+    again is a no-op until shutdown_logging(), after which it sets up a fresh
+    listener, so every application lifespan (reloads, tests) gets a live one.
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        return
+
+    if handler is None:
+        handler = logging.StreamHandler()
+    if handler.formatter is None:
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    _queue_handler = QueueHandler(log_queue)
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+    app_logger = logging.getLogger("api")
+    app_logger.setLevel(level)
+    app_logger.addHandler(_queue_handler)
+    # The listener is the only output for app records; root handlers would repeat them
+    app_logger.propagate = False
+
+
+def shutdown_logging() -> None:
+    """Detach the queue handler and flush any pending records."""
+    global _queue_handler, _listener
+    if _listener is None:
+        return
+
+    app_logger = logging.getLogger("api")
+    app_logger.removeHandler(_queue_handler)
+    app_logger.propagate = True
+    _listener.stop()
+    _queue_handler = None
+    _listener = None
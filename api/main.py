@@ -1,121 +1,170 @@
+import asyncio
+import hashlib
+import logging
 from contextlib import asynccontextmanager
+from typing import NamedTuple
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.openapi.docs import get_swagger_ui_html
-from fastapi.openapi.utils import get_openapi
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.exceptions import RequestValidationError
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from api.routers import health, sightings, auth, map, research
-from api.database import create_tables, get_db_session
+from api.database import create_tables, get_db_session, startup_lock, warm_pool
 from api.middleware import APIKeyMiddleware
+from api.usage import usage_recorder
+from api.hotspots import hotspot_summary_refresher
+from api.quota import quota_reset_scheduler
+from api.research_cache import research_cache_pruner, research_hit_recorder
+from api.revocation import revocation_bus
+from api.logging_config import setup_logging, shutdown_logging
 from api.config import settings
 from api.models import Sighting
+from sqlalchemy import func, select
 from datetime import datetime
 from api.errors import (
     APIException,
     api_exception_handler,
     http_exception_handler,
     validation_exception_handler,
-    generic_exception_handler
 )
 
+# Log records are written by a background thread, never on the event loop
+setup_logging()
+logger = logging.getLogger(__name__)
+
 
 async def load_demo_data():
     """Load sample UFO sighting data for production demo."""
     demo_sightings = [
         {
             "date_time": datetime(2023, 7, 4, 21, 30),
-            "city": "Phoenix", "state": "AZ", "shape": "triangle",
-            "duration": "5 minutes", "summary": "Large triangular craft with bright lights",
-            "text": "Witnessed a large triangular craft with three bright lights at each corner moving silently across the night sky.",
-            "posted": datetime(2023, 7, 5), "latitude": 33.4484, "longitude": -112.0740,
-            "source": "nuforc"
+            "city": "Phoenix",
+            "state": "AZ",
+            "shape": "triangle",
+            "duration": "5 minutes",
+            "summary": "Large triangular craft with bright lights",
+            "text": (
+                "Witnessed a large triangular craft with three bright lights at each "
+                "corner moving silently across the night sky."
+            ),
+            "posted": datetime(2023, 7, 5),
+            "latitude": 33.4484,
+            "longitude": -112.0740,
+            "source": "nuforc",
         },
         {
             "date_time": datetime(2023, 8, 15, 22, 45),
-            "city": "Los Angeles", "state": "CA", "shape": "disk",
-            "duration": "2 minutes", "summary": "Metallic disk hovering above highway",
-            "text": "A metallic disk-shaped object was observed hovering motionless above the 405 freeway before accelerating rapidly.",
-            "posted": datetime(2023, 8, 16), "latitude": 34.0522, "longitude": -118.2437,
-            "source": "ufo_aficionado"
+            "city": "Los Angeles",
+            "state": "CA",
+            "shape": "disk",
+            "duration": "2 minutes",
+            "summary": "Metallic disk hovering above highway",
+            "text": (
+                "A metallic disk-shaped object was observed hovering motionless above "
+                "the 405 freeway before accelerating rapidly."
+            ),
+            "posted": datetime(2023, 8, 16),
+            "latitude": 34.0522,
+            "longitude": -118.2437,
+            "source": "ufo_aficionado",
         },
         {
             "date_time": datetime(2023, 9, 22, 20, 15),
-            "city": "Chicago", "state": "IL", "shape": "light",
-            "duration": "10 minutes", "summary": "Pulsating orange lights in formation",
-            "text": "Multiple orange lights pulsating in a V-formation moved slowly across Lake Michigan.",
-            "posted": datetime(2023, 9, 23), "latitude": 41.8781, "longitude": -87.6298,
-            "source": "nuforc"
-        }
+            "city": "Chicago",
+            "state": "IL",
+            "shape": "light",
+            "duration": "10 minutes",
+            "summary": "Pulsating orange lights in formation",
+            "text": (
+                "Multiple orange lights pulsating in a V-formation moved slowly across "
+                "Lake Michigan."
+            ),
+            "posted": datetime(2023, 9, 23),
+            "latitude": 41.8781,
+            "longitude": -87.6298,
+            "source": "nuforc",
+        },
     ]
-    
+
     try:
         async with get_db_session() as session:
-            for sighting_data in demo_sightings:
-                sighting = Sighting(**sighting_data)
-                session.add(sighting)
+            # Skip on warm starts so restarts don't duplicate the demo rows
+            existing = await session.scalar(select(func.count()).select_from(Sighting))
+            if existing:
+                logger.info(f"Demo data skipped: {existing} sightings already present")
+                return
+
+            session.add_all(
+                [Sighting(**sighting_data) for sighting_data in demo_sightings]
+            )
             await session.commit()
-            print(f"✅ Loaded {len(demo_sightings)} demo sightings")
+            logger.info(f"Loaded {len(demo_sightings)} demo sightings")
     except Exception as e:
-        print(f"⚠️ Could not load demo data: {e}")
+        logger.warning(f"Could not load demo data: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handle application startup and shutdown."""
-    # Startup
+    # Startup; re-arms logging if a previous lifespan shut it down
+    setup_logging()
+    logger.info(f"Event loop: {type(asyncio.get_running_loop()).__module__}")
     try:
-        await create_tables()
-        print("Database tables created/verified")
-        
-        # In production with in-memory database, add some demo data
-        if settings.ENVIRONMENT == "production":
-            print("Production mode: Using in-memory database with demo data")
-            await load_demo_data()
-            
+        # Only one worker at a time runs setup; later ones see existing tables and rows
+        async with startup_lock():
+            await create_tables()
+            logger.info("Database tables created/verified")
+
+            # In production with in-memory database, add some demo data
+            if settings.ENVIRONMENT == "production":
+                logger.info("Production mode: Using in-memory database with demo data")
+                await load_demo_data()
+
+        await warm_pool()
+
     except Exception as e:
-        print(f"Database initialization warning: {e}")
+        logger.warning(f"Database initialization warning: {e}")
         # Continue startup even if database setup fails
-    
+
+    usage_recorder.start()
+    quota_reset_scheduler.start()
+    research_cache_pruner.start()
+    research_hit_recorder.start()
+    hotspot_summary_refresher.start()
+    revocation_bus.start()
+
     yield
     # Shutdown
-    print("Application shutdown")
+    await revocation_bus.stop()
+    await hotspot_summary_refresher.stop()
+    await research_hit_recorder.stop()
+    await research_cache_pruner.stop()
+    await quota_reset_scheduler.stop()
+    await usage_recorder.stop()
+    logger.info("Application shutdown")
+    shutdown_logging()
 
 
 app = FastAPI(
     title=settings.API_TITLE,
-    description="API for querying UFO sighting reports sourced from the National UFO Reporting Center (NUFORC) database",
+    description=(
+        "API for querying UFO sighting reports sourced from the National UFO "
+        "Reporting Center (NUFORC) database"
+    ),
     version=settings.API_VERSION,
     docs_url=None,  # Disable default docs
     redoc_url="/redoc",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# Security Headers Middleware
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        
-        # Add HSTS header for production
-        if settings.ENVIRONMENT == "production":
-            response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        
-        return response
-
-# Add middleware in correct order (from outermost to innermost)
-# 1. Security headers (outermost)
-app.add_middleware(SecurityHeadersMiddleware)
-
-# 2. CORS
+# Add middleware (each add_middleware call wraps the earlier ones; last is outermost)
+# 1. CORS
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS,
@@ -124,48 +173,93 @@ app.add_middleware(
     allow_headers=settings.CORS_ALLOW_HEADERS,
 )
 
-# 3. Trusted Host (prevent host header attacks)
+# 2. Trusted Host (prevent host header attacks)
 if settings.ENVIRONMENT == "production":
     app.add_middleware(
         TrustedHostMiddleware,
-        allowed_hosts=["api.skywatch.io", "*.skywatch.io"],  # Update with your actual domain
+        allowed_hosts=[
+            "api.skywatch.io",
+            "*.skywatch.io",
+        ],  # Update with your actual domain
     )
 
-# 4. API key middleware (innermost)
+# 3. API key middleware (outermost); also adds the security headers to every response
 app.add_middleware(APIKeyMiddleware)
 
 # Mount static files and templates
 app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+# Templates never change while the process runs, so skip the mtime check on each load
+templates = Jinja2Templates(
+    env=Environment(
+        loader=FileSystemLoader("templates"),
+        autoescape=select_autoescape(),
+        auto_reload=False,
+        cache_size=-1,
+    )
+)
+
+# Browsers may reuse pre-rendered pages briefly before revalidating with the ETag
+PRERENDERED_CACHE_CONTROL = "public, max-age=300"
+
+
+class PrerenderedPage(NamedTuple):
+    """HTML page rendered once at startup, with its ETag."""
+
+    body: bytes
+    etag: str
+
+
+def prerender_page(html: str | bytes) -> PrerenderedPage:
+    """Encode a static HTML page and compute its ETag."""
+    body = html.encode("utf-8") if isinstance(html, str) else html
+    return PrerenderedPage(body=body, etag=f'"{hashlib.md5(body).hexdigest()}"')
+
+
+def serve_prerendered(request: Request, page: PrerenderedPage) -> Response:
+    """Serve a pre-rendered page, answering conditional requests with 304."""
+    headers = {"ETag": page.etag, "Cache-Control": PRERENDERED_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == page.etag:
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(page.body, headers=headers)
+
+
+# These pages have no per-request content, so render them once
+LANDING_PAGE = prerender_page(templates.get_template("landing.html").render())
+MAP_PAGE = prerender_page(templates.get_template("map.html").render())
+DOCS_PAGE = prerender_page(templates.get_template("docs.html").render())
+SWAGGER_PAGE = prerender_page(
+    get_swagger_ui_html(
+        openapi_url=app.openapi_url,
+        title=app.title + " - Swagger UI",
+        swagger_css_url="/static/custom-swagger.css",
+    ).body
+)
 
 
 # Landing page
 @app.get("/", include_in_schema=False)
 async def landing_page(request: Request):
     """SkyWatch API landing page."""
-    return templates.TemplateResponse("landing.html", {"request": request})
+    return serve_prerendered(request, LANDING_PAGE)
 
 
 # Custom docs endpoint with Stripe-inspired design
 @app.get("/docs", include_in_schema=False)
 async def custom_docs(request: Request):
-    return templates.TemplateResponse("docs.html", {"request": request})
+    return serve_prerendered(request, DOCS_PAGE)
 
 
 # Interactive map endpoint
 @app.get("/map", include_in_schema=False)
 async def sightings_map(request: Request):
     """Interactive map showing UFO sightings geographically."""
-    return templates.TemplateResponse("map.html", {"request": request})
+    return serve_prerendered(request, MAP_PAGE)
+
 
 # Keep Swagger UI available at /swagger for development
 @app.get("/swagger", include_in_schema=False)
-async def swagger_ui_html():
-    return get_swagger_ui_html(
-        openapi_url=app.openapi_url,
-        title=app.title + " - Swagger UI",
-        swagger_css_url="/static/custom-swagger.css",
-    )
+async def swagger_ui_html(request: Request):
+    return serve_prerendered(request, SWAGGER_PAGE)
 
 
 # Register exception handlers
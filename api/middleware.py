@@ -1,299 +1,468 @@
 """Middleware for API key validation, rate limiting, and usage tracking."""
 
 import time
-from collections import defaultdict, deque
 from datetime import datetime, UTC
-from typing import Dict, Deque
+from typing import Dict, Tuple
 
-from fastapi import Request, Response, HTTPException, status
-from fastapi.responses import JSONResponse
-from sqlalchemy import select, update
+from fastapi import Request, status
+from sqlalchemy import Row, bindparam, case, lambda_stmt, or_, select, true, update
+from sqlalchemy.orm import joinedload
 
+from api.authctx import current_api_key
+from api.config import settings
 from api.database import get_db_session
-from api.models import ApiKey, Usage
-from api.auth import verify_api_key, get_rate_limit_for_tier, is_quota_expired
-from api.errors import create_error_response, AuthenticationError, RateLimitError, QuotaExceededError
+from api.models import ApiKey
+from api.usage import UsageEvent, usage_recorder
+from api.auth import (
+    ApiKeySnapshot,
+    verify_api_key_async,
+    hash_api_key,
+    api_key_cache,
+    cache_api_key,
+    invalid_api_key_cache,
+    get_rate_limit_for_tier,
+    calculate_quota_reset_date,
+)
+from api.errors import create_error_response
+
+# Per-request key lookups, built once; as lambda statements their cache key is
+# the code location, so SQLAlchemy skips rebuilding and re-keying them per call.
+# The owning user is joined in, so it is cached with the key.
+_ACTIVE_API_KEY_BY_HASH = lambda_stmt(
+    lambda: select(ApiKey)
+    .options(joinedload(ApiKey.user))
+    .where(ApiKey.key_hash == bindparam("key_hash"), ApiKey.is_active == true())
+)
+_ACTIVE_LEGACY_API_KEYS = lambda_stmt(
+    lambda: select(ApiKey)
+    .options(joinedload(ApiKey.user))
+    .where(ApiKey.is_active == true(), ApiKey.key_hash.startswith("$2"))
+)
+
+# Counts one request against an active key's quota, starting a new period
+# first if the reset date has passed. The check and the increment are one
+# statement, so concurrent requests (in any worker) can't overshoot the limit.
+# Core (not ORM) statement, like the usage counters in api.usage.
+_api_keys = ApiKey.__table__
+_quota_period_over = _api_keys.c.quota_reset_date <= bindparam(
+    "now", type_=_api_keys.c.quota_reset_date.type
+)
+_CONSUME_QUOTA = (
+    update(_api_keys)
+    .where(
+        _api_keys.c.id == bindparam("key_id"),
+        _api_keys.c.is_active == true(),
+        or_(_quota_period_over, _api_keys.c.quota_used < _api_keys.c.quota_limit),
+    )
+    .values(
+        quota_used=case((_quota_period_over, 1), else_=_api_keys.c.quota_used + 1),
+        quota_reset_date=case(
+            (
+                _quota_period_over,
+                bindparam("next_reset", type_=_api_keys.c.quota_reset_date.type),
+            ),
+            else_=_api_keys.c.quota_reset_date,
+        ),
+    )
+    .returning(_api_keys.c.quota_used)
+)
 
 
 # In-memory rate limiting storage (in production, use Redis)
 class RateLimiter:
+    """Sliding-window rate limiter using per-key window counters.
+
+    Rather than keeping a timestamp per request, each key stores the counts for
+    the current and previous hourly windows. The previous window's count is
+    weighted by how much of it still overlaps the trailing hour, which gives a
+    close approximation of a true sliding window in O(1) time and constant memory.
+    """
+
+    WINDOW_SECONDS = 3600  # 1 hour
+
     def __init__(self):
-        # Store request timestamps per API key
-        self.requests: Dict[str, Deque[float]] = defaultdict(lambda: deque())
-    
+        # api key hash -> (window index, current window count, previous window count)
+        self.windows: Dict[str, Tuple[int, int, int]] = {}
+
     def is_allowed(self, api_key_hash: str, rate_limit: int) -> bool:
         """Check if request is allowed based on rate limit (requests per hour)."""
         now = time.time()
-        hour_ago = now - 3600  # 1 hour ago
-        
-        # Clean old requests (older than 1 hour)
-        requests = self.requests[api_key_hash]
-        while requests and requests[0] < hour_ago:
-            requests.popleft()
-        
-        # Check if under rate limit
-        if len(requests) >= rate_limit:
+        window, offset = divmod(now, self.WINDOW_SECONDS)
+        window = int(window)
+
+        current_window, current, previous = self.windows.get(
+            api_key_hash, (window, 0, 0)
+        )
+        if window != current_window:
+            # Roll over: the old current window becomes previous only if it was adjacent
+            previous = current if window == current_window + 1 else 0
+            current = 0
+
+        # Estimate requests in the trailing hour
+        estimated = previous * (1 - offset / self.WINDOW_SECONDS) + current
+        if estimated >= rate_limit:
+            self.windows[api_key_hash] = (window, current, previous)
             return False
-        
-        # Add current request
-        requests.append(now)
+
+        self.windows[api_key_hash] = (window, current + 1, previous)
         return True
 
 
 # Global rate limiter instance
 rate_limiter = RateLimiter()
 
+# Public endpoints (don't require an API key), matched exactly
+PUBLIC_PATHS = frozenset(
+    {
+        "/",  # Landing page
+        "/health",
+    }
+)
+
+# Public endpoints matched by prefix
+PUBLIC_PREFIXES = (
+    "/docs",
+    "/redoc",
+    "/openapi.json",
+    "/swagger",
+    "/static",
+    "/map",  # Public map page
+    "/v1/map",  # Public map API endpoints
+    "/v1/auth/register",  # Public registration
+    "/v1/auth/login",  # Public login
+    "/v1/auth/me",  # JWT token auth (web UI)
+    "/v1/auth/keys",  # JWT token auth (web UI)
+    "/v1/research",  # Public research endpoints
+)
+
+
+def build_security_headers(environment: str) -> Tuple[Tuple[bytes, bytes], ...]:
+    """Build the raw security headers sent with every response."""
+    headers = (
+        (b"x-content-type-options", b"nosniff"),
+        (b"x-frame-options", b"DENY"),
+        (b"x-xss-protection", b"1; mode=block"),
+        (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    )
+    # Add HSTS header for production
+    if environment == "production":
+        headers += (
+            (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+        )
+    return headers
+
+
+# Security headers added to every HTTP response; the environment can't change
+# at runtime, so the per-request HSTS check is resolved once here
+SECURITY_HEADERS = build_security_headers(settings.ENVIRONMENT)
+
+
+# Liveness probe answered by APIKeyMiddleware (the outermost layer), before CORS,
+# routing or auth. Its headers are built once, security headers included.
+LIVENESS_PATH = "/health/live"
+_LIVENESS_BODY = b'{"status":"ok"}'
+_LIVENESS_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"content-length", str(len(_LIVENESS_BODY)).encode("ascii")),
+    *SECURITY_HEADERS,
+]
+
+
+async def liveness_app(scope, receive, send):
+    """Minimal ASGI app for load balancer probes; does no I/O."""
+    await send(
+        {"type": "http.response.start", "status": 200, "headers": _LIVENESS_HEADERS}
+    )
+    await send({"type": "http.response.body", "body": _LIVENESS_BODY})
+
+
+def _with_security_headers(send):
+    """Wrap an ASGI send callable to add the security headers to the response start."""
+
+    async def send_with_headers(message):
+        if message["type"] == "http.response.start":
+            message["headers"] = [*message.get("headers", ()), *SECURITY_HEADERS]
+        await send(message)
+
+    return send_with_headers
+
+
+def _header_value(headers: Dict[bytes, bytes], name: bytes) -> str | None:
+    """Decode a raw ASGI header value (latin-1, as Starlette does)."""
+    value = headers.get(name)
+    return value.decode("latin-1") if value is not None else None
+
+
+def get_client_ip(scope) -> str | None:
+    """Extract client IP address from a raw ASGI scope."""
+    # Check for forwarded headers first (proxy/load balancer), in a single pass
+    real_ip = None
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for" and value:
+            return value.decode("latin-1").split(",")[0].strip()
+        if name == b"x-real-ip" and real_ip is None:
+            real_ip = value
+    if real_ip:
+        return real_ip.decode("latin-1")
+
+    # Fallback to direct client IP
+    client = scope.get("client")
+    return client[0] if client else None
+
 
 class APIKeyMiddleware:
     """Middleware to validate API keys and track usage."""
-    
+
     def __init__(self, app):
         self.app = app
-    
+
     async def __call__(self, scope, receive, send):
         if scope["type"] != "http":
             await self.app(scope, receive, send)
             return
-        
-        request = Request(scope, receive)
-        
-        # Skip middleware for public endpoints
-        if self._is_public_endpoint(request.url.path):
+
+        # Liveness probes skip every other middleware layer and the router
+        path = scope["path"]
+        if path == LIVENESS_PATH:
+            await liveness_app(scope, receive, send)
+            return
+
+        # Applies to public endpoints and error responses too
+        send = _with_security_headers(send)
+
+        # Public endpoints bail out on the raw path, before any per-request objects
+        if self._is_public_endpoint(path):
             await self.app(scope, receive, send)
             return
-        
+
         start_time = time.time()
-        
+        # Single wall-clock reading shared by quota checks and usage bookkeeping
+        now = datetime.now(UTC)
+
+        # ASGI header names are already lowercased bytes
+        headers = dict(scope["headers"])
+
         # Extract API key from headers
-        api_key = self._extract_api_key(request)
+        api_key = self._extract_api_key(headers)
         if not api_key:
-            response = create_error_response(
-                request=request,
+            await self._reject(
+                scope,
+                receive,
+                send,
                 error="authentication_error",
-                message="API key required. Include 'X-API-Key' header or 'Authorization: Bearer <key>' header.",
-                status_code=status.HTTP_401_UNAUTHORIZED
+                message=(
+                    "API key required. Include 'X-API-Key' header or "
+                    "'Authorization: Bearer <key>' header."
+                ),
+                status_code=status.HTTP_401_UNAUTHORIZED,
             )
-            await response(scope, receive, send)
             return
-        
+
         # Validate API key and get key info
         api_key_info = await self._validate_api_key(api_key)
         if not api_key_info:
-            response = create_error_response(
-                request=request,
+            await self._reject(
+                scope,
+                receive,
+                send,
                 error="authentication_error",
                 message="The provided API key is invalid or has been revoked.",
-                status_code=status.HTTP_401_UNAUTHORIZED
+                status_code=status.HTTP_401_UNAUTHORIZED,
             )
-            await response(scope, receive, send)
             return
-        
+
         # Check if key is active
         if not api_key_info.is_active:
-            response = create_error_response(
-                request=request,
+            await self._reject(
+                scope,
+                receive,
+                send,
                 error="authentication_error",
                 message="This API key has been disabled.",
-                status_code=status.HTTP_401_UNAUTHORIZED
+                status_code=status.HTTP_401_UNAUTHORIZED,
             )
-            await response(scope, receive, send)
             return
-        
-        # Check quota (monthly limit)
-        if await self._is_quota_exceeded(api_key_info):
-            response = create_error_response(
-                request=request,
+
+        # Count this request against the monthly quota, or find it exhausted
+        allowed, quota_state = await self._consume_quota(api_key_info.id, now)
+        if not allowed:
+            if quota_state is None or not quota_state.is_active:
+                # Deactivated or deleted before the revocation reached this worker
+                await self._reject(
+                    scope,
+                    receive,
+                    send,
+                    error="authentication_error",
+                    message="This API key has been disabled.",
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                )
+                return
+            await self._reject(
+                scope,
+                receive,
+                send,
                 error="quota_exceeded",
-                message=f"Monthly quota of {api_key_info.quota_limit} requests exceeded.",
+                message=(
+                    f"Monthly quota of {quota_state.quota_limit} requests exceeded."
+                ),
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 details={
-                    "quota_limit": api_key_info.quota_limit,
-                    "quota_used": api_key_info.quota_used,
-                    "quota_reset_date": api_key_info.quota_reset_date.isoformat()
-                }
+                    "quota_limit": quota_state.quota_limit,
+                    "quota_used": quota_state.quota_used,
+                    "quota_reset_date": quota_state.quota_reset_date.isoformat(),
+                },
             )
-            await response(scope, receive, send)
             return
-        
+
         # Check rate limit (hourly limit)
         rate_limit = get_rate_limit_for_tier(api_key_info.tier)
         if not rate_limiter.is_allowed(api_key_info.key_hash, rate_limit):
-            response = create_error_response(
-                request=request,
+            await self._reject(
+                scope,
+                receive,
+                send,
                 error="rate_limit_exceeded",
                 message=f"Rate limit of {rate_limit} requests per hour exceeded.",
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 details={
                     "rate_limit": rate_limit,
-                    "retry_after": 3600  # Retry after 1 hour
-                }
+                    "retry_after": 3600,  # Retry after 1 hour
+                },
             )
-            await response(scope, receive, send)
             return
-        
-        # Add API key info to request scope for use in endpoints
-        if "state" not in scope:
-            scope["state"] = {}
-        scope["state"]["api_key"] = api_key_info
-        scope["state"]["api_key_id"] = api_key_info.id
-        
+
+        # Expose API key info to endpoints for the duration of this request
+        api_key_token = current_api_key.set(api_key_info)
+
         # Create a custom send wrapper to capture response details
         response_status = 200
-        
+
         async def custom_send(message):
             nonlocal response_status
             if message["type"] == "http.response.start":
                 response_status = message["status"]
             await send(message)
-        
+
         # Process the request
-        await self.app(scope, receive, custom_send)
-        
-        # Record usage
+        try:
+            await self.app(scope, receive, custom_send)
+        finally:
+            current_api_key.reset(api_key_token)
+
+        # Record usage (buffered; last_used is bumped when it is written)
         end_time = time.time()
         response_time_ms = int((end_time - start_time) * 1000)
-        
-        await self._record_usage(
-            api_key_info.id,
-            request.url.path,
-            request.method,
-            response_status,
-            response_time_ms,
-            request.headers.get("user-agent"),
-            self._get_client_ip(request)
+
+        await usage_recorder.record(
+            UsageEvent(
+                api_key_id=api_key_info.id,
+                endpoint=path,
+                method=scope["method"],
+                response_status=response_status,
+                response_time_ms=response_time_ms,
+                user_agent=_header_value(headers, b"user-agent"),
+                ip_address=get_client_ip(scope),
+                timestamp=now,
+            )
         )
-        
-        # Update API key usage count and last used timestamp
-        await self._update_api_key_usage(api_key_info.id)
-    
+
     def _is_public_endpoint(self, path: str) -> bool:
         """Check if endpoint is public (doesn't require API key)."""
-        public_endpoints = [
-            "/",                  # Landing page
-            "/health",
-            "/docs",
-            "/redoc",
-            "/openapi.json",
-            "/swagger",
-            "/static",
-            "/map",               # Public map page
-            "/v1/map",            # Public map API endpoints
-            "/v1/auth/register",  # Public registration
-            "/v1/auth/login",     # Public login
-            "/v1/auth/me",        # JWT token auth (web UI)
-            "/v1/auth/keys",      # JWT token auth (web UI)
-            "/v1/research",       # Public research endpoints
-        ]
-        
-        for public_path in public_endpoints:
-            if path.startswith(public_path):
-                return True
-        return False
-    
-    def _extract_api_key(self, request: Request) -> str | None:
-        """Extract API key from request headers."""
+        # str.startswith with a tuple checks every prefix in a single C call
+        return path in PUBLIC_PATHS or path.startswith(PUBLIC_PREFIXES)
+
+    async def _reject(self, scope, receive, send, **error_kwargs):
+        """Send an error response; the Request is only built on this path."""
+        response = create_error_response(
+            request=Request(scope, receive), **error_kwargs
+        )
+        await response(scope, receive, send)
+
+    @staticmethod
+    def _extract_api_key(headers: Dict[bytes, bytes]) -> str | None:
+        """Extract API key from raw request headers."""
         # Try X-API-Key header first
-        api_key = request.headers.get("X-API-Key")
+        api_key = _header_value(headers, b"x-api-key")
         if api_key:
             return api_key
-        
+
         # Try Authorization header (Bearer token)
-        auth_header = request.headers.get("Authorization")
+        auth_header = _header_value(headers, b"authorization")
         if auth_header and auth_header.startswith("Bearer "):
             return auth_header[7:]  # Remove "Bearer " prefix
-        
+
         return None
-    
-    async def _validate_api_key(self, api_key: str) -> ApiKey | None:
+
+    async def _validate_api_key(self, api_key: str) -> ApiKeySnapshot | None:
         """Validate API key and return key info if valid."""
+        cache_key = hash_api_key(api_key)
+
+        # Fast path: key was verified recently, serve the cached snapshot
+        key_info = api_key_cache.get(cache_key)
+        if key_info is not None:
+            return key_info
+        if invalid_api_key_cache.get(cache_key):
+            return None
+
         async with get_db_session() as session:
-            # Get all active API keys and check hashes
+            # HMAC hashes are deterministic, so the key is found with one indexed lookup
             result = await session.execute(
-                select(ApiKey).where(ApiKey.is_active == True)
+                _ACTIVE_API_KEY_BY_HASH, {"key_hash": cache_key}
             )
-            api_keys = result.scalars().all()
-            
-            for key_info in api_keys:
-                if verify_api_key(api_key, key_info.key_hash):
+            row = result.scalar_one_or_none()
+            if row is not None:
+                key_info = ApiKeySnapshot.from_row(row)
+                cache_api_key(key_info)
+                return key_info
+
+            # Salted legacy bcrypt hashes can't be looked up; check only those rows
+            result = await session.execute(_ACTIVE_LEGACY_API_KEYS)
+            legacy_keys = result.scalars().all()
+
+            for row in legacy_keys:
+                if await verify_api_key_async(api_key, row.key_hash):
+                    # Upgrade to HMAC on first successful use so later lookups hit
+                    # the index; the raw key is only available here, so rows can't
+                    # be rehashed offline
+                    row.key_hash = cache_key
+                    await session.commit()
+                    key_info = ApiKeySnapshot.from_row(row)
+                    cache_api_key(key_info)
                     return key_info
-            
-            return None
-    
-    async def _is_quota_exceeded(self, api_key_info: ApiKey) -> bool:
-        """Check if API key has exceeded its monthly quota."""
-        # Check if quota period has expired and reset if needed
-        if is_quota_expired(api_key_info.quota_reset_date):
-            await self._reset_quota(api_key_info.id)
-            return False  # Quota was reset, so not exceeded
-        
-        return api_key_info.quota_used >= api_key_info.quota_limit
-    
-    async def _reset_quota(self, api_key_id: int):
-        """Reset the quota for an API key."""
-        from api.auth import calculate_quota_reset_date
-        
-        async with get_db_session() as session:
-            await session.execute(
-                update(ApiKey)
-                .where(ApiKey.id == api_key_id)
-                .values(
-                    quota_used=0,
-                    quota_reset_date=calculate_quota_reset_date()
-                )
-            )
-            await session.commit()
-    
-    async def _record_usage(
-        self,
-        api_key_id: int,
-        endpoint: str,
-        method: str,
-        status_code: int,
-        response_time_ms: int,
-        user_agent: str | None,
-        ip_address: str | None
-    ):
-        """Record API usage for analytics and billing."""
+
+        # Briefly remember unknown keys so repeated bad credentials skip the database
+        invalid_api_key_cache.set(cache_key, True)
+        return None
+
+    async def _consume_quota(
+        self, api_key_id: int, now: datetime
+    ) -> Tuple[bool, Row | None]:
+        """Count a request against the key's quota.
+
+        Returns (True, None) if the request is allowed. Otherwise returns False
+        with the key's quota_used, quota_limit, quota_reset_date and is_active
+        for the rejection, or None if the key no longer exists.
+        """
         async with get_db_session() as session:
-            usage = Usage(
-                api_key_id=api_key_id,
-                endpoint=endpoint,
-                method=method,
-                response_status=status_code,
-                response_time_ms=response_time_ms,
-                user_agent=user_agent,
-                ip_address=ip_address,
-                timestamp=datetime.now(UTC)
+            result = await session.execute(
+                _CONSUME_QUOTA,
+                {
+                    "key_id": api_key_id,
+                    "now": now,
+                    "next_reset": calculate_quota_reset_date(now=now),
+                },
             )
-            session.add(usage)
+            consumed = result.first()
             await session.commit()
-    
-    async def _update_api_key_usage(self, api_key_id: int):
-        """Update API key usage count and last used timestamp."""
-        async with get_db_session() as session:
-            await session.execute(
-                update(ApiKey)
-                .where(ApiKey.id == api_key_id)
-                .values(
-                    quota_used=ApiKey.quota_used + 1,
-                    last_used=datetime.now(UTC)
-                )
+            if consumed is not None:
+                return True, None
+
+            result = await session.execute(
+                select(
+                    ApiKey.quota_used,
+                    ApiKey.quota_limit,
+                    ApiKey.quota_reset_date,
+                    ApiKey.is_active,
+                ).where(ApiKey.id == api_key_id)
             )
-            await session.commit()
-    
-    def _get_client_ip(self, request: Request) -> str | None:
-        """Extract client IP address from request."""
-        # Check for forwarded headers first (proxy/load balancer)
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        if forwarded_for:
-            return forwarded_for.split(",")[0].strip()
-        
-        real_ip = request.headers.get("X-Real-IP")
-        if real_ip:
-            return real_ip
-        
-        # Fallback to direct client IP
-        if hasattr(request, "client") and request.client:
-            return request.client.host
-        
-        return None
\ No newline at end of file
+            return False, result.first()
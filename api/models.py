@@ -1,10 +1,34 @@
+import enum
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    Boolean,
+    Computed,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    desc,
+    func,
+    text,
+)
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
+class Tier(enum.StrEnum):
+    """API key subscription tier."""
+
+    FREE = "free"
+    BASIC = "basic"
+    PRO = "pro"
+    ENTERPRISE = "enterprise"
+
+
 class Base(AsyncAttrs, DeclarativeBase):
     """Base class for all database models."""
 
@@ -15,14 +39,39 @@ class Sighting(Base):
     """UFO sighting report model based on NUFORC data structure."""
 
     __tablename__ = "sightings"
+    __table_args__ = (
+        # Equality filter + date range/sort served from one index; the leftmost
+        # column also covers filtering on state or source alone
+        Index("ix_sightings_state_date", "state", "date_time"),
+        Index("ix_sightings_source_date", "source", "date_time"),
+        # Importer de-duplication looks rows up by (source, external_id)
+        Index("ix_sightings_source_external", "source", "external_id"),
+        # Newest-first scans and keyset pages over (date_time, id); the leftmost
+        # column also serves date range filters on their own
+        Index("ix_sightings_date_id", "date_time", "id"),
+        # Bounding-box filters range over latitude and check longitude in the index
+        Index("ix_sightings_lat_lng", "latitude", "longitude"),
+        # The state=US filter (and its newest-first order) over only the US rows
+        Index(
+            "ix_sightings_us_date",
+            "date_time",
+            # Written as each backend renders is_us == true(), so the planner matches it
+            postgresql_where=text("is_us"),
+            sqlite_where=text("is_us = 1"),
+        ),
+    )
 
     # Primary key
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
     # Core sighting information
-    date_time: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    date_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     city: Mapped[str] = mapped_column(String(100), nullable=False, index=True)
-    state: Mapped[Optional[str]] = mapped_column(String(10), nullable=True, index=True)
+    state: Mapped[Optional[str]] = mapped_column(String(10), nullable=True)
+    # US states are the 2-letter codes; stored so filters skip length() per row
+    is_us: Mapped[bool] = mapped_column(
+        Boolean, Computed("state IS NOT NULL AND length(state) = 2", persisted=True)
+    )
     shape: Mapped[str] = mapped_column(String(50), nullable=False, index=True)
     duration: Mapped[str] = mapped_column(String(100), nullable=False)
     summary: Mapped[str] = mapped_column(Text, nullable=False)
@@ -30,12 +79,14 @@ class Sighting(Base):
     posted: Mapped[datetime] = mapped_column(DateTime, nullable=False)
 
     # Geographic coordinates (optional, for enhanced queries)
-    latitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True, index=True)
-    longitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True, index=True)
+    latitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    longitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
 
     # Source tracking for multi-source data
-    source: Mapped[str] = mapped_column(String(50), nullable=False, default="nuforc", index=True)
-    external_id: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, index=True)
+    source: Mapped[str] = mapped_column(String(50), nullable=False, default="nuforc")
+    external_id: Mapped[Optional[str]] = mapped_column(
+        String(100), nullable=True, index=True
+    )
     source_url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
 
     def __repr__(self) -> str:
@@ -54,16 +105,22 @@ class User(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
     # User information
-    email: Mapped[str] = mapped_column(String(255), unique=True, nullable=False, index=True)
+    email: Mapped[str] = mapped_column(
+        String(255), unique=True, nullable=False, index=True
+    )
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     hashed_password: Mapped[str] = mapped_column(String(255), nullable=False)
-    
+
     # Status and timestamps
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
-    
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
     # Relationships
-    api_keys: Mapped[list["ApiKey"]] = relationship("ApiKey", back_populates="user", cascade="all, delete-orphan")
+    api_keys: Mapped[list["ApiKey"]] = relationship(
+        "ApiKey", back_populates="user", cascade="all, delete-orphan"
+    )
 
     def __repr__(self) -> str:
         return f"<User(id={self.id}, email={self.email}, name={self.name})>"
@@ -78,35 +135,76 @@ class ApiKey(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
     # Key information
-    key_hash: Mapped[str] = mapped_column(String(255), unique=True, nullable=False, index=True)
+    # Hex HMAC digests (legacy rows may still hold bcrypt strings until first use).
+    # On PostgreSQL the "C" collation makes index comparisons plain byte compares.
+    key_hash: Mapped[str] = mapped_column(
+        String(255).with_variant(String(255, collation="C"), "postgresql"),
+        unique=True,
+        nullable=False,
+        index=True,
+    )
+    # Leading characters of the key, safe to display; NULL for keys predating it
+    key_prefix: Mapped[Optional[str]] = mapped_column(
+        String(16), nullable=True, index=True
+    )
     name: Mapped[str] = mapped_column(String(100), nullable=False)  # User-friendly name
-    tier: Mapped[str] = mapped_column(String(20), default="free", nullable=False)  # free, basic, pro, enterprise
-    
+    # Stored as VARCHAR(20) holding the tier value, as before; unknown tiers are
+    # rejected on write
+    tier: Mapped[Tier] = mapped_column(
+        Enum(
+            Tier,
+            native_enum=False,
+            length=20,
+            values_callable=lambda tiers: [t.value for t in tiers],
+            validate_strings=True,
+        ),
+        default=Tier.FREE,
+        nullable=False,
+    )
+
     # Usage limits and tracking
-    quota_limit: Mapped[int] = mapped_column(Integer, default=1000, nullable=False)  # Monthly limit
+    quota_limit: Mapped[int] = mapped_column(
+        Integer, default=1000, nullable=False
+    )  # Monthly limit
     quota_used: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
-    quota_reset_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
-    
+    quota_reset_date: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+
     # Status and timestamps
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
-    last_used: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
-    
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    last_used: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
     # Foreign key to user
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
-    
+
     # Relationships
     user: Mapped[User] = relationship("User", back_populates="api_keys")
-    usage_records: Mapped[list["Usage"]] = relationship("Usage", back_populates="api_key", cascade="all, delete-orphan")
+    usage_records: Mapped[list["Usage"]] = relationship(
+        "Usage", back_populates="api_key", cascade="all, delete-orphan"
+    )
 
     def __repr__(self) -> str:
-        return f"<ApiKey(id={self.id}, name={self.name}, tier={self.tier}, user_id={self.user_id})>"
+        return (
+            f"<ApiKey(id={self.id}, name={self.name}, tier={self.tier}, "
+            f"user_id={self.user_id})>"
+        )
 
 
 class Usage(Base):
     """Usage tracking model for API requests."""
 
     __tablename__ = "usage"
+    __table_args__ = (
+        # Per-key history (newest first) and per-key date ranges walk this index
+        # directly; it also serves the api_key_id foreign key on its own
+        Index("ix_usage_apikey_ts", "api_key_id", desc("timestamp")),
+    )
 
     # Primary key
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -116,49 +214,140 @@ class Usage(Base):
     method: Mapped[str] = mapped_column(String(10), nullable=False)  # GET, POST, etc.
     response_status: Mapped[int] = mapped_column(Integer, nullable=False)
     response_time_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
-    
+
     # Client information (optional)
     user_agent: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
-    ip_address: Mapped[Optional[str]] = mapped_column(String(45), nullable=True)  # IPv6 compatible
-    
+    ip_address: Mapped[Optional[str]] = mapped_column(
+        String(45), nullable=True
+    )  # IPv6 compatible
+
     # Timestamp
-    timestamp: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
-    
+    timestamp: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
     # Foreign key to API key
     api_key_id: Mapped[int] = mapped_column(ForeignKey("api_keys.id"), nullable=False)
-    
+
     # Relationships
     api_key: Mapped[ApiKey] = relationship("ApiKey", back_populates="usage_records")
 
     def __repr__(self) -> str:
-        return f"<Usage(id={self.id}, endpoint={self.endpoint}, status={self.response_status}, timestamp={self.timestamp})>"
+        return (
+            f"<Usage(id={self.id}, endpoint={self.endpoint}, "
+            f"status={self.response_status}, timestamp={self.timestamp})>"
+        )
+
+
+# Map viewport queries test a point against a box; on PostgreSQL a GiST index over
+# the built-in point type answers that in one lookup (no PostGIS required)
+Index(
+    "ix_sightings_location_gist",
+    func.point(Sighting.longitude, Sighting.latitude),
+    postgresql_using="gist",
+).ddl_if(dialect="postgresql")
+
+
+def _pg_trgm_installed(ddl, target, bind, **kw) -> bool:
+    """Create trigram indexes only where the pg_trgm extension is installed."""
+    return (
+        bind.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).first()
+        is not None
+    )
+
+
+# Substring filters (ILIKE '%...%') on city and shape can't use a btree; trigram
+# GIN indexes serve them on PostgreSQL
+Index(
+    "ix_sightings_city_trgm",
+    Sighting.city,
+    postgresql_using="gin",
+    postgresql_ops={"city": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql", callable_=_pg_trgm_installed)
+Index(
+    "ix_sightings_shape_trgm",
+    Sighting.shape,
+    postgresql_using="gin",
+    postgresql_ops={"shape": "gin_trgm_ops"},
+).ddl_if(dialect="postgresql", callable_=_pg_trgm_installed)
+
+
+class HotspotSummary(Base):
+    """Per-location sighting aggregates, rebuilt periodically from sightings."""
+
+    __tablename__ = "hotspot_summary"
+    __table_args__ = (
+        # Top-N by count, optionally within a state, read straight off the index
+        Index("ix_hotspot_summary_count", "sighting_count"),
+        Index("ix_hotspot_summary_state_count", "state", "sighting_count"),
+        # One row per location; a duplicated rebuild fails instead of doubling it
+        Index("ix_hotspot_summary_city_state", "city", "state", unique=True),
+    )
+
+    # Primary key
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+
+    # Location (one row per city/state with coordinates)
+    city: Mapped[str] = mapped_column(String(100), nullable=False)
+    state: Mapped[Optional[str]] = mapped_column(String(10), nullable=True)
+    latitude: Mapped[float] = mapped_column(
+        Float, nullable=False
+    )  # Average over the location's sightings
+    longitude: Mapped[float] = mapped_column(Float, nullable=False)
+
+    # Aggregates
+    sighting_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    earliest_sighting: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    latest_sighting: Mapped[datetime] = mapped_column(DateTime, nullable=False)
 
 
 class ResearchCache(Base):
     """Cache model for storing AI research results to improve performance."""
 
     __tablename__ = "research_cache"
+    __table_args__ = (
+        # Lookups match all three columns; the leftmost column also serves the
+        # foreign key
+        Index("ix_research_lookup", "sighting_id", "research_type", "model_version"),
+    )
 
     # Primary key
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
     # Sighting reference
-    sighting_id: Mapped[int] = mapped_column(ForeignKey("sightings.id"), nullable=False, index=True)
-    
+    sighting_id: Mapped[int] = mapped_column(ForeignKey("sightings.id"), nullable=False)
+
     # Research type and results
-    research_type: Mapped[str] = mapped_column(String(20), nullable=False)  # 'quick' or 'full'
-    analysis_result: Mapped[str] = mapped_column(Text, nullable=False)  # JSON string of the analysis
-    
+    research_type: Mapped[str] = mapped_column(
+        String(20), nullable=False
+    )  # 'quick' or 'full'
+    analysis_result: Mapped[str] = mapped_column(
+        Text, nullable=False
+    )  # JSON string of the analysis
+
     # AI model information for cache invalidation
-    model_version: Mapped[str] = mapped_column(String(50), nullable=False)  # e.g., 'gemini-2.0-flash-exp'
-    
+    model_version: Mapped[str] = mapped_column(
+        String(50), nullable=False
+    )  # e.g., 'gemini-2.0-flash-exp'
+
     # Cache metadata
-    cache_hits: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # Track usage
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
-    last_accessed: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
-    
+    cache_hits: Mapped[int] = mapped_column(
+        Integer, default=0, nullable=False
+    )  # Track usage
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
+    )
+    last_accessed: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
+    )
+
     # Relationships
     sighting: Mapped["Sighting"] = relationship("Sighting")
 
     def __repr__(self) -> str:
-        return f"<ResearchCache(id={self.id}, sighting_id={self.sighting_id}, type={self.research_type}, hits={self.cache_hits})>"
+        return (
+            f"<ResearchCache(id={self.id}, sighting_id={self.sighting_id}, "
+            f"type={self.research_type}, hits={self.cache_hits})>"
+        )
@@ -0,0 +1,78 @@
+"""Scheduled monthly quota resets."""
+
+import asyncio
+import logging
+from datetime import datetime, UTC
+from typing import Optional
+
+from sqlalchemy import update
+
+from api.auth import calculate_quota_reset_date
+from api.database import get_db_session
+from api.models import ApiKey
+
+logger = logging.getLogger(__name__)
+
+
+async def reset_expired_quotas(now: Optional[datetime] = None) -> int:
+    """Zero the quota of every key past its reset date. Returns the count reset."""
+    if now is None:
+        now = datetime.now(UTC)
+
+    async with get_db_session() as session:
+        result = await session.execute(
+            update(ApiKey)
+            .where(ApiKey.quota_reset_date <= now)
+            .values(quota_used=0, quota_reset_date=calculate_quota_reset_date(now=now))
+        )
+        await session.commit()
+    return result.rowcount
+
+
+class QuotaResetScheduler:
+    """Periodically resets expired quotas so requests never do it inline.
+
+    A reset is one UPDATE per key per month, applied to all due keys at once.
+    The middleware's quota update also starts a new period for a key it finds
+    past its reset date, so quotas are correct whether or not this is running
+    (e.g. no lifespan, as under the test client); the scheduler keeps idle
+    keys' counters current for usage reports.
+    """
+
+    def __init__(self, interval: float = 60.0):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                count = await reset_expired_quotas()
+                if count:
+                    logger.info(f"Reset monthly quota for {count} API keys")
+            except Exception as e:
+                logger.error(f"Failed to reset expired quotas: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Start the reset loop on the running event loop."""
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the reset loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global quota reset scheduler instance
+quota_reset_scheduler = QuotaResetScheduler()
@@ -0,0 +1,189 @@
+"""AI research cache upkeep: hit accounting and scheduled eviction of stale rows."""
+
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, UTC
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, delete, or_, update
+
+from api.cache import TTLCache
+from api.config import settings
+from api.database import get_db_session
+from api.models import ResearchCache
+
+logger = logging.getLogger(__name__)
+
+# Current model version for cache invalidation
+CURRENT_MODEL_VERSION = "gemini-2.0-flash-exp"
+
+# (research_cache row id, decoded result) for recently read or generated research,
+# in front of the research_cache table. Keyed by (sighting_id, research_type,
+# model_version), so a model change can never serve an old report.
+RESEARCH_MEMORY_CACHE_TTL = 3600  # seconds
+research_memory_cache = TTLCache(maxsize=1000, ttl=RESEARCH_MEMORY_CACHE_TTL)
+
+
+async def prune_research_cache(
+    max_age: timedelta,
+    model_version: str = CURRENT_MODEL_VERSION,
+    now: Optional[datetime] = None,
+) -> int:
+    """Delete entries idle past max_age or from another model. Returns the count."""
+    if now is None:
+        now = datetime.now(UTC)
+
+    async with get_db_session() as session:
+        result = await session.execute(
+            delete(ResearchCache).where(
+                or_(
+                    ResearchCache.last_accessed < now - max_age,
+                    ResearchCache.model_version != model_version,
+                )
+            )
+        )
+        await session.commit()
+    return result.rowcount
+
+
+# Core (not ORM) statement so a batch of counters runs as a single executemany
+_research_cache = ResearchCache.__table__
+_RESEARCH_HIT_UPDATE = (
+    update(_research_cache)
+    .where(_research_cache.c.id == bindparam("entry_id"))
+    .values(
+        cache_hits=_research_cache.c.cache_hits + bindparam("hits"),
+        last_accessed=bindparam("accessed_at"),
+    )
+)
+
+
+async def write_research_hits(hits: Dict[int, int], accessed_at: datetime) -> None:
+    """Add hit counts to research cache rows and mark them accessed, in one commit."""
+    if not hits:
+        return
+
+    async with get_db_session() as session:
+        await session.execute(
+            _RESEARCH_HIT_UPDATE,
+            [
+                {"entry_id": entry_id, "hits": count, "accessed_at": accessed_at}
+                for entry_id, count in hits.items()
+            ],
+        )
+        await session.commit()
+
+
+class ResearchHitRecorder:
+    """Counts research cache hits in memory and writes them in periodic batches.
+
+    While the flusher is running a cache hit is a counter increment, so cached
+    reads never wait on an UPDATE and commit, and a popular entry costs one row
+    update per flush rather than one per read. last_accessed is set to the flush
+    time. When the flusher isn't running (e.g. no lifespan, as under the test
+    client) hits are written immediately.
+    """
+
+    def __init__(self, flush_interval: float = 5.0):
+        self.flush_interval = flush_interval
+        self._hits: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def record(self, entry_id: int) -> None:
+        """Record a hit on a research cache row."""
+        if not self.running:
+            await write_research_hits({entry_id: 1}, datetime.now(UTC))
+            return
+        self._hits[entry_id] += 1
+
+    async def flush(self) -> None:
+        """Write out the hits counted so far."""
+        if not self._hits:
+            return
+        hits, self._hits = self._hits, Counter()
+        try:
+            await write_research_hits(hits, datetime.now(UTC))
+        except Exception as e:
+            logger.error(
+                f"Failed to record {sum(hits.values())} research cache hits: {e}"
+            )
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        """Start the background flusher on the running event loop."""
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background flusher and write any remaining hits."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+class ResearchCachePruner:
+    """Periodically evicts research cache rows that are stale or can never be hit.
+
+    Entries from older model versions are unreachable once the model changes,
+    and rarely requested sightings shouldn't keep their reports forever, so the
+    table (and its lookup index) stays bounded by what is actually in use.
+    """
+
+    def __init__(self, max_age: timedelta, interval: float = 3600.0):
+        self.max_age = max_age
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                count = await prune_research_cache(self.max_age)
+                if count:
+                    logger.info(f"Evicted {count} stale research cache entries")
+            except Exception as e:
+                logger.error(f"Failed to prune research cache: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Start the pruning loop on the running event loop."""
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the pruning loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global research cache pruner instance
+research_cache_pruner = ResearchCachePruner(
+    max_age=timedelta(days=settings.RESEARCH_CACHE_MAX_AGE_DAYS)
+)
+
+# Global research cache hit recorder instance
+research_hit_recorder = ResearchHitRecorder()
@@ -0,0 +1,191 @@
+"""Broadcast API key revocations to every worker's cache."""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+from api.auth import invalidate_api_key_cache
+from api.config import settings
+from api.database import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+REDIS_CHANNEL = "apikey:invalidate"
+
+# Fallback without Redis: an append-only log of revoked key hashes shared by the
+# workers on this host, one file per database
+_DATABASE_DIGEST = hashlib.sha256(DATABASE_URL.encode()).hexdigest()[:16]
+REVOCATION_LOG_PATH = os.path.join(
+    tempfile.gettempdir(), f"skywatch-revocations-{_DATABASE_DIGEST}.log"
+)
+
+# Once the log reaches this size the next revocation starts a new file. A
+# worker that hadn't read the tail of the old one relies on the cache TTL.
+REVOCATION_LOG_MAX_BYTES = 1024 * 1024
+
+
+class KeyRevocationBus:
+    """Propagates API key invalidations across worker processes.
+
+    Each worker caches verified keys for a short TTL, so without this a key
+    revoked in one worker stays usable in the others until the entry expires.
+    Uses Redis pub/sub when REDIS_URL is set, otherwise polls a shared log file.
+    If the listener dies it is logged and restarted with exponential backoff.
+    The cache TTL remains the safety net if a message is missed.
+    """
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        poll_interval: float = 2.0,
+        min_retry_delay: float = 1.0,
+        max_retry_delay: float = 60.0,
+    ):
+        self.redis_url = redis_url
+        self.poll_interval = poll_interval
+        self.min_retry_delay = min_retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._retry_delay = min_retry_delay
+        self._redis: Optional[aioredis.Redis] = None
+        self._task: Optional[asyncio.Task] = None
+        self._restart: Optional[asyncio.TimerHandle] = None
+        self._started = False
+        self._log_offset = 0
+        self._log_inode: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        # Stays true while a dead listener waits to be restarted, so revocations
+        # are still broadcast in the meantime
+        return self._started
+
+    async def publish(self, key_hash: str) -> None:
+        """Invalidate a key by its stored hash here and notify the other workers."""
+        invalidate_api_key_cache(key_hash)
+        if not self.running:
+            return
+
+        try:
+            if self._redis is not None:
+                await self._redis.publish(REDIS_CHANNEL, key_hash)
+            else:
+                await asyncio.to_thread(self._append_to_log, key_hash)
+        except Exception as e:
+            logger.error(f"Failed to broadcast API key revocation: {e}")
+
+    def _append_to_log(self, key_hash: str) -> None:
+        try:
+            if os.path.getsize(REVOCATION_LOG_PATH) >= REVOCATION_LOG_MAX_BYTES:
+                os.remove(REVOCATION_LOG_PATH)
+        except FileNotFoundError:
+            pass
+        with open(REVOCATION_LOG_PATH, "a") as log_file:
+            log_file.write(f"{key_hash}\n")
+
+    def _read_new_log_entries(self) -> list[str]:
+        try:
+            with open(REVOCATION_LOG_PATH, "rb") as log_file:
+                stat = os.fstat(log_file.fileno())
+                if stat.st_ino != self._log_inode or stat.st_size < self._log_offset:
+                    # A new file since the last poll; read it from the start
+                    self._log_inode = stat.st_ino
+                    self._log_offset = 0
+                log_file.seek(self._log_offset)
+                lines = log_file.readlines()
+        except FileNotFoundError:
+            return []
+        # Leave a partially written last line for the next poll
+        if lines and not lines[-1].endswith(b"\n"):
+            lines.pop()
+        self._log_offset += sum(len(line) for line in lines)
+        return [line.decode().strip() for line in lines if line.strip()]
+
+    async def _listen_redis(self) -> None:
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(REDIS_CHANNEL)
+        # Connected again, so the next failure starts backing off from the minimum
+        self._retry_delay = self.min_retry_delay
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    invalidate_api_key_cache(message["data"].decode())
+        finally:
+            await pubsub.aclose()
+
+    async def _poll_log(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                for key_hash in await asyncio.to_thread(self._read_new_log_entries):
+                    invalidate_api_key_cache(key_hash)
+            except Exception as e:
+                logger.error(f"Failed to read API key revocations: {e}")
+
+    def start(self) -> None:
+        """Start listening for revocations on the running event loop."""
+        if self._started:
+            return
+        self._started = True
+        self._retry_delay = self.min_retry_delay
+        if self.redis_url:
+            self._redis = aioredis.from_url(self.redis_url)
+        else:
+            # Only revocations published after this worker started are relevant
+            try:
+                stat = os.stat(REVOCATION_LOG_PATH)
+                self._log_inode, self._log_offset = stat.st_ino, stat.st_size
+            except OSError:
+                self._log_inode, self._log_offset = None, 0
+        self._start_listener()
+
+    def _start_listener(self) -> None:
+        self._restart = None
+        listen = self._listen_redis if self._redis is not None else self._poll_log
+        self._task = asyncio.create_task(listen())
+        self._task.add_done_callback(self._on_listener_done)
+
+    def _on_listener_done(self, task: asyncio.Task) -> None:
+        """Log a listener that stopped on its own and schedule a restart."""
+        if task.cancelled() or not self._started:
+            return
+        error = task.exception()
+        delay = self._retry_delay
+        if error is not None:
+            logger.error(
+                f"API key revocation listener failed, restarting in {delay:g}s: "
+                f"{error!r}"
+            )
+        else:
+            logger.warning(
+                f"API key revocation listener stopped, restarting in {delay:g}s"
+            )
+        self._retry_delay = min(self._retry_delay * 2, self.max_retry_delay)
+        loop = asyncio.get_running_loop()
+        self._restart = loop.call_later(delay, self._start_listener)
+
+    async def stop(self) -> None:
+        """Stop listening and close the Redis connection."""
+        self._started = False
+        if self._restart is not None:
+            self._restart.cancel()
+            self._restart = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                # Cancelled, or already failed and logged by _on_listener_done
+                pass
+            self._task = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+# Global key revocation bus instance
+revocation_bus = KeyRevocationBus(redis_url=settings.REDIS_URL)
@@ -1,9 +1,11 @@
 from datetime import datetime, UTC
+from typing import Optional
 from fastapi import APIRouter
 from pydantic import BaseModel
-from sqlalchemy import select, text, func
+from sqlalchemy import select, func
 from api.database import get_db_session
 from api.models import Sighting
+from api.cache import aggregate_cache
 from api.config import settings
 
 router = APIRouter(tags=["health"])
@@ -14,11 +16,17 @@ class DatabaseHealth(BaseModel):
     sighting_count: int
 
 
+class CacheHealth(BaseModel):
+    # Share of map aggregate lookups served from cache since startup (None before any)
+    aggregate_hit_ratio: Optional[float]
+
+
 class HealthResponse(BaseModel):
     status: str
     version: str
     timestamp: str
     database: DatabaseHealth
+    cache: CacheHealth
 
 
 @router.get("/health", response_model=HealthResponse)
@@ -29,11 +37,8 @@ async def health_check():
 
     try:
         async with get_db_session() as session:
-            # Test database connection
-            await session.execute(text("SELECT 1"))
-
-            # Get sighting count efficiently
-            result = await session.execute(select(func.count(Sighting.id)))
+            # A successful COUNT(*) also proves connectivity, so no separate SELECT 1
+            result = await session.execute(select(func.count()).select_from(Sighting))
             sighting_count = result.scalar() or 0
 
     except Exception:
@@ -44,4 +49,5 @@ async def health_check():
         version=settings.API_VERSION,
         timestamp=datetime.now(UTC).isoformat(),
         database=DatabaseHealth(status=database_status, sighting_count=sighting_count),
+        cache=CacheHealth(aggregate_hit_ratio=aggregate_cache.hit_ratio),
     )
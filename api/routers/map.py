@@ -1,184 +1,417 @@
 """Map data endpoints for geographic visualization."""
 
-from math import ceil
-from typing import Optional, List, Dict, Any
-from datetime import datetime
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select, func, and_
+import hashlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import Counter
+from types import MappingProxyType
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+from datetime import datetime, UTC
+import orjson
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from sqlalchemy import (
+    Integer,
+    Row,
+    select,
+    func,
+    and_,
+    cast,
+    literal,
+    tablesample,
+    text,
+    true,
+    tuple_,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
-from api.database import get_db
-from api.dependencies import CurrentApiKey
-from api.models import Sighting
-from api.schemas import ErrorResponse
+from api.cache import (
+    AGGREGATE_CACHE_TTL,
+    TTLCache,
+    aggregate_cache,
+    canonical_key,
+)
+from api.database import IS_SQLITE, get_db, get_db_session
+from api.errors import ValidationError
+from api.filters import build_sighting_filters
+from api.hotspots import hotspot_summary_refresher
+from api.models import HotspotSummary, Sighting
 
 router = APIRouter(prefix="/v1/map", tags=["map"])
 
 
+def aggregate_cache_key(
+    endpoint: str,
+    state: Optional[str] = None,
+    shape: Optional[str] = None,
+    **params: Any,
+) -> Tuple:
+    """Canonical aggregate_cache key; state and shape are matched case-insensitively."""
+    return canonical_key(
+        endpoint,
+        state=state.upper() if state else None,
+        shape=shape.lower() if shape else None,
+        **params,
+    )
+
+
+# US state names mapping
+US_STATE_NAMES = MappingProxyType(
+    {
+        "AL": "Alabama",
+        "AK": "Alaska",
+        "AZ": "Arizona",
+        "AR": "Arkansas",
+        "CA": "California",
+        "CO": "Colorado",
+        "CT": "Connecticut",
+        "DE": "Delaware",
+        "FL": "Florida",
+        "GA": "Georgia",
+        "HI": "Hawaii",
+        "ID": "Idaho",
+        "IL": "Illinois",
+        "IN": "Indiana",
+        "IA": "Iowa",
+        "KS": "Kansas",
+        "KY": "Kentucky",
+        "LA": "Louisiana",
+        "ME": "Maine",
+        "MD": "Maryland",
+        "MA": "Massachusetts",
+        "MI": "Michigan",
+        "MN": "Minnesota",
+        "MS": "Mississippi",
+        "MO": "Missouri",
+        "MT": "Montana",
+        "NE": "Nebraska",
+        "NV": "Nevada",
+        "NH": "New Hampshire",
+        "NJ": "New Jersey",
+        "NM": "New Mexico",
+        "NY": "New York",
+        "NC": "North Carolina",
+        "ND": "North Dakota",
+        "OH": "Ohio",
+        "OK": "Oklahoma",
+        "OR": "Oregon",
+        "PA": "Pennsylvania",
+        "RI": "Rhode Island",
+        "SC": "South Carolina",
+        "SD": "South Dakota",
+        "TN": "Tennessee",
+        "TX": "Texas",
+        "UT": "Utah",
+        "VT": "Vermont",
+        "VA": "Virginia",
+        "WA": "Washington",
+        "WV": "West Virginia",
+        "WI": "Wisconsin",
+        "WY": "Wyoming",
+        "DC": "District of Columbia",
+        "AS": "American Samoa",
+        "GU": "Guam",
+        "MP": "Northern Mariana Islands",
+        "PR": "Puerto Rico",
+        "VI": "Virgin Islands",
+    }
+)
+
+
+# Columns rendered by the /data response formats
+MAP_COLUMNS = (
+    Sighting.id,
+    Sighting.latitude,
+    Sighting.longitude,
+    Sighting.city,
+    Sighting.state,
+    Sighting.shape,
+    Sighting.date_time,
+    Sighting.duration,
+    Sighting.summary,
+    Sighting.posted,
+    Sighting.source,
+)
+
+
+# Rows fetched from the cursor per encoded chunk of a /data response
+MAP_STREAM_CHUNK_SIZE = 1000
+
+
+# Zoom level from which /data reads rows exactly instead of sampling
+SAMPLING_MAX_ZOOM = 12
+# SYSTEM sampling picks whole blocks, so ask for a little more than needed
+SAMPLE_OVERSAMPLING = 1.25
+# Fixed seed: the same view returns the same sample, so markers don't jump around
+SAMPLE_SEED = 42
+# Planner row estimate for sightings; only changes when ANALYZE runs
+_row_estimate_cache = TTLCache(maxsize=1, ttl=AGGREGATE_CACHE_TTL)
+
+
+async def _sample_percent(db: AsyncSession, target_rows: int) -> Optional[float]:
+    """Percentage of the sightings table to sample for about target_rows rows.
+
+    Returns None when the whole table should be read, including on SQLite, which
+    has no TABLESAMPLE.
+    """
+    if IS_SQLITE:
+        return None
+
+    estimate = _row_estimate_cache.get("sightings")
+    if estimate is None:
+        estimate = (
+            await db.scalar(
+                text("SELECT reltuples FROM pg_class WHERE oid = 'sightings'::regclass")
+            )
+            or 0
+        )
+        _row_estimate_cache.set("sightings", estimate)
+
+    # reltuples is -1 until the table is first analyzed
+    if estimate <= 0:
+        return None
+    percent = 100.0 * target_rows * SAMPLE_OVERSAMPLING / estimate
+    return percent if percent < 100 else None
+
+
+def _sampled_map_query(percent: float):
+    """Map /data query reading a TABLESAMPLE SYSTEM sample of the sightings table."""
+    sampled = aliased(
+        Sighting,
+        tablesample(
+            Sighting.__table__,
+            func.system(percent),
+            name="sampled",
+            # A bare int isn't a SQL expression and fails to compile
+            seed=literal(SAMPLE_SEED),
+        ),
+    )
+    return select(*(getattr(sampled, column.key) for column in MAP_COLUMNS)).where(
+        sampled.latitude.isnot(None), sampled.longitude.isnot(None)
+    )
+
+
+# Below this zoom level geojson responses are aggregated into grid cells
+CLUSTER_MAX_ZOOM = 8
+
+
+def _grid_cell(column, offset: float, grid: float):
+    """Index of the grid cell containing a coordinate, counted from offset."""
+    # Shifted to be non-negative, so truncating (SQLite's integer cast) equals
+    # floor; PostgreSQL's cast rounds, so floor explicitly there
+    cell = (column + offset) / grid
+    if not IS_SQLITE:
+        cell = func.floor(cell)
+    return cast(cell, Integer)
+
+
+def _cluster_query(zoom_level: int, filters: list):
+    """Count sightings per grid cell sized for the zoom level (~8 cells per tile)."""
+    grid = 360.0 / (2**zoom_level) / 8
+    lat_cell = _grid_cell(Sighting.latitude, 90.0, grid)
+    lng_cell = _grid_cell(Sighting.longitude, 180.0, grid)
+    return (
+        select(
+            func.count().label("sighting_count"),
+            func.avg(Sighting.latitude).label("latitude"),
+            func.avg(Sighting.longitude).label("longitude"),
+        )
+        .where(Sighting.latitude.isnot(None), Sighting.longitude.isnot(None), *filters)
+        .group_by(lat_cell, lng_cell)
+    )
+
+
+def encode_map_cursor(date_time: datetime, sighting_id: int) -> str:
+    """Encode the position after a sighting as an opaque cursor."""
+    return urlsafe_b64encode(f"{date_time.isoformat()}|{sighting_id}".encode()).decode()
+
+
+def decode_map_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor from encode_map_cursor into (date_time, id)."""
+    try:
+        date_time, sighting_id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(date_time), int(sighting_id)
+    except ValueError:
+        # Also covers malformed base64 (binascii.Error) and bad UTF-8
+        raise ValidationError("Invalid cursor", details={"cursor": cursor})
+
+
+# Clients and CDNs may reuse aggregate responses, revalidating with the ETag
+AGGREGATE_CACHE_CONTROL = "public, max-age=600, stale-while-revalidate=600"
+
+
+class CachedJSON(NamedTuple):
+    """Response body encoded once, with its ETag."""
+
+    body: bytes
+    etag: str
+
+
+def encode_cached_json(payload: Dict[str, Any]) -> CachedJSON:
+    """Encode a response payload and compute its ETag."""
+    body = orjson.dumps(payload)
+    return CachedJSON(body=body, etag=f'"{hashlib.md5(body).hexdigest()}"')
+
+
+def serve_cached_json(request: Request, cached: CachedJSON) -> Response:
+    """Serve an encoded payload as is, answering conditional requests with 304."""
+    headers = {"ETag": cached.etag, "Cache-Control": AGGREGATE_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == cached.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+# (state, min_sightings, limit) for the default /hotspots requests and their US and
+# international variants; their bodies are encoded once per summary rebuild
+PRECOMPUTED_HOTSPOT_QUERIES = tuple(
+    (state, 5, limit)
+    for state in (None, "US", "INTERNATIONAL")
+    for limit in (20, 50, 100)
+)
+# Encoded responses for PRECOMPUTED_HOTSPOT_QUERIES, keyed like aggregate_cache
+precomputed_hotspots: Dict[tuple, CachedJSON] = {}
+
+
 @router.get(
     "/states",
     summary="Get available US states",
     description="Retrieve list of US states that have UFO sightings in the database.",
 )
 async def get_available_states(
+    request: Request,
     db: AsyncSession = Depends(get_db),
 ):
     """Get list of US states with sighting data."""
-    
+
+    # Changes only when sightings are imported
+    cached = aggregate_cache.get(aggregate_cache_key("states"))
+    if cached is not None:
+        return serve_cached_json(request, cached)
+
     # Query for US states (2-letter codes) with sighting counts
-    query = select(
-        Sighting.state,
-        func.count(Sighting.id).label('sighting_count')
-    ).where(
-        Sighting.state.isnot(None),
-        func.length(Sighting.state) == 2  # Filter to US states only
-    ).group_by(Sighting.state).order_by(Sighting.state)
-    
+    query = (
+        select(Sighting.state, func.count(Sighting.id).label("sighting_count"))
+        .where(Sighting.is_us == true())  # Filter to US states only
+        .group_by(Sighting.state)
+        .order_by(Sighting.state)
+    )
+
     result = await db.execute(query)
-    states_data = result.all()
-    
-    # US state names mapping
-    us_states = {
-        'AL': 'Alabama', 'AK': 'Alaska', 'AZ': 'Arizona', 'AR': 'Arkansas',
-        'CA': 'California', 'CO': 'Colorado', 'CT': 'Connecticut', 'DE': 'Delaware',
-        'FL': 'Florida', 'GA': 'Georgia', 'HI': 'Hawaii', 'ID': 'Idaho',
-        'IL': 'Illinois', 'IN': 'Indiana', 'IA': 'Iowa', 'KS': 'Kansas',
-        'KY': 'Kentucky', 'LA': 'Louisiana', 'ME': 'Maine', 'MD': 'Maryland',
-        'MA': 'Massachusetts', 'MI': 'Michigan', 'MN': 'Minnesota', 'MS': 'Mississippi',
-        'MO': 'Missouri', 'MT': 'Montana', 'NE': 'Nebraska', 'NV': 'Nevada',
-        'NH': 'New Hampshire', 'NJ': 'New Jersey', 'NM': 'New Mexico', 'NY': 'New York',
-        'NC': 'North Carolina', 'ND': 'North Dakota', 'OH': 'Ohio', 'OK': 'Oklahoma',
-        'OR': 'Oregon', 'PA': 'Pennsylvania', 'RI': 'Rhode Island', 'SC': 'South Carolina',
-        'SD': 'South Dakota', 'TN': 'Tennessee', 'TX': 'Texas', 'UT': 'Utah',
-        'VT': 'Vermont', 'VA': 'Virginia', 'WA': 'Washington', 'WV': 'West Virginia',
-        'WI': 'Wisconsin', 'WY': 'Wyoming', 'DC': 'District of Columbia',
-        'AS': 'American Samoa', 'GU': 'Guam', 'MP': 'Northern Mariana Islands',
-        'PR': 'Puerto Rico', 'VI': 'Virgin Islands'
-    }
-    
+
     # Format response with state names
-    states = []
-    for state_data in states_data:
-        state_code = state_data.state
-        state_name = us_states.get(state_code, state_code)
-        states.append({
-            'code': state_code,
-            'name': state_name,
-            'sighting_count': state_data.sighting_count
-        })
-    
-    return {
-        'states': states,
-        'total_states': len(states)
-    }
+    states = [
+        {
+            "code": row.state,
+            "name": US_STATE_NAMES.get(row.state, row.state),
+            "sighting_count": row.sighting_count,
+        }
+        for row in result
+    ]
+
+    cached = encode_cached_json({"states": states, "total_states": len(states)})
+    aggregate_cache.set(aggregate_cache_key("states"), cached)
+    return serve_cached_json(request, cached)
 
 
 @router.get(
     "/data",
     summary="Get map visualization data",
-    description="Retrieve sighting data optimized for map display with optional clustering.",
+    description=(
+        "Retrieve sighting data optimized for map display with optional clustering."
+    ),
 )
 async def get_map_data(
     # Filtering parameters
     state: Optional[str] = Query(None, description="Filter by state"),
     city: Optional[str] = Query(None, description="Filter by city name"),
     shape: Optional[str] = Query(None, description="Filter by object shape"),
-    source: Optional[str] = Query(None, description="Filter by data source (nuforc, ufo_aficionado_api)"),
+    source: Optional[str] = Query(
+        None, description="Filter by data source (nuforc, ufo_aficionado_api)"
+    ),
     date_from: Optional[datetime] = Query(None, description="Filter from date"),
     date_to: Optional[datetime] = Query(None, description="Filter to date"),
     # Map-specific parameters
     bounds: Optional[str] = Query(
-        None, 
-        description="Map bounds as 'south,west,north,east' for viewport filtering"
+        None, description="Map bounds as 'south,west,north,east' for viewport filtering"
     ),
     zoom_level: Optional[int] = Query(
-        None, 
-        description="Current zoom level for clustering optimization",
-        ge=1, le=18
+        None, description="Current zoom level for clustering optimization", ge=1, le=18
     ),
     format: str = Query(
-        "geojson", 
-        description="Response format",
-        pattern="^(geojson|simple)$"
+        "geojson", description="Response format", pattern="^(geojson|simple)$"
+    ),
+    cursor: Optional[str] = Query(
+        None,
+        description="next_cursor from a previous response, to fetch the following page",
     ),
     db: AsyncSession = Depends(get_db),
 ):
     """Get sighting data optimized for map visualization."""
 
-    # Build base query
-    query = select(Sighting).where(
-        Sighting.latitude.isnot(None),
-        Sighting.longitude.isnot(None)
+    # Build base query over just the rendered columns; plain rows skip ORM
+    # hydration and identity-map bookkeeping for up to 15k sightings
+    query = select(*MAP_COLUMNS).where(
+        Sighting.latitude.isnot(None), Sighting.longitude.isnot(None)
     )
-    
-    # Apply filters
-    filters = []
-    
-    if state:
-        if state.upper() == "US":
-            # Show only US states (2-letter codes)
-            filters.append(Sighting.state.isnot(None))
-            filters.append(func.length(Sighting.state) == 2)
-        elif state.upper() == "INTERNATIONAL":
-            # Show only international sightings (non-US or null states)
-            filters.append(
-                (Sighting.state.is_(None)) | (func.length(Sighting.state) != 2)
-            )
-        else:
-            # Show specific state
-            filters.append(Sighting.state == state.upper())
-    
-    if city:
-        filters.append(Sighting.city.ilike(f"%{city}%"))
-    
-    if shape:
-        filters.append(Sighting.shape.ilike(f"%{shape}%"))
-    
-    if source:
-        filters.append(Sighting.source == source)
-    
-    if date_from:
-        filters.append(Sighting.date_time >= date_from)
-    
-    if date_to:
-        filters.append(Sighting.date_time <= date_to)
-    
-    # Apply viewport bounds filtering if provided
-    if bounds:
-        try:
-            south, west, north, east = map(float, bounds.split(','))
-            filters.extend([
-                Sighting.latitude >= south,
-                Sighting.latitude <= north,
-                Sighting.longitude >= west,
-                Sighting.longitude <= east
-            ])
-        except (ValueError, TypeError):
-            # Invalid bounds format, ignore
-            pass
-    
+
+    filters = await build_sighting_filters(
+        db,
+        state=state,
+        shape=shape,
+        date_from=date_from,
+        date_to=date_to,
+        city=city,
+        source=source,
+        bounds=bounds,
+    )
+
+    # Zoomed-out geojson views get one feature per grid cell instead of every point
+    if (
+        format == "geojson"
+        and zoom_level is not None
+        and zoom_level < CLUSTER_MAX_ZOOM
+        and not cursor
+    ):
+        result = await db.execute(_cluster_query(zoom_level, filters))
+        return create_cluster_response(result.all())
+
+    # Keyset pagination: continue strictly after the last row of the previous page
+    if cursor:
+        cursor_date_time, cursor_id = decode_map_cursor(cursor)
+        filters.append(
+            tuple_(Sighting.date_time, Sighting.id) < (cursor_date_time, cursor_id)
+        )
+
     if filters:
         query = query.where(and_(*filters))
-    
-    # For map visualization, we want a good time distribution
-    # Remove strict date ordering to get a better sample across all time periods
-    
+
     # Apply smart limiting based on zoom level and request
     if zoom_level:
         limit = min(15000, max(100, zoom_level * 200))
-        query = query.limit(limit)
     else:
         # Allow larger datasets for map visualization, but still reasonable limit
-        query = query.limit(15000)  # Increased from 5000 to show more data
-    
-    # Execute query
-    result = await db.execute(query)
-    sightings = result.scalars().all()
-    
-    if format == "geojson":
-        return create_geojson_response(sightings)
+        limit = 15000  # Increased from 5000 to show more data
+
+    # For map visualization, we want a good time distribution. LIMIT alone returns
+    # whichever rows come first on disk, so unfiltered zoomed-out views sample the
+    # table instead; zoomed-in and filtered views are already narrowed by indexes
+    sample_percent = None
+    if not filters and (zoom_level is None or zoom_level < SAMPLING_MAX_ZOOM):
+        sample_percent = await _sample_percent(db, limit)
+
+    if sample_percent is not None:
+        query = _sampled_map_query(sample_percent)
     else:
-        return create_simple_response(sightings)
+        # Newest first; ix_sightings_date_id returns rows in this order without a sort
+        query = query.order_by(Sighting.date_time.desc(), Sighting.id.desc())
+
+    query = query.limit(limit)
+
+    # Encoding overlaps fetching, so neither rows nor built features are held at once
+    return StreamingResponse(
+        _stream_map_data(query, format, limit, paginated=sample_percent is None),
+        media_type="application/json",
+    )
 
 
 @router.get(
@@ -187,6 +420,7 @@ async def get_map_data(
     description="Retrieve aggregated statistics for geographic hotspots.",
 )
 async def get_hotspots(
+    request: Request,
     # Filtering parameters
     state: Optional[str] = Query(None, description="Filter by state"),
     shape: Optional[str] = Query(None, description="Filter by object shape"),
@@ -198,85 +432,160 @@ async def get_hotspots(
     db: AsyncSession = Depends(get_db),
 ):
     """Get geographic hotspots with sighting aggregations."""
-    
-    # Build query for hotspot analysis
-    query = select(
-        Sighting.city,
-        Sighting.state,
-        func.avg(Sighting.latitude).label('avg_lat'),
-        func.avg(Sighting.longitude).label('avg_lng'),
-        func.count(Sighting.id).label('sighting_count'),
-        func.min(Sighting.date_time).label('earliest_sighting'),
-        func.max(Sighting.date_time).label('latest_sighting')
-    ).where(
-        Sighting.latitude.isnot(None),
-        Sighting.longitude.isnot(None)
+
+    cache_key = aggregate_cache_key(
+        "hotspots",
+        state=state,
+        shape=shape,
+        date_from=date_from,
+        date_to=date_to,
+        min_sightings=min_sightings,
+        limit=limit,
     )
-    
-    # Apply filters
-    filters = []
-    
+    summary_ready = hotspot_summary_refresher.ready
+    cached = (
+        precomputed_hotspots.get(cache_key) if summary_ready else None
+    ) or aggregate_cache.get(cache_key)
+    if cached is not None:
+        return serve_cached_json(request, cached)
+
+    # Without shape or date filters the precomputed summary already holds the answer
+    if summary_ready and not (shape or date_from or date_to):
+        hotspots = await _read_hotspot_summary(db, state, min_sightings, limit)
+    else:
+        hotspots = await _aggregate_hotspots(
+            db, state, shape, date_from, date_to, min_sightings, limit
+        )
+
+    cached = encode_cached_json(_hotspot_payload(hotspots, min_sightings))
+    aggregate_cache.set(cache_key, cached)
+    return serve_cached_json(request, cached)
+
+
+def _hotspot_payload(hotspots: Sequence[Row], min_sightings: int) -> Dict[str, Any]:
+    """Format hotspot rows as the /hotspots response."""
+    hotspot_data = [
+        {
+            "city": hotspot.city,
+            "state": hotspot.state,
+            "latitude": float(hotspot.avg_lat),
+            "longitude": float(hotspot.avg_lng),
+            "sighting_count": hotspot.sighting_count,
+            "earliest_sighting": hotspot.earliest_sighting.isoformat(),
+            "latest_sighting": hotspot.latest_sighting.isoformat(),
+            "location": f"{hotspot.city}, {hotspot.state}",
+        }
+        for hotspot in hotspots
+    ]
+
+    return {
+        "hotspots": hotspot_data,
+        "total_hotspots": len(hotspot_data),
+        "min_sightings_filter": min_sightings,
+    }
+
+
+async def precompute_hotspot_responses() -> None:
+    """Encode the common /hotspots responses from the freshly rebuilt summary."""
+    global precomputed_hotspots
+
+    responses = {}
+    async with get_db_session() as session:
+        for state, min_sightings, limit in PRECOMPUTED_HOTSPOT_QUERIES:
+            hotspots = await _read_hotspot_summary(session, state, min_sightings, limit)
+            cache_key = aggregate_cache_key(
+                "hotspots", state=state, min_sightings=min_sightings, limit=limit
+            )
+            responses[cache_key] = encode_cached_json(
+                _hotspot_payload(hotspots, min_sightings)
+            )
+
+    # Swapped in whole, so requests never see a mix of old and new summaries
+    precomputed_hotspots = responses
+
+
+hotspot_summary_refresher.add_listener(precompute_hotspot_responses)
+
+
+async def _read_hotspot_summary(
+    db: AsyncSession, state: Optional[str], min_sightings: int, limit: int
+) -> Sequence[Row]:
+    """Read the top locations from the hotspot summary table (no aggregation)."""
+    query = select(
+        HotspotSummary.city,
+        HotspotSummary.state,
+        HotspotSummary.latitude.label("avg_lat"),
+        HotspotSummary.longitude.label("avg_lng"),
+        HotspotSummary.sighting_count,
+        HotspotSummary.earliest_sighting,
+        HotspotSummary.latest_sighting,
+    ).where(HotspotSummary.sighting_count >= min_sightings)
+
     if state:
         if state.upper() == "US":
             # Show only US states (2-letter codes)
-            filters.append(Sighting.state.isnot(None))
-            filters.append(func.length(Sighting.state) == 2)
+            query = query.where(
+                HotspotSummary.state.isnot(None), func.length(HotspotSummary.state) == 2
+            )
         elif state.upper() == "INTERNATIONAL":
             # Show only international sightings (non-US or null states)
-            filters.append(
-                (Sighting.state.is_(None)) | (func.length(Sighting.state) != 2)
+            query = query.where(
+                (HotspotSummary.state.is_(None))
+                | (func.length(HotspotSummary.state) != 2)
             )
         else:
             # Show specific state
-            filters.append(Sighting.state == state.upper())
-    
-    if shape:
-        filters.append(Sighting.shape.ilike(f"%{shape}%"))
-    
-    if date_from:
-        filters.append(Sighting.date_time >= date_from)
-    
-    if date_to:
-        filters.append(Sighting.date_time <= date_to)
-    
+            query = query.where(HotspotSummary.state == state.upper())
+
+    result = await db.execute(
+        query.order_by(HotspotSummary.sighting_count.desc()).limit(limit)
+    )
+    return result.all()
+
+
+async def _aggregate_hotspots(
+    db: AsyncSession,
+    state: Optional[str],
+    shape: Optional[str],
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    min_sightings: int,
+    limit: int,
+) -> Sequence[Row]:
+    """Aggregate hotspots directly from the sightings table."""
+    # Build query for hotspot analysis
+    query = select(
+        Sighting.city,
+        Sighting.state,
+        func.avg(Sighting.latitude).label("avg_lat"),
+        func.avg(Sighting.longitude).label("avg_lng"),
+        func.count(Sighting.id).label("sighting_count"),
+        func.min(Sighting.date_time).label("earliest_sighting"),
+        func.max(Sighting.date_time).label("latest_sighting"),
+    ).where(Sighting.latitude.isnot(None), Sighting.longitude.isnot(None))
+
+    filters = await build_sighting_filters(
+        db, state=state, shape=shape, date_from=date_from, date_to=date_to
+    )
+
     if filters:
         query = query.where(and_(*filters))
-    
+
     # Group by location
     query = query.group_by(Sighting.city, Sighting.state)
-    
+
     # Filter by minimum sightings
     query = query.having(func.count(Sighting.id) >= min_sightings)
-    
+
     # Order by sighting count (descending)
     query = query.order_by(func.count(Sighting.id).desc())
-    
+
     # Apply limit
     query = query.limit(limit)
-    
+
     # Execute query
     result = await db.execute(query)
-    hotspots = result.all()
-    
-    # Format response
-    hotspot_data = []
-    for hotspot in hotspots:
-        hotspot_data.append({
-            "city": hotspot.city,
-            "state": hotspot.state,
-            "latitude": float(hotspot.avg_lat),
-            "longitude": float(hotspot.avg_lng),
-            "sighting_count": hotspot.sighting_count,
-            "earliest_sighting": hotspot.earliest_sighting.isoformat(),
-            "latest_sighting": hotspot.latest_sighting.isoformat(),
-            "location": f"{hotspot.city}, {hotspot.state}"
-        })
-    
-    return {
-        "hotspots": hotspot_data,
-        "total_hotspots": len(hotspot_data),
-        "min_sightings_filter": min_sightings
-    }
+    return result.all()
 
 
 @router.get(
@@ -285,6 +594,7 @@ async def get_hotspots(
     description="Get overall statistics for map visualization.",
 )
 async def get_map_stats(
+    request: Request,
     state: Optional[str] = Query(None, description="Filter by state"),
     shape: Optional[str] = Query(None, description="Filter by object shape"),
     source: Optional[str] = Query(None, description="Filter by data source"),
@@ -293,149 +603,202 @@ async def get_map_stats(
     db: AsyncSession = Depends(get_db),
 ):
     """Get statistics for the current map view."""
-    
-    # Build base query
-    base_query = select(Sighting).where(
-        Sighting.latitude.isnot(None),
-        Sighting.longitude.isnot(None)
+
+    cache_key = aggregate_cache_key(
+        "stats",
+        state=state,
+        shape=shape,
+        source=source,
+        date_from=date_from,
+        date_to=date_to,
     )
-    
-    # Apply filters
-    filters = []
-    
-    if state:
-        if state.upper() == "US":
-            # Show only US states (2-letter codes)
-            filters.append(Sighting.state.isnot(None))
-            filters.append(func.length(Sighting.state) == 2)
-        elif state.upper() == "INTERNATIONAL":
-            # Show only international sightings (non-US or null states)
-            filters.append(
-                (Sighting.state.is_(None)) | (func.length(Sighting.state) != 2)
-            )
-        else:
-            # Show specific state
-            filters.append(Sighting.state == state.upper())
-    
-    if shape:
-        filters.append(Sighting.shape.ilike(f"%{shape}%"))
-    
-    if source:
-        filters.append(Sighting.source == source)
-    
-    if date_from:
-        filters.append(Sighting.date_time >= date_from)
-    
-    if date_to:
-        filters.append(Sighting.date_time <= date_to)
-    
-    if filters:
-        base_query = base_query.where(and_(*filters))
-    
-    # Get total count
-    count_query = select(func.count(Sighting.id)).select_from(base_query.subquery())
-    total_result = await db.execute(count_query)
-    total_sightings = total_result.scalar()
-    
-    # Get shape distribution
-    shape_query = select(
+    cached = aggregate_cache.get(cache_key)
+    if cached is not None:
+        return serve_cached_json(request, cached)
+
+    # One grouped scan; the (shape, source) groups are few, so every statistic
+    # is rolled up from them here instead of re-scanning for each one
+    query = select(
         Sighting.shape,
-        func.count(Sighting.id).label('count')
-    ).select_from(base_query.subquery()).group_by(Sighting.shape).order_by(func.count(Sighting.id).desc())
-    
-    shape_result = await db.execute(shape_query)
-    shape_stats = [{"shape": row.shape, "count": row.count} for row in shape_result]
-    
-    # Get source distribution
-    source_query = select(
         Sighting.source,
-        func.count(Sighting.id).label('count')
-    ).select_from(base_query.subquery()).group_by(Sighting.source).order_by(func.count(Sighting.id).desc())
-    
-    source_result = await db.execute(source_query)
-    source_stats = [{"source": row.source, "count": row.count} for row in source_result]
-    
-    # Get date range
-    date_query = select(
-        func.min(Sighting.date_time).label('earliest'),
-        func.max(Sighting.date_time).label('latest')
-    ).select_from(base_query.subquery())
-    
-    date_result = await db.execute(date_query)
-    date_range = date_result.first()
-    
-    return {
-        "total_sightings": total_sightings,
-        "shape_distribution": shape_stats,
-        "source_distribution": source_stats,
-        "date_range": {
-            "earliest": date_range.earliest.isoformat() if date_range.earliest else None,
-            "latest": date_range.latest.isoformat() if date_range.latest else None
-        }
-    }
+        func.count().label("count"),
+        func.min(Sighting.date_time).label("earliest"),
+        func.max(Sighting.date_time).label("latest"),
+    ).where(Sighting.latitude.isnot(None), Sighting.longitude.isnot(None))
 
+    filters = await build_sighting_filters(
+        db,
+        state=state,
+        shape=shape,
+        date_from=date_from,
+        date_to=date_to,
+        source=source,
+    )
 
-def create_geojson_response(sightings: List[Sighting]) -> Dict[str, Any]:
-    """Create a GeoJSON FeatureCollection from sightings."""
-    features = []
-    
-    for sighting in sightings:
-        if not (sighting.latitude and sighting.longitude):
-            continue
-            
-        feature = {
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": [float(sighting.longitude), float(sighting.latitude)]
+    if filters:
+        query = query.where(and_(*filters))
+
+    result = await db.execute(query.group_by(Sighting.shape, Sighting.source))
+    groups = result.all()
+
+    shape_counts = Counter()
+    source_counts = Counter()
+    for group in groups:
+        shape_counts[group.shape] += group.count
+        source_counts[group.source] += group.count
+
+    total_sightings = sum(shape_counts.values())
+    shape_stats = [
+        {"shape": shape, "count": count} for shape, count in shape_counts.most_common()
+    ]
+    source_stats = [
+        {"source": source, "count": count}
+        for source, count in source_counts.most_common()
+    ]
+
+    # Groups only exist for matching rows, so both are None when nothing matched
+    earliest = min((group.earliest for group in groups), default=None)
+    latest = max((group.latest for group in groups), default=None)
+
+    cached = encode_cached_json(
+        {
+            "total_sightings": total_sightings,
+            "shape_distribution": shape_stats,
+            "source_distribution": source_stats,
+            "date_range": {
+                "earliest": earliest.isoformat() if earliest else None,
+                "latest": latest.isoformat() if latest else None,
             },
-            "properties": {
-                "id": sighting.id,
-                "city": sighting.city,
-                "state": sighting.state,
-                "shape": sighting.shape,
-                "date_time": sighting.date_time.isoformat(),
-                "duration": sighting.duration,
-                "summary": sighting.summary,
-                "posted": sighting.posted.isoformat(),
-                "source": sighting.source
-            }
-        }
-        features.append(feature)
-    
-    return {
-        "type": "FeatureCollection",
-        "features": features,
-        "properties": {
-            "total_features": len(features),
-            "generated_at": datetime.utcnow().isoformat()
         }
-    }
+    )
+    aggregate_cache.set(cache_key, cached)
+    return serve_cached_json(request, cached)
 
 
-def create_simple_response(sightings: List[Sighting]) -> Dict[str, Any]:
-    """Create a simple JSON response from sightings."""
-    sighting_data = []
-    
-    for sighting in sightings:
-        if not (sighting.latitude and sighting.longitude):
-            continue
-            
-        sighting_data.append({
+def geojson_feature(sighting: Row) -> Dict[str, Any]:
+    """Build a GeoJSON Point feature from a sighting row."""
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [sighting.longitude, sighting.latitude],
+        },
+        "properties": {
             "id": sighting.id,
-            "latitude": float(sighting.latitude),
-            "longitude": float(sighting.longitude),
             "city": sighting.city,
             "state": sighting.state,
             "shape": sighting.shape,
-            "date_time": sighting.date_time.isoformat(),
+            "date_time": sighting.date_time,
             "duration": sighting.duration,
             "summary": sighting.summary,
-            "source": sighting.source
-        })
-    
+            "posted": sighting.posted,
+            "source": sighting.source,
+        },
+    }
+
+
+def simple_sighting(sighting: Row) -> Dict[str, Any]:
+    """Build a flat sighting object for the simple format."""
     return {
-        "sightings": sighting_data,
-        "total": len(sighting_data),
-        "generated_at": datetime.utcnow().isoformat()
-    }
\ No newline at end of file
+        "id": sighting.id,
+        "latitude": sighting.latitude,
+        "longitude": sighting.longitude,
+        "city": sighting.city,
+        "state": sighting.state,
+        "shape": sighting.shape,
+        "date_time": sighting.date_time,
+        "duration": sighting.duration,
+        "summary": sighting.summary,
+        "source": sighting.source,
+    }
+
+
+async def _stream_map_data(query, format: str, limit: int, paginated: bool):
+    """Yield the /data response body, encoding rows as the cursor produces them.
+
+    Only one partition of rows is held at a time. Counts and next_cursor depend
+    on the last row, so they are written after the array; key order doesn't
+    matter to JSON clients.
+    """
+    # The request's session may be closed before the body is sent, so use our own
+    async with get_db_session() as session:
+        # Streams over a server-side cursor that fetches one chunk per round trip,
+        # instead of the driver's small default prefetch; partitions() follow yield_per
+        result = await session.stream(
+            query.execution_options(yield_per=MAP_STREAM_CHUNK_SIZE)
+        )
+
+        if format == "geojson":
+            make_item = geojson_feature
+            yield b'{"type":"FeatureCollection","features":['
+        else:
+            make_item = simple_sighting
+            yield b'{"sightings":['
+
+        rows_seen = 0
+        total = 0
+        last_row = None
+        separator = b""
+        async for rows in result.partitions():
+            rows_seen += len(rows)
+            last_row = rows[-1]
+            items = [
+                orjson.dumps(make_item(row))
+                for row in rows
+                if row.latitude and row.longitude
+            ]
+            if items:
+                yield separator + b",".join(items)
+                separator = b","
+                total += len(items)
+
+    # A full ordered page may have more after it; samples aren't paginated
+    next_cursor = None
+    if paginated and rows_seen == limit:
+        next_cursor = encode_map_cursor(last_row.date_time, last_row.id)
+
+    if format == "geojson":
+        yield b'],"properties":' + orjson.dumps(
+            {
+                "total_features": total,
+                "next_cursor": next_cursor,
+                "generated_at": datetime.now(UTC),
+            }
+        ) + b"}"
+    else:
+        # Splice the trailing keys into the open object (drop their own opening brace)
+        yield b"]," + orjson.dumps(
+            {
+                "total": total,
+                "next_cursor": next_cursor,
+                "generated_at": datetime.now(UTC),
+            }
+        )[1:]
+
+
+def create_cluster_response(clusters: Sequence[Row]) -> ORJSONResponse:
+    """Create a GeoJSON FeatureCollection of grid-cell clusters."""
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [cluster.longitude, cluster.latitude],
+            },
+            "properties": {"cluster": True, "count": cluster.sighting_count},
+        }
+        for cluster in clusters
+    ]
+
+    return ORJSONResponse(
+        {
+            "type": "FeatureCollection",
+            "features": features,
+            "properties": {
+                "total_features": len(features),
+                "total_sightings": sum(cluster.sighting_count for cluster in clusters),
+                "clustered": True,
+                "generated_at": datetime.now(UTC),
+            },
+        }
+    )
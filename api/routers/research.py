@@ -1,142 +1,325 @@
 """AI-powered UFO sighting research endpoints using Google Gemini."""
 
-import json
+import asyncio
 import logging
-from datetime import datetime
-from typing import Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, UTC
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Set, Tuple
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
 import google.generativeai as genai
 
-from api.database import get_db
+from api.database import get_db, get_db_session
 from api.models import Sighting, ResearchCache
 from api.config import settings
+from api.research_cache import (
+    CURRENT_MODEL_VERSION,
+    research_hit_recorder,
+    research_memory_cache,
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/v1/research", tags=["research"])
 
+# Sighting columns the prompts and sighting_summary use
+RESEARCH_COLUMNS = (
+    Sighting.id,
+    Sighting.date_time,
+    Sighting.city,
+    Sighting.state,
+    Sighting.shape,
+    Sighting.duration,
+    Sighting.summary,
+    Sighting.text,
+)
+
+# Sighting date as written in research prompts, e.g. "July 04, 2023 at 21:30"
+RESEARCH_DATE_FORMAT = "%B %d, %Y at %H:%M"
+
 # Configure Gemini AI
 if settings.GEMINI_API_KEY:
     genai.configure(api_key=settings.GEMINI_API_KEY)
 else:
-    logger.warning("GEMINI_API_KEY not configured. Research functionality will be disabled.")
+    logger.warning(
+        "GEMINI_API_KEY not configured. Research functionality will be disabled."
+    )
 
-# Current model version for cache invalidation
-CURRENT_MODEL_VERSION = "gemini-2.0-flash-exp"
 
+async def get_memory_cached_research(
+    sighting_id: int, research_type: str
+) -> Optional[Dict[str, Any]]:
+    """Get research from the in-process cache, without touching the database."""
+    cached = research_memory_cache.get(
+        (sighting_id, research_type, CURRENT_MODEL_VERSION)
+    )
+    if cached is None:
+        return None
+    entry_id, analysis = cached
+    await research_hit_recorder.record(entry_id)
+    return analysis
 
-async def get_cached_research(
-    db: AsyncSession, 
-    sighting_id: int, 
-    research_type: str
+
+async def get_stored_research(
+    db: AsyncSession, sighting_id: int, research_type: str
 ) -> Optional[Dict[str, Any]]:
-    """Get cached research result if available."""
+    """Get research from the research_cache table and keep it in memory."""
     try:
+        # A plain read; the hit is counted by the recorder instead of an UPDATE here
         result = await db.execute(
-            select(ResearchCache).where(
+            select(ResearchCache.id, ResearchCache.analysis_result)
+            .where(
                 ResearchCache.sighting_id == sighting_id,
                 ResearchCache.research_type == research_type,
-                ResearchCache.model_version == CURRENT_MODEL_VERSION
+                ResearchCache.model_version == CURRENT_MODEL_VERSION,
             )
+            .limit(1)
         )
-        cache_entry = result.scalar_one_or_none()
-        
-        if cache_entry:
-            # Update access tracking
-            await db.execute(
-                update(ResearchCache)
-                .where(ResearchCache.id == cache_entry.id)
-                .values(
-                    cache_hits=ResearchCache.cache_hits + 1,
-                    last_accessed=datetime.utcnow()
-                )
-            )
-            await db.commit()
-            
+        entry = result.first()
+
+        if entry is not None:
+            await research_hit_recorder.record(entry.id)
             # Return parsed JSON result
-            return json.loads(cache_entry.analysis_result)
-            
+            analysis = orjson.loads(entry.analysis_result)
+            research_memory_cache.set(
+                (sighting_id, research_type, CURRENT_MODEL_VERSION),
+                (entry.id, analysis),
+            )
+            return analysis
+
     except Exception as e:
         logger.warning(f"Failed to retrieve cached research: {e}")
-    
+
     return None
 
 
+async def get_cached_research(
+    db: AsyncSession, sighting_id: int, research_type: str
+) -> Optional[Dict[str, Any]]:
+    """Get cached research result if available."""
+    # Popular sightings are answered without touching the database
+    cached = await get_memory_cached_research(sighting_id, research_type)
+    if cached is not None:
+        return cached
+    return await get_stored_research(db, sighting_id, research_type)
+
+
+async def load_research_sighting(sighting_id: int) -> Optional[Sighting]:
+    """Load the sighting columns research needs, on a session of its own."""
+    async with get_db_session() as session:
+        result = await session.execute(
+            select(Sighting)
+            .options(load_only(*RESEARCH_COLUMNS))
+            .where(Sighting.id == sighting_id)
+        )
+        return result.scalar_one_or_none()
+
+
+async def get_cached_research_or_sighting(
+    db: AsyncSession, sighting_id: int, research_type: str
+) -> Tuple[Optional[Dict[str, Any]], Optional[Sighting]]:
+    """Look up cached research while the sighting loads concurrently.
+
+    Returns (cached result, None) on a hit and (None, sighting) on a miss. A
+    memory hit returns before any database work; otherwise the sighting loads
+    alongside the research_cache read, so a miss waits for the slower of the
+    two rather than both in turn. The sighting is read on its own session
+    because an AsyncSession can't run two statements at once.
+    """
+    cached_result = await get_memory_cached_research(sighting_id, research_type)
+    if cached_result is not None:
+        return cached_result, None
+
+    sighting_task = asyncio.create_task(load_research_sighting(sighting_id))
+    try:
+        cached_result = await get_stored_research(db, sighting_id, research_type)
+    except BaseException:
+        sighting_task.cancel()
+        raise
+
+    if cached_result:
+        sighting_task.cancel()
+        return cached_result, None
+    return None, await sighting_task
+
+
 async def save_research_to_cache(
-    db: AsyncSession,
-    sighting_id: int,
-    research_type: str,
-    result: Dict[str, Any]
+    db: AsyncSession, sighting_id: int, research_type: str, result: Dict[str, Any]
 ) -> None:
     """Save research result to cache."""
     try:
         cache_entry = ResearchCache(
             sighting_id=sighting_id,
             research_type=research_type,
-            analysis_result=json.dumps(result),
-            model_version=CURRENT_MODEL_VERSION
+            analysis_result=orjson.dumps(result).decode(),
+            model_version=CURRENT_MODEL_VERSION,
         )
         db.add(cache_entry)
         await db.commit()
+        research_memory_cache.set(
+            (sighting_id, research_type, CURRENT_MODEL_VERSION),
+            (cache_entry.id, result),
+        )
         logger.info(f"Cached {research_type} research for sighting {sighting_id}")
-        
+
     except Exception as e:
         logger.error(f"Failed to cache research result: {e}")
         # Don't fail the request if caching fails
         await db.rollback()
 
 
+# Cache writes started after a stream ends, kept referenced until they finish
+_pending_cache_writes: Set[asyncio.Task] = set()
+
+
+async def cache_research_in_background(
+    sighting_id: int, research_type: str, result: Dict[str, Any]
+) -> None:
+    """Save a streamed research result on a session of its own."""
+    async with get_db_session() as session:
+        await save_research_to_cache(session, sighting_id, research_type, result)
+
+
+def extract_citations(response) -> list:
+    """Collect grounding citations from a Gemini response, if it has any."""
+    # Extract citations if available
+    citations = []
+    if hasattr(response, "candidates") and response.candidates:
+        for candidate in response.candidates:
+            if hasattr(candidate, "grounding_metadata"):
+                for source in candidate.grounding_metadata.grounding_supports:
+                    if hasattr(source, "segment"):
+                        citations.append(
+                            {
+                                "title": getattr(source.segment, "title", "Unknown"),
+                                "url": getattr(source.segment, "url", ""),
+                                "snippet": getattr(source.segment, "text", "")[:200]
+                                + "...",
+                            }
+                        )
+    return citations
+
+
+def sse_event(data: Dict[str, Any]) -> bytes:
+    """Encode one Server-Sent Events message."""
+    return b"data: " + orjson.dumps(data) + b"\n\n"
+
+
+def event_stream_response(
+    events: AsyncIterator[bytes], cache_status: str
+) -> StreamingResponse:
+    """Wrap research events in a text/event-stream response."""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"X-Cache": cache_status, "Cache-Control": "no-cache"},
+    )
+
+
+async def cached_research_events(result: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """A cached result as a stream: the whole result in one event."""
+    yield sse_event({"result": result})
+
+
+async def stream_research_events(
+    response_stream: Iterable,
+    sighting_id: int,
+    research_type: str,
+    build_result: Callable[[str, Any], Dict[str, Any]],
+) -> AsyncIterator[bytes]:
+    """Relay Gemini output as it is generated, then send and cache the full result.
+
+    Each chunk of text is one {"chunk": ...} event and the last event is
+    {"result": ...}, the same body the JSON endpoint returns. The SDK iterator
+    blocks on the network, so each chunk is read on a worker thread.
+    """
+    chunks = iter(response_stream)
+    parts = []
+    try:
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            parts.append(chunk.text)
+            yield sse_event({"chunk": chunk.text})
+        result = build_result("".join(parts), response_stream)
+    except Exception as e:
+        # Headers are already sent, so the failure is reported in the stream
+        logger.error(
+            f"Error streaming {research_type} research for sighting {sighting_id}: "
+            f"{str(e)}"
+        )
+        yield sse_event({"error": f"Failed to generate research: {str(e)}"})
+        return
+
+    yield sse_event({"result": result})
+
+    # The client has everything; don't hold the connection open for the write
+    task = asyncio.create_task(
+        cache_research_in_background(sighting_id, research_type, result)
+    )
+    _pending_cache_writes.add(task)
+    task.add_done_callback(_pending_cache_writes.discard)
+
+
 @router.get(
     "/sighting/{sighting_id}",
     summary="AI Research UFO Sighting",
-    description="Generate comprehensive research report for a specific UFO sighting using AI."
+    description=(
+        "Generate comprehensive research report for a specific UFO sighting using AI."
+    ),
 )
 async def research_sighting(
     sighting_id: int,
-    db: AsyncSession = Depends(get_db)
+    http_response: Response,
+    stream: bool = Query(
+        False,
+        description="Stream the report as Server-Sent Events while it is generated",
+    ),
+    db: AsyncSession = Depends(get_db),
 ):
     """Generate AI-powered research report for a UFO sighting."""
-    
+
     # Check if Gemini is configured
     if not settings.GEMINI_API_KEY:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="AI research service is not available. Contact administrator."
+            detail="AI research service is not available. Contact administrator.",
         )
-    
-    # Check cache first
-    cached_result = await get_cached_research(db, sighting_id, "full")
+
+    # Check cache first, loading the sighting alongside in case of a miss
+    cached_result, sighting = await get_cached_research_or_sighting(
+        db, sighting_id, "full"
+    )
     if cached_result:
         logger.info(f"Returning cached full research for sighting {sighting_id}")
+        if stream:
+            return event_stream_response(cached_research_events(cached_result), "HIT")
+        http_response.headers["X-Cache"] = "HIT"
         return cached_result
-    
-    # Get the sighting from database
-    result = await db.execute(select(Sighting).where(Sighting.id == sighting_id))
-    sighting = result.scalar_one_or_none()
-    
+    http_response.headers["X-Cache"] = "MISS"
+
     if not sighting:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Sighting with ID {sighting_id} not found"
+            detail=f"Sighting with ID {sighting_id} not found",
         )
-    
+
     try:
         # Generate new full research with Gemini
         logger.info(f"Generating new full research for sighting {sighting_id}")
         research_query = build_research_query(sighting)
-        
+
         # Use Gemini for research with search grounding
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
+        model = genai.GenerativeModel("gemini-2.0-flash-exp")
+
         # Configure generation with search grounding
         generation_config = genai.types.GenerationConfig(
             temperature=0.7,
             max_output_tokens=4000,
         )
-        
+
         # Construct prompt for research
         prompt = f"""
 Research this UFO sighting and provide a comprehensive analysis:
@@ -152,93 +335,111 @@ Please provide:
 
 Format your response as structured sections with proper citations for all claims.
 Use web search to find current information and credible sources.
-"""
-        
-        # Generate response (simplified - no search grounding for now)
-        response = model.generate_content(
-            prompt,
-            generation_config=generation_config
-        )
-        
-        # Extract citations if available
-        citations = []
-        if hasattr(response, 'candidates') and response.candidates:
-            for candidate in response.candidates:
-                if hasattr(candidate, 'grounding_metadata'):
-                    for source in candidate.grounding_metadata.grounding_supports:
-                        if hasattr(source, 'segment'):
-                            citations.append({
-                                "title": getattr(source.segment, 'title', 'Unknown'),
-                                "url": getattr(source.segment, 'url', ''),
-                                "snippet": getattr(source.segment, 'text', '')[:200] + '...'
-                            })
-        
-        # Prepare result
-        result = {
-            "sighting_id": sighting_id,
-            "research_report": response.text,
-            "citations": citations,
-            "generated_at": datetime.utcnow().isoformat(),
-            "sighting_summary": {
-                "date": sighting.date_time.isoformat() if sighting.date_time else None,
-                "location": f"{sighting.city}, {sighting.state}" if sighting.state else sighting.city,
-                "shape": sighting.shape,
-                "summary": sighting.summary
+"""  # noqa: E501
+
+        # Prepare result from the generated text
+        def build_result(report: str, response) -> Dict[str, Any]:
+            return {
+                "sighting_id": sighting_id,
+                "research_report": report,
+                "citations": extract_citations(response),
+                "generated_at": datetime.now(UTC).isoformat(),
+                "sighting_summary": {
+                    "date": (
+                        sighting.date_time.isoformat() if sighting.date_time else None
+                    ),
+                    "location": (
+                        f"{sighting.city}, {sighting.state}"
+                        if sighting.state
+                        else sighting.city
+                    ),
+                    "shape": sighting.shape,
+                    "summary": sighting.summary,
+                },
             }
-        }
-        
+
+        if stream:
+            response_stream = await asyncio.to_thread(
+                model.generate_content,
+                prompt,
+                generation_config=generation_config,
+                stream=True,
+            )
+            return event_stream_response(
+                stream_research_events(
+                    response_stream, sighting_id, "full", build_result
+                ),
+                "MISS",
+            )
+
+        # Generate response (simplified - no search grounding for now).
+        # The SDK call blocks for the whole completion, so keep it off the event loop.
+        response = await asyncio.to_thread(
+            model.generate_content, prompt, generation_config=generation_config
+        )
+        result = build_result(response.text, response)
+
         # Save to cache for future requests
         await save_research_to_cache(db, sighting_id, "full", result)
-        
+
         return result
-        
+
     except Exception as e:
         logger.error(f"Error generating research for sighting {sighting_id}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to generate research report: {str(e)}"
+            detail=f"Failed to generate research report: {str(e)}",
         )
 
 
 @router.get(
     "/quick/{sighting_id}",
     summary="Quick AI Analysis",
-    description="Generate quick AI analysis for a UFO sighting without extensive web research."
+    description=(
+        "Generate quick AI analysis for a UFO sighting without extensive web research."
+    ),
 )
 async def quick_analysis(
     sighting_id: int,
-    db: AsyncSession = Depends(get_db)
+    http_response: Response,
+    stream: bool = Query(
+        False,
+        description="Stream the analysis as Server-Sent Events while it is generated",
+    ),
+    db: AsyncSession = Depends(get_db),
 ):
     """Generate quick AI analysis without extensive web research."""
-    
+
     # Check if Gemini is configured
     if not settings.GEMINI_API_KEY:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="AI analysis service is not available. Contact administrator."
+            detail="AI analysis service is not available. Contact administrator.",
         )
-    
-    # Check cache first
-    cached_result = await get_cached_research(db, sighting_id, "quick")
+
+    # Check cache first, loading the sighting alongside in case of a miss
+    cached_result, sighting = await get_cached_research_or_sighting(
+        db, sighting_id, "quick"
+    )
     if cached_result:
         logger.info(f"Returning cached quick analysis for sighting {sighting_id}")
+        if stream:
+            return event_stream_response(cached_research_events(cached_result), "HIT")
+        http_response.headers["X-Cache"] = "HIT"
         return cached_result
-    
-    # Get the sighting from database
-    result = await db.execute(select(Sighting).where(Sighting.id == sighting_id))
-    sighting = result.scalar_one_or_none()
-    
+    http_response.headers["X-Cache"] = "MISS"
+
     if not sighting:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Sighting with ID {sighting_id} not found"
+            detail=f"Sighting with ID {sighting_id} not found",
         )
-    
+
     try:
         # Generate new analysis with Gemini
         logger.info(f"Generating new quick analysis for sighting {sighting_id}")
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
+        model = genai.GenerativeModel("gemini-2.0-flash-exp")
+
         prompt = f"""
 Analyze this UFO sighting report and provide insights:
 
@@ -256,96 +457,113 @@ Please provide:
 
 Keep the analysis concise but informative.
 """
-        
-        response = model.generate_content(prompt)
-        
-        # Prepare result
-        result = {
-            "sighting_id": sighting_id,
-            "quick_analysis": response.text,
-            "generated_at": datetime.utcnow().isoformat(),
-            "analysis_type": "quick"
-        }
-        
+
+        # Prepare result from the generated text
+        def build_result(analysis: str, response) -> Dict[str, Any]:
+            return {
+                "sighting_id": sighting_id,
+                "quick_analysis": analysis,
+                "generated_at": datetime.now(UTC).isoformat(),
+                "analysis_type": "quick",
+            }
+
+        if stream:
+            response_stream = await asyncio.to_thread(
+                model.generate_content, prompt, stream=True
+            )
+            return event_stream_response(
+                stream_research_events(
+                    response_stream, sighting_id, "quick", build_result
+                ),
+                "MISS",
+            )
+
+        response = await asyncio.to_thread(model.generate_content, prompt)
+        result = build_result(response.text, response)
+
         # Save to cache for future requests
         await save_research_to_cache(db, sighting_id, "quick", result)
-        
+
         return result
-        
+
     except Exception as e:
-        logger.error(f"Error generating quick analysis for sighting {sighting_id}: {str(e)}")
+        logger.error(
+            f"Error generating quick analysis for sighting {sighting_id}: {str(e)}"
+        )
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to generate analysis: {str(e)}"
+            detail=f"Failed to generate analysis: {str(e)}",
         )
 
 
 def build_research_query(sighting: Sighting) -> str:
     """Build comprehensive research query for a UFO sighting."""
-    
+
     # Base information
     query_parts = []
-    
+
     if sighting.date_time:
-        query_parts.append(f"Date: {sighting.date_time.strftime('%B %d, %Y at %H:%M')}")
-    
+        query_parts.append(f"Date: {sighting.date_time.strftime(RESEARCH_DATE_FORMAT)}")
+
     if sighting.city and sighting.state:
         query_parts.append(f"Location: {sighting.city}, {sighting.state}")
     elif sighting.city:
         query_parts.append(f"Location: {sighting.city}")
-    
+
     if sighting.shape:
         query_parts.append(f"Object Shape: {sighting.shape}")
-    
+
     if sighting.duration:
         query_parts.append(f"Duration: {sighting.duration}")
-    
+
     if sighting.summary:
         query_parts.append(f"Summary: {sighting.summary}")
-    
+
     if sighting.text and len(sighting.text) > len(sighting.summary or ""):
         # Include more details if available
-        text_snippet = sighting.text[:500] + "..." if len(sighting.text) > 500 else sighting.text
+        text_snippet = (
+            sighting.text[:500] + "..." if len(sighting.text) > 500 else sighting.text
+        )
         query_parts.append(f"Full Description: {text_snippet}")
-    
+
     return "\n".join(query_parts)
 
 
 @router.get(
     "/status",
     summary="Research Service Status",
-    description="Check if AI research service is available."
+    description="Check if AI research service is available.",
 )
 async def research_status():
     """Check the status of the AI research service."""
-    
+
     if not settings.GEMINI_API_KEY:
         return {
             "status": "unavailable",
             "message": "AI research service is not configured",
-            "features": []
+            "features": [],
         }
-    
+
     try:
         # Test Gemini connection
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        test_response = model.generate_content("Test connection")
-        
+        model = genai.GenerativeModel("gemini-2.0-flash-exp")
+        await asyncio.to_thread(model.generate_content, "Test connection")
+
         return {
             "status": "available",
             "message": "AI research service is operational",
             "features": [
                 "Deep sighting research with web search",
-                "Quick sighting analysis", 
+                "Quick sighting analysis",
                 "Citation-backed reports",
-                "Cross-reference detection"
+                "Cross-reference detection",
             ],
-            "model": "gemini-2.0-flash-exp"
+            "model": "gemini-2.0-flash-exp",
         }
     except Exception as e:
         logger.error(f"Gemini connection test failed: {str(e)}")
         return {
             "status": "error",
             "message": f"AI research service error: {str(e)}",
-            "features": []
-        }
\ No newline at end of file
+            "features": [],
+        }
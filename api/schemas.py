@@ -2,6 +2,8 @@ from datetime import datetime
 from typing import List, Optional
 from pydantic import BaseModel, EmailStr, Field, ConfigDict
 
+from api.models import Tier
+
 
 class SightingResponse(BaseModel):
     """Response model for individual UFO sighting."""
@@ -9,7 +11,9 @@ class SightingResponse(BaseModel):
     id: int
     date_time: datetime = Field(..., description="Date and time of the sighting")
     city: str = Field(..., description="City where sighting occurred")
-    state: Optional[str] = Field(None, description="State/province code (US states or international)")
+    state: Optional[str] = Field(
+        None, description="State/province code (US states or international)"
+    )
     shape: str = Field(..., description="Shape of the observed object")
     duration: str = Field(..., description="Duration of the sighting")
     summary: str = Field(..., description="Brief summary of the sighting")
@@ -64,9 +68,11 @@ class ErrorResponse(BaseModel):
 
 # Authentication schemas
 
+
 # User schemas
 class UserCreate(BaseModel):
     """Schema for user registration."""
+
     name: str = Field(..., min_length=1, max_length=100)
     email: EmailStr
     password: str = Field(..., min_length=8, max_length=100)
@@ -74,52 +80,69 @@ class UserCreate(BaseModel):
 
 class UserLogin(BaseModel):
     """Schema for user login."""
+
     email: EmailStr
     password: str
 
 
 class UserResponse(BaseModel):
     """Schema for user information response."""
+
     id: int
     name: str
     email: str
     is_active: bool
     created_at: datetime
-    
+
     model_config = ConfigDict(from_attributes=True)
 
 
 # API Key schemas
 class ApiKeyCreate(BaseModel):
     """Schema for creating a new API key."""
-    name: str = Field(..., min_length=1, max_length=100, description="Human-readable name for the API key")
-    tier: str = Field(default="free", description="Tier level: free, basic, pro, enterprise")
+
+    name: str = Field(
+        ...,
+        min_length=1,
+        max_length=100,
+        description="Human-readable name for the API key",
+    )
+    tier: Tier = Field(
+        default=Tier.FREE, description="Tier level: free, basic, pro, enterprise"
+    )
 
 
 class ApiKeyResponse(BaseModel):
     """Schema for API key information (without the actual key)."""
+
     id: int
+    key_prefix: Optional[str] = None
     name: str
-    tier: str
+    tier: Tier
     quota_limit: int
     quota_used: int
     quota_reset_date: datetime
     is_active: bool
     created_at: datetime
     last_used: Optional[datetime]
-    
+
     model_config = ConfigDict(from_attributes=True)
 
 
 class ApiKeyCreateResponse(BaseModel):
     """Schema for API key creation response (includes the actual key)."""
-    api_key: str = Field(..., description="The actual API key - store this securely, it won't be shown again")
+
+    api_key: str = Field(
+        ...,
+        description="The actual API key - store this securely, it won't be shown again",
+    )
     key_info: ApiKeyResponse
 
 
 # Token schemas
 class Token(BaseModel):
     """Schema for JWT token response."""
+
     access_token: str
     token_type: str = "bearer"
 
@@ -127,6 +150,7 @@ class Token(BaseModel):
 # Usage schemas
 class UsageStats(BaseModel):
     """Schema for usage statistics."""
+
     total_requests: int
     requests_this_month: int
     quota_limit: int
@@ -138,11 +162,12 @@ class UsageStats(BaseModel):
 
 class UsageRecord(BaseModel):
     """Schema for individual usage record."""
+
     id: int
     endpoint: str
     method: str
     response_status: int
     response_time_ms: Optional[int]
     timestamp: datetime
-    
+
     model_config = ConfigDict(from_attributes=True)
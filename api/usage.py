@@ -0,0 +1,204 @@
+"""Buffered API usage recording."""
+
+import asyncio
+import logging
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Deque, Dict, Iterable, List, Optional
+
+from sqlalchemy import DateTime, Integer, bindparam, column, insert, update, values
+
+from api.config import settings
+from api.database import engine, get_db_session
+from api.models import ApiKey, Usage
+
+logger = logging.getLogger(__name__)
+
+# Only PostgreSQL allows INSERT inside a WITH clause of an UPDATE
+SUPPORTS_DML_CTE = engine.dialect.name == "postgresql"
+
+
+@dataclass(slots=True)
+class UsageEvent:
+    """A single API request to be recorded."""
+
+    api_key_id: int
+    endpoint: str
+    method: str
+    response_status: int
+    response_time_ms: int
+    user_agent: Optional[str]
+    ip_address: Optional[str]
+    timestamp: datetime
+
+
+# asyncpg allows at most 32767 bind parameters in one statement. In the CTE
+# statement each row binds one parameter per usage column, plus at most two
+# for its key's VALUES entry, so larger batches are split across statements.
+POSTGRES_MAX_BIND_PARAMS = 32767
+USAGE_CTE_MAX_ROWS = POSTGRES_MAX_BIND_PARAMS // (len(Usage.__table__.columns) + 2)
+
+
+def _key_last_used(events: List[UsageEvent]) -> List[dict]:
+    """The latest timestamp per API key among events, as update parameters."""
+    last_used: Dict[int, datetime] = {}
+    for event in events:
+        if (
+            event.api_key_id not in last_used
+            or event.timestamp > last_used[event.api_key_id]
+        ):
+            last_used[event.api_key_id] = event.timestamp
+    return [
+        {"key_id": api_key_id, "used_at": used_at}
+        for api_key_id, used_at in last_used.items()
+    ]
+
+
+async def write_usage_events(events: Iterable[UsageEvent]) -> None:
+    """Insert usage rows and bump per-key last_used in one transaction.
+
+    On PostgreSQL each chunk of up to USAGE_CTE_MAX_ROWS events is a single
+    statement.
+    """
+    events = list(events)
+    if not events:
+        return
+
+    async with get_db_session() as session:
+        if SUPPORTS_DML_CTE:
+            for start in range(0, len(events), USAGE_CTE_MAX_ROWS):
+                chunk = events[start : start + USAGE_CTE_MAX_ROWS]
+                await session.execute(
+                    _build_usage_cte_statement(
+                        [asdict(event) for event in chunk], _key_last_used(chunk)
+                    )
+                )
+        else:
+            await session.execute(insert(Usage), [asdict(event) for event in events])
+            await session.execute(_API_KEY_LAST_USED_UPDATE, _key_last_used(events))
+        await session.commit()
+
+
+# Core (not ORM) statement so a list of parameters runs as a single executemany.
+# quota_used isn't touched here: the middleware consumes quota atomically per request.
+_api_keys = ApiKey.__table__
+_API_KEY_LAST_USED_UPDATE = (
+    update(_api_keys)
+    .where(_api_keys.c.id == bindparam("key_id"))
+    .values(last_used=bindparam("used_at"))
+)
+
+
+def _build_usage_cte_statement(rows: List[dict], key_usage: List[dict]):
+    """Build one statement that inserts the usage rows and bumps the keys' last_used.
+
+    Renders as WITH u AS (INSERT INTO usage ...) UPDATE api_keys ... FROM (VALUES ...),
+    which PostgreSQL runs in a single round trip.
+    """
+    usage_insert = insert(Usage.__table__).values(rows).cte("inserted_usage")
+    key_last_used = values(
+        column("key_id", Integer),
+        # timestamptz like api_keys.last_used, so no session time zone conversion
+        column("used_at", DateTime(timezone=True)),
+        name="key_usage",
+    ).data([(k["key_id"], k["used_at"]) for k in key_usage])
+    return (
+        update(_api_keys)
+        .where(_api_keys.c.id == key_last_used.c.key_id)
+        .values(last_used=key_last_used.c.used_at)
+        .add_cte(usage_insert)
+    )
+
+
+class UsageRecorder:
+    """Buffers usage events in memory and writes them to the database in batches.
+
+    While the background flusher is running, recording a request is a deque append
+    and the database sees one transaction per batch instead of a commit per
+    request. Each key's last_used is set once for the whole batch, so a busy key
+    costs one row update per flush rather than one per request. When the flusher
+    isn't running (e.g. no lifespan, as under the test client) events are written
+    immediately.
+    """
+
+    def __init__(
+        self,
+        max_buffer: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+    ):
+        # Oldest events are dropped if the database can't keep up
+        self._buffer: Deque[UsageEvent] = deque(maxlen=max_buffer)
+        self.dropped = 0
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def record(self, event: UsageEvent) -> None:
+        """Record a usage event."""
+        if not self.running:
+            await write_usage_events([event])
+            return
+
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+            # Log the first drop and then periodically, not once per request
+            if self.dropped % 1000 == 1:
+                logger.warning(
+                    f"Usage buffer full; {self.dropped} usage records dropped so far"
+                )
+        self._buffer.append(event)
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Write out everything currently buffered."""
+        while self._buffer:
+            batch = [
+                self._buffer.popleft()
+                for _ in range(min(self.batch_size, len(self._buffer)))
+            ]
+            try:
+                await write_usage_events(batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} usage records: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        """Start the background flusher on the running event loop."""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background flusher and write any remaining events."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# Global usage recorder instance
+usage_recorder = UsageRecorder(
+    batch_size=settings.USAGE_BATCH_SIZE,
+    flush_interval=settings.USAGE_FLUSH_INTERVAL,
+)
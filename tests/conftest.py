@@ -2,14 +2,18 @@ import pytest
 from datetime import datetime, UTC
 
 # Import test config first to set environment variables
-import tests.test_config
+import tests.test_config  # noqa: F401
 
 from httpx import AsyncClient, ASGITransport
-from sqlalchemy.ext.asyncio import AsyncSession
 from api.main import app
 from api.database import create_tables, drop_tables, get_db_session
 from api.models import User, ApiKey, Sighting
-from api.auth import get_password_hash, generate_api_key, hash_api_key, create_access_token
+from api.auth import (
+    get_password_hash,
+    generate_api_key,
+    hash_api_key,
+    create_access_token,
+)
 
 
 @pytest.fixture
@@ -48,7 +52,7 @@ async def test_user(db_setup):
             name="Test User",
             email="test@example.com",
             hashed_password=get_password_hash("testpassword"),
-            created_at=datetime.now(UTC)
+            created_at=datetime.now(UTC),
         )
         session.add(user)
         await session.commit()
@@ -74,14 +78,16 @@ async def test_api_key(db_setup, test_user):
             tier="basic",
             quota_limit=10000,
             quota_used=0,
-            quota_reset_date=datetime.now(UTC).replace(day=1, month=((datetime.now(UTC).month % 12) + 1)),
+            quota_reset_date=datetime.now(UTC).replace(
+                day=1, month=((datetime.now(UTC).month % 12) + 1)
+            ),
             user_id=test_user.id,
-            created_at=datetime.now(UTC)
+            created_at=datetime.now(UTC),
         )
         session.add(api_key)
         await session.commit()
         await session.refresh(api_key)
-        
+
         # Store the actual key string for use in tests
         api_key._key_string = api_key_str
         return api_key
@@ -93,6 +99,12 @@ def test_api_key_string(test_api_key):
     return test_api_key._key_string
 
 
+@pytest.fixture
+def api_key_headers(test_api_key_string):
+    """Get request headers authenticating with the test API key."""
+    return {"X-API-Key": test_api_key_string}
+
+
 @pytest.fixture
 async def sample_sightings(db_setup):
     """Create sample sighting data for tests."""
@@ -108,7 +120,7 @@ async def sample_sightings(db_setup):
                 text="Witnessed a bright disk-shaped object...",
                 posted=datetime(2023, 1, 16),
                 latitude=33.4484,
-                longitude=-112.0740
+                longitude=-112.0740,
             ),
             Sighting(
                 date_time=datetime(2023, 6, 10, 22, 0),
@@ -120,7 +132,7 @@ async def sample_sightings(db_setup):
                 text="Three bright lights moving in perfect triangle...",
                 posted=datetime(2023, 6, 11),
                 latitude=47.6062,
-                longitude=-122.3321
+                longitude=-122.3321,
             ),
             Sighting(
                 date_time=datetime(2023, 12, 25, 19, 45),
@@ -132,12 +144,12 @@ async def sample_sightings(db_setup):
                 text="Sphere with glowing trail moving rapidly...",
                 posted=datetime(2023, 12, 26),
                 latitude=25.7617,
-                longitude=-80.1918
-            )
+                longitude=-80.1918,
+            ),
         ]
-        
+
         for sighting in sightings:
             session.add(sighting)
-        
+
         await session.commit()
         return sightings
@@ -2,11 +2,24 @@
 
 import pytest
 from httpx import AsyncClient
+from dataclasses import FrozenInstanceError
 from datetime import datetime, timedelta, UTC
-from sqlalchemy import select
-
-from api.auth import get_password_hash, verify_password, hash_api_key, verify_api_key, generate_api_key
-from api.models import User, ApiKey
+from sqlalchemy import select, update
+
+import bcrypt
+import hashlib
+import hmac
+
+from api.auth import ApiKeySnapshot, api_key_cache
+from api.auth import (
+    API_KEY_PEPPER,
+    get_password_hash,
+    verify_password,
+    hash_api_key,
+    verify_api_key,
+    generate_api_key,
+)
+from api.models import ApiKey
 from api.database import get_db_session
 
 
@@ -15,45 +28,82 @@ async def test_password_hashing():
     """Test password hashing and verification."""
     password = "test_password_123"
     hashed = get_password_hash(password)
-    
+
     # Hash should be different from original
     assert hashed != password
-    
+
     # Should verify correctly
     assert verify_password(password, hashed) is True
-    
+
     # Wrong password should fail
     assert verify_password("wrong_password", hashed) is False
 
 
+@pytest.mark.asyncio
+async def test_password_hashing_async():
+    """Test the thread-offloaded password helpers used by register and login."""
+    from api.auth import get_password_hash_async, verify_password_async
+
+    hashed = await get_password_hash_async("test_password_123")
+
+    assert await verify_password_async("test_password_123", hashed) is True
+    assert await verify_password_async("wrong_password", hashed) is False
+
+
+@pytest.mark.asyncio
+async def test_password_hashing_long_and_malformed():
+    """Test passwords beyond bcrypt's 72-byte limit and malformed hashes."""
+    password = "x" * 100  # Maximum length allowed by UserCreate
+    hashed = get_password_hash(password)
+
+    assert verify_password(password, hashed) is True
+    assert verify_password(password, "not-a-bcrypt-hash") is False
+
+
 @pytest.mark.asyncio
 async def test_api_key_hashing():
-    """Test API key hashing with bcrypt."""
+    """Test API key hashing with HMAC-SHA256."""
     api_key = generate_api_key()
     hashed = hash_api_key(api_key)
-    
+
     # Hash should be different from original
     assert hashed != api_key
-    
+
+    # Hashing is deterministic so keys can be looked up by hash
+    assert hashed == hash_api_key(api_key)
+    assert (
+        hashed == hmac.new(API_KEY_PEPPER, api_key.encode(), hashlib.sha256).hexdigest()
+    )
+
     # Should verify correctly
     assert verify_api_key(api_key, hashed) is True
-    
+
     # Wrong key should fail
     assert verify_api_key("wrong_key", hashed) is False
 
 
+@pytest.mark.asyncio
+async def test_legacy_bcrypt_api_key_verification():
+    """Test that API keys hashed with the old bcrypt scheme still verify."""
+    api_key = generate_api_key()
+    legacy_hash = bcrypt.hashpw(api_key.encode(), bcrypt.gensalt(rounds=4)).decode()
+
+    assert verify_api_key(api_key, legacy_hash) is True
+    assert verify_api_key("wrong_key", legacy_hash) is False
+
+
 @pytest.mark.asyncio
 async def test_user_registration(client: AsyncClient):
     """Test user registration endpoint."""
     user_data = {
         "name": "Test User",
         "email": "test@example.com",
-        "password": "secure_password_123"
+        "password": "secure_password_123",
     }
-    
+
     response = await client.post("/v1/auth/register", json=user_data)
     assert response.status_code == 200
-    
+
     data = response.json()
     assert data["email"] == user_data["email"]
     assert data["name"] == user_data["name"]
@@ -69,12 +119,12 @@ async def test_duplicate_registration(client: AsyncClient, test_user):
     user_data = {
         "name": "Another User",
         "email": test_user.email,  # Same email as existing user
-        "password": "password123"
+        "password": "password123",
     }
-    
+
     response = await client.post("/v1/auth/register", json=user_data)
     assert response.status_code == 400
-    
+
     data = response.json()
     # Check for either old or new error format
     error_msg = data.get("detail", data.get("message", ""))
@@ -86,12 +136,12 @@ async def test_user_login(client: AsyncClient, test_user):
     """Test user login endpoint."""
     login_data = {
         "email": test_user.email,
-        "password": "testpassword"  # This is the password from conftest.py
+        "password": "testpassword",  # This is the password from conftest.py
     }
-    
+
     response = await client.post("/v1/auth/login", json=login_data)
     assert response.status_code == 200
-    
+
     data = response.json()
     assert "access_token" in data
     assert data["token_type"] == "bearer"
@@ -100,14 +150,11 @@ async def test_user_login(client: AsyncClient, test_user):
 @pytest.mark.asyncio
 async def test_login_wrong_password(client: AsyncClient, test_user):
     """Test login with wrong password."""
-    login_data = {
-        "email": test_user.email,
-        "password": "wrong_password"
-    }
-    
+    login_data = {"email": test_user.email, "password": "wrong_password"}
+
     response = await client.post("/v1/auth/login", json=login_data)
     assert response.status_code == 401
-    
+
     data = response.json()
     # Check for either old or new error format
     error_msg = data.get("detail", data.get("message", ""))
@@ -117,11 +164,8 @@ async def test_login_wrong_password(client: AsyncClient, test_user):
 @pytest.mark.asyncio
 async def test_login_nonexistent_user(client: AsyncClient):
     """Test login with non-existent user."""
-    login_data = {
-        "email": "nonexistent@example.com",
-        "password": "password123"
-    }
-    
+    login_data = {"email": "nonexistent@example.com", "password": "password123"}
+
     response = await client.post("/v1/auth/login", json=login_data)
     assert response.status_code == 401
 
@@ -131,7 +175,7 @@ async def test_get_current_user(client: AsyncClient, test_user, auth_headers):
     """Test getting current user with JWT token."""
     response = await client.get("/v1/auth/me", headers=auth_headers)
     assert response.status_code == 200
-    
+
     data = response.json()
     assert data["id"] == test_user.id
     assert data["email"] == test_user.email
@@ -141,19 +185,17 @@ async def test_get_current_user(client: AsyncClient, test_user, auth_headers):
 @pytest.mark.asyncio
 async def test_create_api_key(client: AsyncClient, auth_headers):
     """Test API key creation."""
-    key_data = {
-        "name": "Test API Key",
-        "tier": "basic"
-    }
-    
+    key_data = {"name": "Test API Key", "tier": "basic"}
+
     response = await client.post("/v1/auth/keys", json=key_data, headers=auth_headers)
     assert response.status_code == 200
-    
+
     data = response.json()
     assert "api_key" in data
     assert data["api_key"].startswith("sk_live_")
-    
+
     key_info = data["key_info"]
+    assert key_info["key_prefix"] == data["api_key"][:16]
     assert key_info["name"] == key_data["name"]
     assert key_info["tier"] == key_data["tier"]
     assert key_info["quota_limit"] == 10000  # Basic tier limit
@@ -161,16 +203,27 @@ async def test_create_api_key(client: AsyncClient, auth_headers):
     assert key_info["is_active"] is True
 
 
+@pytest.mark.asyncio
+async def test_create_api_key_rejects_unknown_tier(client: AsyncClient, auth_headers):
+    """Test that only known tiers can be requested."""
+    response = await client.post(
+        "/v1/auth/keys",
+        json={"name": "Bad Tier", "tier": "platinum"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_list_api_keys(client: AsyncClient, auth_headers, test_api_key):
     """Test listing user's API keys."""
     response = await client.get("/v1/auth/keys", headers=auth_headers)
     assert response.status_code == 200
-    
+
     data = response.json()
     assert isinstance(data, list)
     assert len(data) >= 1
-    
+
     # Find our test key
     test_key = next((k for k in data if k["id"] == test_api_key.id), None)
     assert test_key is not None
@@ -184,9 +237,11 @@ async def test_api_key_limit(client: AsyncClient, auth_headers, db_session):
     # Create 10 API keys (assuming test user starts with 0)
     for i in range(10):
         key_data = {"name": f"Key {i}", "tier": "free"}
-        response = await client.post("/v1/auth/keys", json=key_data, headers=auth_headers)
+        response = await client.post(
+            "/v1/auth/keys", json=key_data, headers=auth_headers
+        )
         assert response.status_code == 200
-    
+
     # 11th key should fail
     key_data = {"name": "Key 11", "tier": "free"}
     response = await client.post("/v1/auth/keys", json=key_data, headers=auth_headers)
@@ -200,13 +255,15 @@ async def test_api_key_limit(client: AsyncClient, auth_headers, db_session):
 @pytest.mark.asyncio
 async def test_deactivate_api_key(client: AsyncClient, auth_headers, test_api_key):
     """Test deactivating an API key."""
-    response = await client.delete(f"/v1/auth/keys/{test_api_key.id}", headers=auth_headers)
+    response = await client.delete(
+        f"/v1/auth/keys/{test_api_key.id}", headers=auth_headers
+    )
     assert response.status_code == 200
-    
+
     # Verify key is deactivated
     response = await client.get("/v1/auth/keys", headers=auth_headers)
     data = response.json()
-    
+
     # Deactivated key should not appear in active keys list
     active_key_ids = [k["id"] for k in data]
     assert test_api_key.id not in active_key_ids
@@ -216,7 +273,7 @@ async def test_deactivate_api_key(client: AsyncClient, auth_headers, test_api_ke
 async def test_api_key_authentication(client: AsyncClient, test_api_key_string):
     """Test using API key for authentication."""
     headers = {"X-API-Key": test_api_key_string}
-    
+
     response = await client.get("/v1/sightings", headers=headers)
     assert response.status_code == 200
 
@@ -225,10 +282,10 @@ async def test_api_key_authentication(client: AsyncClient, test_api_key_string):
 async def test_invalid_api_key(client: AsyncClient):
     """Test using invalid API key."""
     headers = {"X-API-Key": "sk_live_invalid_key"}
-    
+
     response = await client.get("/v1/sightings", headers=headers)
     assert response.status_code == 401
-    
+
     data = response.json()
     assert data["error"] == "authentication_error"
     assert "invalid or has been revoked" in data["message"]
@@ -239,7 +296,7 @@ async def test_missing_api_key(client: AsyncClient):
     """Test request without API key."""
     response = await client.get("/v1/sightings")
     assert response.status_code == 401
-    
+
     data = response.json()
     assert data["error"] == "authentication_error"
     assert "api key required" in data["message"].lower()
@@ -249,23 +306,23 @@ async def test_missing_api_key(client: AsyncClient):
 async def test_jwt_token_expiry(client: AsyncClient, test_user):
     """Test that JWT tokens expire."""
     from api.auth import create_access_token
-    
+
     # Create token that expires in 1 second
     token = create_access_token(
-        data={"sub": str(test_user.id)},
-        expires_delta=timedelta(seconds=1)
+        data={"sub": str(test_user.id)}, expires_delta=timedelta(seconds=1)
     )
-    
+
     headers = {"Authorization": f"Bearer {token}"}
-    
+
     # Should work immediately
     response = await client.get("/v1/auth/me", headers=headers)
     assert response.status_code == 200
-    
+
     # Wait for expiry
     import asyncio
+
     await asyncio.sleep(2)
-    
+
     # Should fail after expiry
     response = await client.get("/v1/auth/me", headers=headers)
     assert response.status_code == 401
@@ -275,17 +332,310 @@ async def test_jwt_token_expiry(client: AsyncClient, test_user):
 async def test_quota_tracking(client: AsyncClient, test_api_key, test_api_key_string):
     """Test that API usage counts against quota."""
     headers = {"X-API-Key": test_api_key_string}
-    
+
     # Make a request
     response = await client.get("/v1/sightings", headers=headers)
     assert response.status_code == 200
-    
+
     # Check quota was incremented
     async with get_db_session() as session:
         result = await session.execute(
             select(ApiKey).where(ApiKey.id == test_api_key.id)
         )
         updated_api_key = result.scalar_one()
-        
+
         assert updated_api_key.quota_used == 1
-        assert updated_api_key.last_used is not None
\ No newline at end of file
+        assert updated_api_key.last_used is not None
+
+
+@pytest.mark.asyncio
+async def test_quota_enforced_in_sql_for_cached_keys(
+    client: AsyncClient, test_api_key, api_key_headers
+):
+    """Test that a cached key can't exceed a quota used up in another worker."""
+    response = await client.get("/v1/sightings", headers=api_key_headers)
+    assert response.status_code == 200
+
+    # The cache holds an immutable snapshot, not the ORM row
+    cached = api_key_cache.get(hash_api_key(api_key_headers["X-API-Key"]))
+    assert isinstance(cached, ApiKeySnapshot)
+    with pytest.raises(FrozenInstanceError):
+        cached.tier = "enterprise"
+
+    async with get_db_session() as session:
+        await session.execute(
+            update(ApiKey)
+            .where(ApiKey.id == test_api_key.id)
+            .values(quota_used=ApiKey.quota_limit)
+        )
+        await session.commit()
+
+    response = await client.get("/v1/sightings", headers=api_key_headers)
+    assert response.status_code == 429
+    assert response.json()["details"]["quota_used"] == 10000
+
+
+@pytest.mark.asyncio
+async def test_expired_quota_starts_new_period(
+    client: AsyncClient, test_api_key, api_key_headers
+):
+    """Test that a used-up quota past its reset date is reset by the request itself."""
+    now = datetime.now(UTC)
+    async with get_db_session() as session:
+        await session.execute(
+            update(ApiKey)
+            .where(ApiKey.id == test_api_key.id)
+            .values(
+                quota_used=ApiKey.quota_limit,
+                quota_reset_date=now - timedelta(days=1),
+            )
+        )
+        await session.commit()
+
+    response = await client.get("/v1/sightings", headers=api_key_headers)
+    assert response.status_code == 200
+
+    async with get_db_session() as session:
+        api_key = await session.get(ApiKey, test_api_key.id)
+        assert api_key.quota_used == 1
+        assert api_key.quota_reset_date.replace(tzinfo=UTC) > now
+
+
+@pytest.mark.asyncio
+async def test_regenerated_api_key_invalidates_cache(
+    client: AsyncClient, auth_headers, test_api_key, test_api_key_string
+):
+    """Test that a cached API key stops working once it is regenerated."""
+    headers = {"X-API-Key": test_api_key_string}
+
+    # First request verifies and caches the key
+    response = await client.get("/v1/sightings", headers=headers)
+    assert response.status_code == 200
+
+    response = await client.post(
+        f"/v1/auth/keys/{test_api_key.id}/regenerate", headers=auth_headers
+    )
+    assert response.status_code == 200
+    new_key = response.json()["api_key"]
+    assert response.json()["key_info"]["key_prefix"] == new_key[:16]
+
+    # Old key must be rejected even though it was cached
+    response = await client.get("/v1/sightings", headers=headers)
+    assert response.status_code == 401
+
+    response = await client.get("/v1/sightings", headers={"X-API-Key": new_key})
+    assert response.status_code == 200
+
+
+def test_verify_token_cache_respects_expiry(monkeypatch):
+    """Test that cached token payloads are not returned after the token expires."""
+    import time
+    from types import SimpleNamespace
+    from api.auth import create_access_token, token_cache, verify_token
+
+    # Expires well inside the cache's own TTL, so only the exp cap can evict it
+    expires_in = 10
+    assert expires_in < token_cache.ttl
+    token = create_access_token(
+        data={"sub": "1"}, expires_delta=timedelta(seconds=expires_in)
+    )
+
+    payload = verify_token(token)
+    assert payload is not None
+    assert token_cache.get(token) == payload  # Served from cache
+
+    # Move the cache's clock past exp instead of sleeping
+    start = time.monotonic()
+    monkeypatch.setattr(
+        "api.cache.time", SimpleNamespace(monotonic=lambda: start + expires_in + 1)
+    )
+    assert token_cache.get(token) is None
+
+
+@pytest.mark.asyncio
+async def test_quota_helpers_accept_injected_now():
+    """Test quota date helpers with an explicit current time."""
+    from api.auth import calculate_quota_reset_date, is_quota_expired
+
+    now = datetime(2024, 12, 15, 12, 0, tzinfo=UTC)
+    reset_date = calculate_quota_reset_date(now=now)
+    assert reset_date == datetime(2025, 1, 1, tzinfo=UTC)
+
+    assert is_quota_expired(reset_date, now=now) is False
+    assert is_quota_expired(reset_date, now=reset_date) is True
+    # Naive datetimes from the database are treated as UTC
+    assert is_quota_expired(reset_date.replace(tzinfo=None), now=now) is False
+
+
+@pytest.mark.asyncio
+async def test_access_token_is_standard_jwt():
+    """Test that fast-path tokens are readable by a standard JWT library."""
+    import jwt
+    from api.auth import create_access_token, SECRET_KEY, ALGORITHM
+
+    token = create_access_token(data={"sub": "42"})
+
+    assert jwt.get_unverified_header(token) == {"alg": ALGORITHM, "typ": "JWT"}
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    assert payload["sub"] == "42"
+    assert "exp" in payload
+
+
+@pytest.mark.asyncio
+async def test_deactivated_api_key_rejected_after_caching(
+    client: AsyncClient, auth_headers, test_api_key, test_api_key_string
+):
+    """Test that deactivating a key evicts it from the verified-key cache."""
+    headers = {"X-API-Key": test_api_key_string}
+
+    response = await client.get("/v1/sightings", headers=headers)
+    assert response.status_code == 200
+
+    response = await client.delete(
+        f"/v1/auth/keys/{test_api_key.id}", headers=auth_headers
+    )
+    assert response.status_code == 200
+
+    response = await client.get("/v1/sightings", headers=headers)
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_legacy_api_key_upgraded_on_use(client: AsyncClient, test_user):
+    """Test that a bcrypt-hashed key authenticates and is rehashed for lookups."""
+    api_key_str = generate_api_key()
+    async with get_db_session() as session:
+        api_key = ApiKey(
+            key_hash=bcrypt.hashpw(
+                api_key_str.encode(), bcrypt.gensalt(rounds=4)
+            ).decode(),
+            name="Legacy Key",
+            tier="free",
+            quota_limit=1000,
+            quota_used=0,
+            quota_reset_date=datetime.now(UTC) + timedelta(days=30),
+            user_id=test_user.id,
+            created_at=datetime.now(UTC),
+        )
+        session.add(api_key)
+        await session.commit()
+        key_id = api_key.id
+
+    response = await client.get("/v1/sightings", headers={"X-API-Key": api_key_str})
+    assert response.status_code == 200
+
+    async with get_db_session() as session:
+        result = await session.execute(select(ApiKey).where(ApiKey.id == key_id))
+        assert result.scalar_one().key_hash == hash_api_key(api_key_str)
+
+
+@pytest.mark.asyncio
+async def test_usage_stats(client: AsyncClient, test_api_key, api_key_headers):
+    """Test usage totals, monthly count and top endpoints from one grouped query."""
+    from api.usage import UsageEvent, write_usage_events
+
+    now = datetime.now(UTC)
+    last_year = now - timedelta(days=400)
+
+    def event(endpoint: str, timestamp: datetime) -> UsageEvent:
+        return UsageEvent(
+            api_key_id=test_api_key.id,
+            endpoint=endpoint,
+            method="GET",
+            response_status=200,
+            response_time_ms=1,
+            user_agent=None,
+            ip_address=None,
+            timestamp=timestamp,
+        )
+
+    await write_usage_events(
+        [event("/v1/sightings", now)] * 3
+        + [event("/v1/sightings/1", now), event("/v1/sightings/1", last_year)]
+    )
+
+    response = await client.get("/v1/auth/usage", headers=api_key_headers)
+    assert response.status_code == 200
+    data = response.json()
+
+    assert data["total_requests"] == 5
+    assert data["requests_this_month"] == 4
+    assert data["most_used_endpoints"] == [
+        {"endpoint": "/v1/sightings", "count": 3},
+        {"endpoint": "/v1/sightings/1", "count": 2},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_usage_history_streams_newest_first(
+    client: AsyncClient, test_api_key, api_key_headers
+):
+    """Test that usage history is streamed as a JSON array, newest first and limited."""
+    from api.usage import UsageEvent, write_usage_events
+
+    start = datetime(2024, 1, 1, 12, 0)
+    await write_usage_events(
+        [
+            UsageEvent(
+                api_key_id=test_api_key.id,
+                endpoint=f"/v1/sightings/{i}",
+                method="GET",
+                response_status=200,
+                response_time_ms=i,
+                user_agent=None,
+                ip_address=None,
+                timestamp=start + timedelta(minutes=i),
+            )
+            for i in range(3)
+        ]
+    )
+
+    response = await client.get(
+        "/v1/auth/usage/history?limit=2", headers=api_key_headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+
+    records = response.json()
+    assert [record["endpoint"] for record in records] == [
+        "/v1/sightings/2",
+        "/v1/sightings/1",
+    ]
+    assert records[0]["timestamp"] == "2024-01-01T12:02:00"
+    assert set(records[0]) == {
+        "id",
+        "endpoint",
+        "method",
+        "response_status",
+        "response_time_ms",
+        "timestamp",
+    }
+
+
+@pytest.mark.asyncio
+async def test_api_key_user_loaded_with_key(
+    client: AsyncClient, test_api_key, api_key_headers
+):
+    """Test that API key routes get the owner from the key lookup, not a query."""
+    from sqlalchemy import event
+    from api.database import get_engine
+
+    api_key_cache.clear()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sync_engine = get_engine().sync_engine
+    event.listen(sync_engine, "before_cursor_execute", record)
+    try:
+        response = await client.get("/v1/auth/usage", headers=api_key_headers)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+
+    # The key lookup joins users; no statement reads users on its own
+    user_reads = [s for s in statements if "FROM users" in s]
+    assert user_reads == []
+    assert any("JOIN users" in s for s in statements)
+    assert api_key_cache.get(test_api_key.key_hash).user.id == test_api_key.user_id
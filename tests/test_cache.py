@@ -0,0 +1,77 @@
+"""Tests for in-process caching utilities."""
+
+import time
+
+from api.cache import TTLCache, canonical_key
+
+
+def test_ttl_cache_get_and_set():
+    """Test basic storage and retrieval."""
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("key", 1)
+
+    assert cache.get("key") == 1
+    assert cache.get("missing") is None
+    assert cache.get("missing", "default") == "default"
+
+
+def test_ttl_cache_expiry():
+    """Test that entries expire after their TTL."""
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("key", 1, ttl=0.01)
+
+    time.sleep(0.02)
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    """Test that the least recently used entry is evicted when full."""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    # Touch "a" so "b" becomes the eviction candidate
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_invalidate_where():
+    """Test invalidating entries by value."""
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 1)
+    cache.set("c", 2)
+
+    assert cache.invalidate_where(lambda value: value == 1) == 2
+    assert cache.get("a") is None
+    assert cache.get("c") == 2
+
+
+def test_ttl_cache_hit_ratio():
+    """Test that lookups are counted as hits or misses."""
+    cache = TTLCache(maxsize=10, ttl=60)
+    assert cache.hit_ratio is None
+
+    cache.set("key", 1)
+    cache.get("key")
+    cache.get("key")
+    cache.get("missing")
+
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert cache.hit_ratio == 2 / 3
+
+
+def test_canonical_key_ignores_order_and_unset_params():
+    """Test that equivalent parameter sets produce the same key."""
+    key = canonical_key("stats", state="AZ", shape=None, source="")
+
+    assert key == canonical_key("stats", state="AZ")
+    assert canonical_key("stats", limit=5, state="AZ") == canonical_key(
+        "stats", state="AZ", limit=5
+    )
+    assert key != canonical_key("hotspots", state="AZ")
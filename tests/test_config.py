@@ -5,4 +5,5 @@ import os
 # Set test environment before importing app
 os.environ["DATABASE_URL"] = "sqlite:///:memory:"
 os.environ["ENVIRONMENT"] = "testing"
-os.environ["JWT_SECRET_KEY"] = "test-secret-key-for-testing-only"
\ No newline at end of file
+os.environ["JWT_SECRET_KEY"] = "test-secret-key-for-testing-only"
+os.environ["PASSWORD_BCRYPT_ROUNDS"] = "4"
@@ -17,3 +17,16 @@ async def test_health_endpoint(client: AsyncClient, db_setup):
     assert data["database"]["status"] == "connected"
     assert "sighting_count" in data["database"]
     assert data["database"]["sighting_count"] == 0  # Empty database initially
+    assert "aggregate_hit_ratio" in data["cache"]
+
+
+@pytest.mark.asyncio
+async def test_liveness_endpoint(client: AsyncClient):
+    """Test that the liveness probe answers without auth or database access."""
+    response = await client.get("/health/live")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+    # It skips the middleware stack but still carries the security headers
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.headers["x-frame-options"] == "DENY"
@@ -0,0 +1,54 @@
+"""Tests for the queued logging setup."""
+
+import io
+import logging
+
+import pytest
+
+from api import logging_config
+
+
+@pytest.fixture
+def log_stream():
+    """Route app logs to a fresh in-memory stream, restoring stderr logging after."""
+    # api.main sets up logging at import, bound to whatever stderr was then
+    logging_config.shutdown_logging()
+    stream = io.StringIO()
+    yield stream
+    logging_config.shutdown_logging()
+    logging_config.setup_logging()
+
+
+def test_app_logs_go_through_queue(log_stream):
+    """Test that app log records are emitted once, by the listener thread."""
+    logging_config.setup_logging(handler=logging.StreamHandler(log_stream))
+    # A second call must not attach a duplicate handler
+    logging_config.setup_logging()
+
+    assert logging.getLogger("api").propagate is False
+
+    logging.getLogger("api.test").info("hello from the queue")
+    logging_config.shutdown_logging()
+
+    assert log_stream.getvalue().count("hello from the queue") == 1
+    assert "INFO api.test" in log_stream.getvalue()
+
+
+def test_logging_can_be_set_up_again_after_shutdown(log_stream):
+    """Test that a second lifespan gets a live listener instead of a dead queue."""
+    logging_config.setup_logging(handler=logging.StreamHandler(io.StringIO()))
+    logging_config.shutdown_logging()
+
+    logging_config.setup_logging(handler=logging.StreamHandler(log_stream))
+    logging.getLogger("api.test").info("after restart")
+    logging_config.shutdown_logging()
+
+    assert "after restart" in log_stream.getvalue()
+
+
+def test_shutdown_logging_is_idempotent():
+    """Test that shutting down twice is harmless."""
+    logging_config.setup_logging()
+    logging_config.shutdown_logging()
+    logging_config.shutdown_logging()
+    logging_config.setup_logging()
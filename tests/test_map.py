@@ -0,0 +1,377 @@
+"""Tests for map data endpoints."""
+
+import pytest
+from datetime import datetime
+from httpx import AsyncClient
+
+from api.cache import aggregate_cache
+from api.database import get_db_session
+from api.filters import _known_shapes_cache, shape_filter
+from api.hotspots import hotspot_summary_refresher, refresh_hotspot_summary
+from api.models import Sighting
+from api.routers import map as map_router
+from api.routers.map import aggregate_cache_key, precompute_hotspot_responses
+
+
+@pytest.fixture(autouse=True)
+def clear_aggregate_cache():
+    """Start every test with empty aggregate and shape caches."""
+    aggregate_cache.clear()
+    _known_shapes_cache.clear()
+    yield
+    aggregate_cache.clear()
+    _known_shapes_cache.clear()
+
+
+async def _add_denver_sighting():
+    """Add a sighting at a location not in the sample data."""
+    async with get_db_session() as session:
+        session.add(
+            Sighting(
+                date_time=datetime(2024, 3, 1, 21, 0),
+                city="Denver",
+                state="CO",
+                shape="light",
+                duration="1 minute",
+                summary="Steady white light",
+                text="A steady white light drifted east...",
+                posted=datetime(2024, 3, 2),
+                latitude=39.7392,
+                longitude=-104.9903,
+            )
+        )
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_hotspots_are_cached(client: AsyncClient, sample_sightings):
+    """Test that repeated hotspot requests are served from the cache."""
+    response = await client.get("/v1/map/hotspots?min_sightings=1")
+    assert response.status_code == 200
+    assert response.json()["total_hotspots"] == 3
+
+    await _add_denver_sighting()
+
+    # Same filters: cached result
+    response = await client.get("/v1/map/hotspots?min_sightings=1")
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()["total_hotspots"] == 3
+
+    # Different filters: fresh aggregation
+    response = await client.get("/v1/map/hotspots?min_sightings=1&limit=10")
+    assert response.json()["total_hotspots"] == 4
+
+
+@pytest.mark.asyncio
+async def test_map_stats(client: AsyncClient, sample_sightings):
+    """Test map statistics for the filtered sightings."""
+    response = await client.get("/v1/map/stats?state=az")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["total_sightings"] == 1
+    assert data["shape_distribution"] == [{"shape": "disk", "count": 1}]
+    assert data["date_range"]["earliest"] == "2023-01-15T20:30:00"
+
+
+@pytest.mark.asyncio
+async def test_map_data_formats(client: AsyncClient, sample_sightings):
+    """Test that map data is rendered from sighting rows in both formats."""
+    response = await client.get("/v1/map/data?state=WA")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["type"] == "FeatureCollection"
+    assert data["properties"]["total_features"] == 1
+    feature = data["features"][0]
+    assert feature["geometry"]["coordinates"] == [-122.3321, 47.6062]
+    assert feature["properties"]["city"] == "Seattle"
+    assert feature["properties"]["date_time"] == "2023-06-10T22:00:00"
+
+    response = await client.get("/v1/map/data?format=simple")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 3
+    assert {sighting["city"] for sighting in data["sightings"]} == {
+        "Phoenix",
+        "Seattle",
+        "Miami",
+    }
+
+
+@pytest.mark.asyncio
+async def test_map_data_streams_across_chunks(
+    client: AsyncClient, sample_sightings, monkeypatch
+):
+    """Test that rows encoded in separate chunks still form one valid document."""
+    monkeypatch.setattr("api.routers.map.MAP_STREAM_CHUNK_SIZE", 2)
+
+    for path in (
+        "/v1/map/data?zoom_level=14",
+        "/v1/map/data?format=simple&zoom_level=14",
+    ):
+        response = await client.get(path)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+
+        data = response.json()
+        items = data.get("features", data.get("sightings"))
+        assert len(items) == 3
+        assert data.get("total", data.get("properties", {}).get("total_features")) == 3
+
+
+@pytest.mark.asyncio
+async def test_map_data_us_and_international(client: AsyncClient, sample_sightings):
+    """Test that the US and INTERNATIONAL state groups split on 2-letter state codes."""
+    async with get_db_session() as session:
+        session.add(
+            Sighting(
+                date_time=datetime(2024, 5, 4, 23, 0),
+                city="Toronto",
+                state="Ontario",
+                shape="light",
+                duration="5 minutes",
+                summary="Hovering light over the lake",
+                text="A light hovered over the lake...",
+                posted=datetime(2024, 5, 5),
+                latitude=43.6532,
+                longitude=-79.3832,
+            )
+        )
+        await session.commit()
+
+    response = await client.get("/v1/map/data?format=simple&state=us")
+    assert {sighting["city"] for sighting in response.json()["sightings"]} == {
+        "Phoenix",
+        "Seattle",
+        "Miami",
+    }
+
+    response = await client.get("/v1/map/data?format=simple&state=international")
+    assert [sighting["city"] for sighting in response.json()["sightings"]] == [
+        "Toronto"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_map_data_bounds(client: AsyncClient, sample_sightings):
+    """Test that only sightings inside the viewport bounds are returned."""
+    # Box around the western US: Phoenix and Seattle, not Miami
+    response = await client.get("/v1/map/data?format=simple&bounds=30,-125,50,-110")
+    assert response.status_code == 200
+
+    cities = {sighting["city"] for sighting in response.json()["sightings"]}
+    assert cities == {"Phoenix", "Seattle"}
+
+
+def test_sampled_map_query_renders_tablesample():
+    """Test that the sampled map query reads a repeatable block sample of sightings."""
+    from sqlalchemy.dialects import postgresql
+    from api.routers.map import _sampled_map_query
+
+    sql = str(_sampled_map_query(10.0).compile(dialect=postgresql.dialect()))
+
+    assert "FROM sightings AS sampled TABLESAMPLE system(" in sql
+    assert "REPEATABLE (" in sql
+    assert "sightings." not in sql
+
+
+@pytest.mark.asyncio
+async def test_hotspots_served_from_summary(
+    client: AsyncClient, sample_sightings, monkeypatch
+):
+    """Test that unfiltered hotspots come from the summary once it has been rebuilt."""
+    assert await refresh_hotspot_summary() == 3
+    monkeypatch.setattr(hotspot_summary_refresher, "ready", True)
+
+    # Not counted until the next rebuild
+    await _add_denver_sighting()
+
+    response = await client.get("/v1/map/hotspots?min_sightings=1")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_hotspots"] == 3
+    phoenix = next(h for h in data["hotspots"] if h["city"] == "Phoenix")
+    assert phoenix["sighting_count"] == 1
+    assert phoenix["latitude"] == 33.4484
+
+    # Shape filters aren't in the summary, so they aggregate live
+    response = await client.get("/v1/map/hotspots?min_sightings=1&shape=light")
+    assert response.json()["total_hotspots"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hotspots_served_precomputed(
+    client: AsyncClient, sample_sightings, monkeypatch
+):
+    """Test that default hotspot requests are served from bodies encoded on rebuild."""
+    monkeypatch.setattr(map_router, "precomputed_hotspots", {})
+    await refresh_hotspot_summary()
+    await precompute_hotspot_responses()
+    monkeypatch.setattr(hotspot_summary_refresher, "ready", True)
+
+    cached = map_router.precomputed_hotspots[
+        aggregate_cache_key("hotspots", state="US", min_sightings=5, limit=20)
+    ]
+
+    response = await client.get("/v1/map/hotspots?state=us")
+    assert response.status_code == 200
+    assert response.content == cached.body
+    assert response.headers["etag"] == cached.etag
+    assert len(aggregate_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_available_states(client: AsyncClient, sample_sightings):
+    """Test that states are listed with their names and counts."""
+    response = await client.get("/v1/map/states")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["total_states"] == 3
+    assert data["states"][0] == {"code": "AZ", "name": "Arizona", "sighting_count": 1}
+
+
+@pytest.mark.asyncio
+async def test_map_data_keyset_pagination(client: AsyncClient, db_setup):
+    """Test that next_cursor walks all sightings newest first without overlap."""
+    async with get_db_session() as session:
+        session.add_all(
+            Sighting(
+                date_time=datetime(2020, 1, 1 + i % 28, i % 24),
+                city=f"City {i}",
+                state="TX",
+                shape="light",
+                duration="1 minute",
+                summary="Light",
+                text="A light...",
+                posted=datetime(2020, 2, 1),
+                latitude=30.0,
+                longitude=-97.0,
+            )
+            for i in range(250)
+        )
+        await session.commit()
+
+    # zoom_level=1 pages 200 rows at a time
+    response = await client.get("/v1/map/data?format=simple&zoom_level=1")
+    first_page = response.json()
+    assert first_page["total"] == 200
+    assert first_page["next_cursor"]
+    dates = [sighting["date_time"] for sighting in first_page["sightings"]]
+    assert dates == sorted(dates, reverse=True)
+
+    response = await client.get(
+        f"/v1/map/data?format=simple&zoom_level=1&cursor={first_page['next_cursor']}"
+    )
+    second_page = response.json()
+    assert second_page["total"] == 50
+    assert second_page["next_cursor"] is None
+
+    ids = [s["id"] for s in first_page["sightings"] + second_page["sightings"]]
+    assert len(set(ids)) == 250
+
+
+@pytest.mark.asyncio
+async def test_map_data_rejects_invalid_cursor(client: AsyncClient, db_setup):
+    """Test that a malformed cursor is a validation error."""
+    response = await client.get("/v1/map/data?cursor=not-a-cursor")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_map_data_rejects_invalid_bounds(client: AsyncClient, db_setup):
+    """Test that malformed bounds are reported instead of ignored."""
+    response = await client.get("/v1/map/data?bounds=30,-125,50")
+    assert response.status_code == 422
+
+    response = await client.get("/v1/map/data?bounds=north,west,south,east")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "bounds",
+    [
+        "-91,-125,50,-110",  # south below -90
+        "30,-125,95,-110",  # north above 90
+        "30,-181,50,-110",  # west below -180
+        "30,-125,50,200",  # east above 180
+        "50,-125,30,-110",  # south above north
+        "30,-110,50,-125",  # west east of east
+    ],
+)
+async def test_map_data_rejects_out_of_range_bounds(
+    client: AsyncClient, db_setup, bounds
+):
+    """Test that well-formed bounds outside the globe or inverted are rejected."""
+    response = await client.get(f"/v1/map/data?bounds={bounds}")
+    assert response.status_code == 422
+    assert response.json()["details"] == {"bounds": bounds}
+
+
+@pytest.mark.asyncio
+async def test_map_data_clusters_zoomed_out_geojson(
+    client: AsyncClient, sample_sightings
+):
+    """Test that low zoom geojson requests return one feature per grid cell."""
+    # Falls in the same 22.5 degree cell as Phoenix at zoom level 1
+    await _add_denver_sighting()
+
+    response = await client.get("/v1/map/data?zoom_level=1")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["properties"]["clustered"] is True
+    assert data["properties"]["total_sightings"] == 4
+    counts = sorted(feature["properties"]["count"] for feature in data["features"])
+    assert counts == [1, 1, 2]
+
+    # The simple format always returns individual sightings
+    response = await client.get("/v1/map/data?zoom_level=1&format=simple")
+    assert response.json()["total"] == 4
+
+
+@pytest.mark.asyncio
+async def test_map_stats_etag(client: AsyncClient, sample_sightings):
+    """Test that aggregate responses carry an ETag and honour If-None-Match."""
+    response = await client.get("/v1/map/stats")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"].startswith("public")
+
+    response = await client.get("/v1/map/stats", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = await client.get("/v1/map/states", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_shape_filter_uses_equality_for_known_shapes(sample_sightings):
+    """Test that an exact known shape is an equality and anything else a substring."""
+    async with get_db_session() as session:
+        session.add(
+            Sighting(
+                date_time=datetime(2024, 3, 1, 21, 0),
+                city="Denver",
+                state="CO",
+                shape="fireball",
+                duration="10 seconds",
+                summary="Orange ball of fire",
+                text="An orange ball of fire crossed the sky...",
+                posted=datetime(2024, 3, 2),
+                latitude=39.7392,
+                longitude=-104.9903,
+            )
+        )
+        await session.commit()
+
+        exact = await shape_filter(session, "Disk")
+        assert "LIKE" not in str(exact).upper()
+        assert exact.right.value == "disk"
+
+        # "fire" only exists as part of "fireball"
+        partial = await shape_filter(session, "fire")
+        assert "LIKE" in str(partial).upper()
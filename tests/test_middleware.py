@@ -0,0 +1,27 @@
+"""Tests for middleware helpers."""
+
+from api.middleware import get_client_ip
+
+
+def test_get_client_ip_prefers_forwarded_for():
+    """Test that the first X-Forwarded-For address wins over other sources."""
+    scope = {
+        "headers": [
+            (b"x-real-ip", b"10.0.0.2"),
+            (b"x-forwarded-for", b"203.0.113.7, 10.0.0.1"),
+        ],
+        "client": ("127.0.0.1", 5000),
+    }
+    assert get_client_ip(scope) == "203.0.113.7"
+
+
+def test_get_client_ip_falls_back_to_real_ip_then_client():
+    """Test the X-Real-IP and socket address fallbacks."""
+    assert (
+        get_client_ip(
+            {"headers": [(b"x-real-ip", b"10.0.0.2")], "client": ("127.0.0.1", 5000)}
+        )
+        == "10.0.0.2"
+    )
+    assert get_client_ip({"headers": [], "client": ("127.0.0.1", 5000)}) == "127.0.0.1"
+    assert get_client_ip({"headers": [], "client": None}) is None
@@ -0,0 +1,61 @@
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio
+async def test_docs_page_supports_etag(client: AsyncClient):
+    """Test that the pre-rendered docs page is served with a usable ETag."""
+    response = await client.get("/docs")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    etag = response.headers["etag"]
+
+    response = await client.get("/docs", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+@pytest.mark.asyncio
+async def test_swagger_page(client: AsyncClient):
+    """Test that the Swagger UI page is served."""
+    response = await client.get("/swagger")
+    assert response.status_code == 200
+    assert "swagger-ui" in response.text
+    assert "etag" in response.headers
+
+
+@pytest.mark.asyncio
+async def test_landing_and_map_pages_are_cacheable(client: AsyncClient):
+    """Test that the landing and map pages are pre-rendered with cache headers."""
+    for path in ("/", "/map"):
+        response = await client.get(path)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/html")
+        assert response.headers["cache-control"] == "public, max-age=300"
+        assert "etag" in response.headers
+
+
+@pytest.mark.asyncio
+async def test_security_headers_on_public_and_error_responses(client: AsyncClient):
+    """Test that security headers are set on every response."""
+    for path, expected_status in (("/docs", 200), ("/v1/sightings", 401)):
+        response = await client.get(path)
+        assert response.status_code == expected_status
+        assert response.headers["x-content-type-options"] == "nosniff"
+        assert response.headers["x-frame-options"] == "DENY"
+        assert response.headers["referrer-policy"] == "strict-origin-when-cross-origin"
+
+
+def test_security_headers_include_hsts_only_in_production():
+    """Test that HSTS is only sent in production."""
+    from api.middleware import build_security_headers
+
+    production = dict(build_security_headers("production"))
+    development = dict(build_security_headers("development"))
+
+    assert (
+        production[b"strict-transport-security"]
+        == b"max-age=31536000; includeSubDomains"
+    )
+    assert b"strict-transport-security" not in development
+    assert development[b"x-frame-options"] == b"DENY"
@@ -0,0 +1,43 @@
+"""Tests for scheduled quota resets."""
+
+import pytest
+from datetime import datetime, timedelta, UTC
+from sqlalchemy import update
+
+from api.auth import generate_api_key, hash_api_key
+from api.database import get_db_session
+from api.models import ApiKey
+from api.quota import reset_expired_quotas
+
+
+@pytest.mark.asyncio
+async def test_reset_expired_quotas_only_touches_due_keys(test_user, test_api_key):
+    """Test that only keys past their reset date are reset."""
+    now = datetime.now(UTC)
+    async with get_db_session() as session:
+        expired_key = ApiKey(
+            key_hash=hash_api_key(generate_api_key()),
+            name="Expired Key",
+            tier="free",
+            quota_limit=1000,
+            quota_used=1000,
+            quota_reset_date=now - timedelta(days=1),
+            user_id=test_user.id,
+            created_at=now,
+        )
+        session.add(expired_key)
+        await session.execute(
+            update(ApiKey).where(ApiKey.id == test_api_key.id).values(quota_used=42)
+        )
+        await session.commit()
+        expired_key_id = expired_key.id
+
+    assert await reset_expired_quotas(now=now) == 1
+
+    async with get_db_session() as session:
+        expired_key = await session.get(ApiKey, expired_key_id)
+        assert expired_key.quota_used == 0
+        assert expired_key.quota_reset_date.replace(tzinfo=UTC) > now
+
+        current_key = await session.get(ApiKey, test_api_key.id)
+        assert current_key.quota_used == 42
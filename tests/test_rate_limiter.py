@@ -0,0 +1,35 @@
+"""Tests for the in-memory rate limiter."""
+
+from api import middleware
+from api.middleware import RateLimiter
+
+
+def test_rate_limiter_blocks_after_limit(monkeypatch):
+    """Test that requests beyond the hourly limit are rejected."""
+    monkeypatch.setattr(middleware.time, "time", lambda: 7200.0)
+    limiter = RateLimiter()
+
+    assert all(limiter.is_allowed("key", 3) for _ in range(3))
+    assert not limiter.is_allowed("key", 3)
+    # Other keys are tracked independently
+    assert limiter.is_allowed("other", 3)
+
+
+def test_rate_limiter_weights_previous_window(monkeypatch):
+    """Test that the previous window's count decays across the next window."""
+    now = [7200.0]
+    monkeypatch.setattr(middleware.time, "time", lambda: now[0])
+    limiter = RateLimiter()
+
+    for _ in range(4):
+        assert limiter.is_allowed("key", 4)
+
+    # Halfway through the next window, half of the previous count still applies
+    now[0] = 7200.0 + 3600 + 1800
+    assert limiter.is_allowed("key", 4)
+    assert limiter.is_allowed("key", 4)
+    assert not limiter.is_allowed("key", 4)
+
+    # Two windows later, the old counts no longer apply
+    now[0] = 7200.0 + 3 * 3600
+    assert limiter.is_allowed("key", 1)
@@ -0,0 +1,257 @@
+"""Tests for the AI research cache."""
+
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from datetime import datetime, timedelta, UTC
+from sqlalchemy import select, update
+
+from api.database import get_db_session
+from api.models import ResearchCache, Sighting
+from api.research_cache import (
+    CURRENT_MODEL_VERSION,
+    ResearchHitRecorder,
+    prune_research_cache,
+    research_memory_cache,
+)
+from api.routers.research import (
+    _pending_cache_writes,
+    build_research_query,
+    get_cached_research,
+    get_cached_research_or_sighting,
+    stream_research_events,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_research_memory_cache():
+    """Start every test with an empty in-memory research cache."""
+    research_memory_cache.clear()
+    yield
+    research_memory_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_is_counted(sample_sightings):
+    """Test that a cache lookup returns the result and records the hit."""
+    sighting_id = sample_sightings[0].id
+    async with get_db_session() as session:
+        session.add(
+            ResearchCache(
+                sighting_id=sighting_id,
+                research_type="quick",
+                analysis_result=json.dumps({"quick_analysis": "Probably Venus"}),
+                model_version=CURRENT_MODEL_VERSION,
+            )
+        )
+        await session.commit()
+
+    async with get_db_session() as session:
+        assert await get_cached_research(session, sighting_id, "full") is None
+        assert await get_cached_research(session, sighting_id, "quick") == {
+            "quick_analysis": "Probably Venus"
+        }
+
+        cache_hits = await session.scalar(select(ResearchCache.cache_hits))
+        assert cache_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_repeat_hits_served_from_memory(sample_sightings):
+    """Test that a result read from the table is then served without a database hit."""
+    sighting_id = sample_sightings[0].id
+    async with get_db_session() as session:
+        session.add(
+            ResearchCache(
+                sighting_id=sighting_id,
+                research_type="full",
+                analysis_result=json.dumps({"research_report": "Starlink train"}),
+                model_version=CURRENT_MODEL_VERSION,
+            )
+        )
+        await session.commit()
+
+    async with get_db_session() as session:
+        assert await get_cached_research(session, sighting_id, "full") == {
+            "research_report": "Starlink train"
+        }
+
+        # Later lookups don't read the table, but are still counted
+        await session.execute(update(ResearchCache).values(analysis_result="{}"))
+        await session.commit()
+        for _ in range(2):
+            assert await get_cached_research(session, sighting_id, "full") == {
+                "research_report": "Starlink train"
+            }
+
+        assert await session.scalar(select(ResearchCache.cache_hits)) == 3
+
+
+@pytest.mark.asyncio
+async def test_hit_recorder_batches_hits(sample_sightings):
+    """Test that hits counted while the flusher runs are written once per entry."""
+    async with get_db_session() as session:
+        entry = ResearchCache(
+            sighting_id=sample_sightings[0].id,
+            research_type="quick",
+            analysis_result="{}",
+            model_version=CURRENT_MODEL_VERSION,
+        )
+        session.add(entry)
+        await session.commit()
+
+    recorder = ResearchHitRecorder(flush_interval=60)
+    recorder.start()
+    for _ in range(5):
+        await recorder.record(entry.id)
+
+    async with get_db_session() as session:
+        assert await session.scalar(select(ResearchCache.cache_hits)) == 0
+
+    # Stopping writes out whatever is still counted
+    await recorder.stop()
+    async with get_db_session() as session:
+        assert await session.scalar(select(ResearchCache.cache_hits)) == 5
+
+
+@pytest.mark.asyncio
+async def test_prune_research_cache(sample_sightings):
+    """Test that stale and other-model entries are evicted."""
+    now = datetime.now(UTC)
+    sighting_id = sample_sightings[0].id
+    async with get_db_session() as session:
+        for research_type, model_version, last_accessed in [
+            ("quick", CURRENT_MODEL_VERSION, now),
+            ("full", CURRENT_MODEL_VERSION, now - timedelta(days=31)),
+            ("full", "gemini-1.5-pro", now),
+        ]:
+            session.add(
+                ResearchCache(
+                    sighting_id=sighting_id,
+                    research_type=research_type,
+                    analysis_result="{}",
+                    model_version=model_version,
+                    last_accessed=last_accessed,
+                )
+            )
+        await session.commit()
+
+    assert await prune_research_cache(timedelta(days=30), now=now) == 2
+
+    async with get_db_session() as session:
+        remaining = (
+            (await session.execute(select(ResearchCache.research_type))).scalars().all()
+        )
+        assert remaining == ["quick"]
+
+
+@pytest.mark.asyncio
+async def test_sighting_loaded_alongside_cache_miss(sample_sightings):
+    """Test that a miss returns the sighting and a hit only the cached result."""
+    sighting_id = sample_sightings[0].id
+    async with get_db_session() as session:
+        session.add(
+            ResearchCache(
+                sighting_id=sighting_id,
+                research_type="quick",
+                analysis_result=json.dumps({"quick_analysis": "Probably Venus"}),
+                model_version=CURRENT_MODEL_VERSION,
+            )
+        )
+        await session.commit()
+
+    async with get_db_session() as session:
+        cached, sighting = await get_cached_research_or_sighting(
+            session, sighting_id, "full"
+        )
+        assert cached is None
+        assert sighting.city == sample_sightings[0].city
+
+        cached, sighting = await get_cached_research_or_sighting(
+            session, sighting_id, "quick"
+        )
+        assert cached == {"quick_analysis": "Probably Venus"}
+        assert sighting is None
+
+        cached, sighting = await get_cached_research_or_sighting(
+            session, 999999, "full"
+        )
+        assert cached is None and sighting is None
+
+
+@pytest.mark.asyncio
+async def test_memory_hit_skips_sighting_load(sample_sightings, monkeypatch):
+    """Test that a memory cache hit returns without starting the sighting load."""
+    sighting_id = sample_sightings[0].id
+    research_memory_cache.set(
+        (sighting_id, "quick", CURRENT_MODEL_VERSION), (1, {"quick_analysis": "Venus"})
+    )
+
+    loads = []
+
+    async def load(sighting_id):
+        loads.append(sighting_id)
+
+    monkeypatch.setattr("api.routers.research.load_research_sighting", load)
+    async with get_db_session() as session:
+        cached, sighting = await get_cached_research_or_sighting(
+            session, sighting_id, "quick"
+        )
+        await asyncio.sleep(0)
+    assert cached == {"quick_analysis": "Venus"}
+    assert sighting is None
+    assert loads == []
+
+
+@pytest.mark.asyncio
+async def test_streamed_research_is_relayed_then_cached(sample_sightings):
+    """Test that each chunk is an event, then the full result, which is then cached."""
+    sighting_id = sample_sightings[0].id
+    chunks = [SimpleNamespace(text="Probably "), SimpleNamespace(text="Venus")]
+
+    def build_result(analysis, response):
+        return {"sighting_id": sighting_id, "quick_analysis": analysis}
+
+    events = [
+        event
+        async for event in stream_research_events(
+            chunks, sighting_id, "quick", build_result
+        )
+    ]
+    assert [json.loads(event.removeprefix(b"data: ")) for event in events] == [
+        {"chunk": "Probably "},
+        {"chunk": "Venus"},
+        {"result": {"sighting_id": sighting_id, "quick_analysis": "Probably Venus"}},
+    ]
+    assert all(event.endswith(b"\n\n") for event in events)
+
+    await asyncio.gather(*_pending_cache_writes)
+    async with get_db_session() as session:
+        assert await get_cached_research(session, sighting_id, "quick") == {
+            "sighting_id": sighting_id,
+            "quick_analysis": "Probably Venus",
+        }
+
+
+def test_build_research_query_skips_missing_fields():
+    """Test that the research prompt lists known fields and truncates long text."""
+    sighting = Sighting(
+        date_time=datetime(2023, 7, 4, 21, 30),
+        city="Phoenix",
+        state=None,
+        shape="triangle",
+        duration="",
+        summary="Three lights",
+        text="x" * 600,
+    )
+
+    assert build_research_query(sighting) == "\n".join(
+        [
+            "Date: July 04, 2023 at 21:30",
+            "Location: Phoenix",
+            "Object Shape: triangle",
+            "Summary: Three lights",
+            "Full Description: " + "x" * 500 + "...",
+        ]
+    )
@@ -0,0 +1,134 @@
+"""Tests for cross-worker API key revocation."""
+
+import asyncio
+from datetime import datetime, UTC
+
+import pytest
+
+from api import revocation
+from api.auth import ApiKeySnapshot, UserSnapshot, api_key_cache, cache_api_key
+from api.models import Tier
+from api.revocation import KeyRevocationBus
+
+
+def _snapshot(api_key_id: int, key_hash: str) -> ApiKeySnapshot:
+    return ApiKeySnapshot(
+        id=api_key_id,
+        user_id=1,
+        key_hash=key_hash,
+        tier=Tier.FREE,
+        quota_limit=1000,
+        is_active=True,
+        user=UserSnapshot(
+            id=1,
+            name="Test User",
+            email="test@example.com",
+            is_active=True,
+            created_at=datetime(2024, 1, 1, tzinfo=UTC),
+        ),
+    )
+
+
+@pytest.mark.asyncio
+async def test_revocation_log_invalidates_cached_key(tmp_path, monkeypatch):
+    """Test that a revocation written by another worker evicts the cached key."""
+    log_path = tmp_path / "revocations.log"
+    monkeypatch.setattr(revocation, "REVOCATION_LOG_PATH", str(log_path))
+    # An entry from before this worker started must be ignored
+    log_path.write_text("old-hash\n")
+
+    listener = KeyRevocationBus(poll_interval=0.01)
+    listener.start()
+    try:
+        cache_api_key(_snapshot(1, "old-hash"))
+        cache_api_key(_snapshot(4242, "revoked-hash"))
+
+        # Another worker revokes key 4242
+        KeyRevocationBus()._append_to_log("revoked-hash")
+        for _ in range(100):
+            if api_key_cache.get("revoked-hash") is None:
+                break
+            await asyncio.sleep(0.01)
+
+        assert api_key_cache.get("revoked-hash") is None
+        assert api_key_cache.get("old-hash") is not None
+    finally:
+        await listener.stop()
+        api_key_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_publish_invalidates_locally_when_not_running():
+    """Test that publishing still evicts this worker's cache without a listener."""
+    cache_api_key(_snapshot(7, "revoked-hash"))
+
+    await KeyRevocationBus().publish("revoked-hash")
+
+    assert api_key_cache.get("revoked-hash") is None
+
+
+async def _wait_until_evicted(key_hash: str) -> None:
+    for _ in range(100):
+        if api_key_cache.get(key_hash) is None:
+            return
+        await asyncio.sleep(0.01)
+
+
+class _FailingOnceBus(KeyRevocationBus):
+    """Revocation bus whose first listener dies immediately."""
+
+    failures = 0
+
+    async def _poll_log(self) -> None:
+        if not self.failures:
+            self.failures += 1
+            raise RuntimeError("listener crashed")
+        await super()._poll_log()
+
+
+@pytest.mark.asyncio
+async def test_failed_listener_is_restarted(tmp_path, monkeypatch):
+    """Test that a listener that dies is restarted and keeps evicting revoked keys."""
+    log_path = tmp_path / "revocations.log"
+    monkeypatch.setattr(revocation, "REVOCATION_LOG_PATH", str(log_path))
+
+    listener = _FailingOnceBus(poll_interval=0.01, min_retry_delay=0.01)
+    listener.start()
+    try:
+        cache_api_key(_snapshot(5, "revoked-hash"))
+        KeyRevocationBus()._append_to_log("revoked-hash")
+        await _wait_until_evicted("revoked-hash")
+
+        assert listener.failures == 1
+        assert listener.running
+        assert api_key_cache.get("revoked-hash") is None
+    finally:
+        await listener.stop()
+        api_key_cache.clear()
+    assert not listener.running
+
+
+@pytest.mark.asyncio
+async def test_revocation_log_is_capped(tmp_path, monkeypatch):
+    """Test that the shared log starts over at its size cap and readers follow it."""
+    log_path = tmp_path / "revocations.log"
+    monkeypatch.setattr(revocation, "REVOCATION_LOG_PATH", str(log_path))
+    monkeypatch.setattr(revocation, "REVOCATION_LOG_MAX_BYTES", 64)
+
+    listener = KeyRevocationBus(poll_interval=0.01)
+    listener.start()
+    try:
+        writer = KeyRevocationBus()
+        for i in range(10):
+            writer._append_to_log(f"stale-hash-{i}")
+        assert log_path.stat().st_size < 64 + len("stale-hash-0\n")
+
+        await asyncio.sleep(0.05)
+        cache_api_key(_snapshot(9, "revoked-hash"))
+        writer._append_to_log("revoked-hash")
+        await _wait_until_evicted("revoked-hash")
+
+        assert api_key_cache.get("revoked-hash") is None
+    finally:
+        await listener.stop()
+        api_key_cache.clear()
@@ -6,12 +6,12 @@ from api.models import Sighting
 
 
 @pytest.mark.asyncio
-async def test_list_sightings_basic(client: AsyncClient, db_setup):
+async def test_list_sightings_basic(client: AsyncClient, db_setup, api_key_headers):
     """Test basic GET /v1/sightings endpoint."""
     # Add some test data first
     await _create_test_sightings()
 
-    response = await client.get("/v1/sightings")
+    response = await client.get("/v1/sightings", headers=api_key_headers)
 
     assert response.status_code == 200
     data = response.json()
@@ -29,32 +29,43 @@ async def test_list_sightings_basic(client: AsyncClient, db_setup):
 
 
 @pytest.mark.asyncio
-async def test_list_sightings_pagination(client: AsyncClient, db_setup):
+async def test_list_sightings_pagination(
+    client: AsyncClient, db_setup, api_key_headers
+):
     """Test pagination in sightings list."""
     await _create_test_sightings()
 
     # Test first page
-    response = await client.get("/v1/sightings?page=1&per_page=2")
+    response = await client.get(
+        "/v1/sightings?page=1&per_page=2", headers=api_key_headers
+    )
     assert response.status_code == 200
     data = response.json()
 
     assert len(data["sightings"]) <= 2
     assert data["page"] == 1
     assert data["per_page"] == 2
+    assert data["total"] == 3
+    assert data["pages"] == 2
 
     # Test page bounds
-    response = await client.get("/v1/sightings?page=999&per_page=10")
+    response = await client.get(
+        "/v1/sightings?page=999&per_page=10", headers=api_key_headers
+    )
     assert response.status_code == 200
     data = response.json()
     assert len(data["sightings"]) == 0  # Empty page
+    assert data["total"] == 3  # Still counted past the last page
 
 
 @pytest.mark.asyncio
-async def test_list_sightings_filter_by_state(client: AsyncClient, db_setup):
+async def test_list_sightings_filter_by_state(
+    client: AsyncClient, db_setup, api_key_headers
+):
     """Test filtering sightings by state."""
     await _create_test_sightings()
 
-    response = await client.get("/v1/sightings?state=AZ")
+    response = await client.get("/v1/sightings?state=AZ", headers=api_key_headers)
     assert response.status_code == 200
     data = response.json()
 
@@ -64,11 +75,13 @@ async def test_list_sightings_filter_by_state(client: AsyncClient, db_setup):
 
 
 @pytest.mark.asyncio
-async def test_list_sightings_filter_by_shape(client: AsyncClient, db_setup):
+async def test_list_sightings_filter_by_shape(
+    client: AsyncClient, db_setup, api_key_headers
+):
     """Test filtering sightings by shape."""
     await _create_test_sightings()
 
-    response = await client.get("/v1/sightings?shape=disk")
+    response = await client.get("/v1/sightings?shape=disk", headers=api_key_headers)
     assert response.status_code == 200
     data = response.json()
 
@@ -78,11 +91,13 @@ async def test_list_sightings_filter_by_shape(client: AsyncClient, db_setup):
 
 
 @pytest.mark.asyncio
-async def test_list_sightings_filter_by_city(client: AsyncClient, db_setup):
+async def test_list_sightings_filter_by_city(
+    client: AsyncClient, db_setup, api_key_headers
+):
     """Test filtering sightings by city."""
     await _create_test_sightings()
 
-    response = await client.get("/v1/sightings?city=Phoenix")
+    response = await client.get("/v1/sightings?city=Phoenix", headers=api_key_headers)
     assert response.status_code == 200
     data = response.json()
 
@@ -92,11 +107,11 @@ async def test_list_sightings_filter_by_city(client: AsyncClient, db_setup):
 
 
 @pytest.mark.asyncio
-async def test_get_sighting_by_id(client: AsyncClient, db_setup):
+async def test_get_sighting_by_id(client: AsyncClient, db_setup, api_key_headers):
     """Test GET /v1/sightings/{id} endpoint."""
     sighting_id = await _create_test_sightings()
 
-    response = await client.get(f"/v1/sightings/{sighting_id}")
+    response = await client.get(f"/v1/sightings/{sighting_id}", headers=api_key_headers)
     assert response.status_code == 200
     data = response.json()
 
@@ -112,20 +127,24 @@ async def test_get_sighting_by_id(client: AsyncClient, db_setup):
 
 
 @pytest.mark.asyncio
-async def test_get_sighting_not_found(client: AsyncClient, db_setup):
+async def test_get_sighting_not_found(client: AsyncClient, db_setup, api_key_headers):
     """Test GET /v1/sightings/{id} with non-existent ID."""
-    response = await client.get("/v1/sightings/99999")
+    response = await client.get("/v1/sightings/99999", headers=api_key_headers)
     assert response.status_code == 404
     data = response.json()
-    assert "detail" in data
+    assert data["error"] == "not_found"
+    assert data["message"] == "Sighting not found"
+    assert data["details"] == {"resource": "Sighting", "identifier": "99999"}
 
 
 @pytest.mark.asyncio
-async def test_sighting_response_structure(client: AsyncClient, db_setup):
+async def test_sighting_response_structure(
+    client: AsyncClient, db_setup, api_key_headers
+):
     """Test that sighting response has correct structure."""
     await _create_test_sightings()
 
-    response = await client.get("/v1/sightings")
+    response = await client.get("/v1/sightings", headers=api_key_headers)
     assert response.status_code == 200
     data = response.json()
 
@@ -153,6 +172,28 @@ async def test_sighting_response_structure(client: AsyncClient, db_setup):
             assert field in sighting  # Field exists but may be null
 
 
+@pytest.mark.asyncio
+async def test_list_sightings_radius_search(
+    client: AsyncClient, db_setup, api_key_headers
+):
+    """Test that radius searches count and page only sightings within the distance."""
+    await _create_test_sightings()
+
+    # Sedona is ~161 km from Phoenix: inside the 159 km bounding box, outside the circle
+    response = await client.get(
+        "/v1/sightings?lat=33.4484&lng=-112.0740&radius=159", headers=api_key_headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 1
+    assert [sighting["city"] for sighting in data["sightings"]] == ["Phoenix"]
+
+    response = await client.get(
+        "/v1/sightings?lat=33.4484&lng=-112.0740&radius=165", headers=api_key_headers
+    )
+    assert response.json()["total"] == 2
+
+
 async def _create_test_sightings():
     """Helper function to create test sightings data."""
     async with get_db_session() as session:
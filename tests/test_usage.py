@@ -0,0 +1,119 @@
+"""Tests for buffered usage recording."""
+
+import pytest
+from dataclasses import asdict
+from datetime import datetime, UTC
+from sqlalchemy import DateTime, select, func
+
+from api.database import get_db_session
+from api.models import ApiKey, Usage
+from api.usage import UsageEvent, UsageRecorder
+
+
+def _event(api_key_id: int, timestamp: datetime) -> UsageEvent:
+    return UsageEvent(
+        api_key_id=api_key_id,
+        endpoint="/v1/sightings",
+        method="GET",
+        response_status=200,
+        response_time_ms=5,
+        user_agent="pytest",
+        ip_address="127.0.0.1",
+        timestamp=timestamp,
+    )
+
+
+@pytest.mark.asyncio
+async def test_usage_recorder_batches_writes(test_api_key):
+    """Test that buffered events are written together when the recorder stops."""
+    recorder = UsageRecorder(flush_interval=60)
+    recorder.start()
+
+    first = datetime(2024, 1, 1, 12, 0)
+    last = datetime(2024, 1, 1, 12, 5)
+    for timestamp in (first, last, first):
+        await recorder.record(_event(test_api_key.id, timestamp))
+
+    # Nothing is written until the batch is flushed
+    async with get_db_session() as session:
+        count = (await session.execute(select(func.count(Usage.id)))).scalar()
+        assert count == 0
+
+    await recorder.stop()
+
+    async with get_db_session() as session:
+        count = (await session.execute(select(func.count(Usage.id)))).scalar()
+        assert count == 3
+
+        api_key = (
+            await session.execute(select(ApiKey).where(ApiKey.id == test_api_key.id))
+        ).scalar_one()
+        # Quota is consumed per request by the middleware, not by usage writes
+        assert api_key.quota_used == 0
+        assert api_key.last_used == last
+
+
+@pytest.mark.asyncio
+async def test_usage_recorder_writes_through_when_stopped(test_api_key):
+    """Test that events are written immediately without a running flusher."""
+    recorder = UsageRecorder()
+
+    await recorder.record(_event(test_api_key.id, datetime.now(UTC)))
+
+    async with get_db_session() as session:
+        count = (await session.execute(select(func.count(Usage.id)))).scalar()
+        assert count == 1
+
+
+def test_usage_cte_statement_renders_single_postgres_statement():
+    """Test that the PostgreSQL path inserts and updates in one statement."""
+    from sqlalchemy.dialects import postgresql
+    from api.usage import _build_usage_cte_statement
+
+    event = _event(1, datetime(2024, 1, 1, 12, 0))
+    statement = _build_usage_cte_statement(
+        [asdict(event)],
+        [{"key_id": 1, "used_at": event.timestamp}],
+    )
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith("WITH inserted_usage AS")
+    assert "INSERT INTO usage" in sql
+    assert "UPDATE api_keys SET last_used=key_usage.used_at" in sql
+    # Timestamps bind as timestamptz, like the columns they're written to
+    binds = statement.compile(dialect=postgresql.dialect()).binds.values()
+    assert all(bind.type.timezone for bind in binds if isinstance(bind.type, DateTime))
+
+
+def test_usage_cte_chunk_fits_postgres_parameter_limit():
+    """Test that a full chunk with a key per row stays under asyncpg's limit."""
+    from sqlalchemy.dialects import postgresql
+    from api.usage import (
+        POSTGRES_MAX_BIND_PARAMS,
+        USAGE_CTE_MAX_ROWS,
+        _build_usage_cte_statement,
+        _key_last_used,
+    )
+
+    events = [_event(i, datetime(2024, 1, 1, 12, 0)) for i in range(USAGE_CTE_MAX_ROWS)]
+    statement = _build_usage_cte_statement(
+        [asdict(event) for event in events], _key_last_used(events)
+    )
+    params = statement.compile(dialect=postgresql.dialect()).params
+
+    assert len(params) <= POSTGRES_MAX_BIND_PARAMS
+
+
+@pytest.mark.asyncio
+async def test_usage_recorder_counts_dropped_events():
+    """Test that events evicted from a full buffer are counted."""
+    recorder = UsageRecorder(max_buffer=2, batch_size=10, flush_interval=60)
+    recorder.start()
+    try:
+        for _ in range(5):
+            await recorder.record(_event(1, datetime(2024, 1, 1, 12, 0)))
+        assert recorder.dropped == 3
+    finally:
+        # Discard the buffered events rather than writing them without a database
+        recorder._buffer.clear()
+        await recorder.stop()
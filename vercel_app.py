@@ -8,7 +8,7 @@ import os
 os.environ.setdefault("ENVIRONMENT", "production")
 
 # Import the FastAPI app directly
-from api.main import app
+from api.main import app  # noqa: E402
 
 # Vercel expects the ASGI app to be available as 'app'
 # No need for a handler function wrapper
@@ -18,4 +18,6 @@ from api.main import app
 # For local development
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+
+    # loop/http "auto" select uvloop and httptools when installed
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="auto", http="auto")